@@ -1,31 +1,251 @@
-import niscope
+import time
 import numpy as np
 
-def record():
-    with niscope.Session("Dev1") as session:
-        session.channels[1].configure_vertical(range=40.0, coupling=niscope.VerticalCoupling.DC)
-
-        session.configure_horizontal_timing(
-            min_sample_rate=50000000,
-            min_num_pts=5000000,
-            ref_position=50.0,  # Might comment later. This is a percentage.
-            num_records=1,      # This gets used later in session initiate. Might make this global.
+try:
+    import niscope
+except ImportError:  # FakeScope still works without the NI driver
+    niscope = None
+
+
+# --- Reductions: record(s) -> value(s), along the last axis ------------------
+def _out(r):
+    return float(r) if np.ndim(r) == 0 else r
+
+def mean(x):
+    return _out(x.mean(axis=-1))
+
+def rms(x):
+    return _out(np.sqrt(np.einsum("...i,...i->...", x, x) / x.shape[-1]))
+
+def boxcar(start, stop):
+    """Average over a gate; `start`/`stop` are fractions of the record (0..1)."""
+    def gate(x):
+        n = x.shape[-1]
+        a = int(start * n)
+        return _out(x[..., a:max(int(stop * n), a + 1)].mean(axis=-1))
+    gate.__name__ = f"boxcar({start},{stop})"
+    return gate
+
+REDUCTIONS = {"mean": mean, "rms": rms}
+
+
+# --- Backends -----------------------------------------------------------------
+class NIScopeBackend:
+    """NI-Scope session that is opened and configured once, then re-armed per record."""
+    def __init__(self, resource="Dev1", channel=1, vrange=40.0,
+                 sample_rate=50000000, num_pts=5000000, ref_position=50.0, num_records=1):
+        self.resource = resource
+        self.channel = channel
+        self.vrange = vrange
+        self.sample_rate = sample_rate
+        self.num_pts = num_pts
+        self.ref_position = ref_position  # Might comment later. This is a percentage.
+        self.num_records = num_records
+        self.session = None
+
+    def open(self):
+        if niscope is None:
+            raise RuntimeError("niscope is not installed")
+        self.session = niscope.Session(self.resource)
+        self.configure(self.num_records, self.num_pts)
+
+    def configure(self, num_records, num_pts):
+        s = self.session
+        s.channels[self.channel].configure_vertical(range=self.vrange, coupling=niscope.VerticalCoupling.DC)
+        s.configure_horizontal_timing(
+            min_sample_rate=self.sample_rate,
+            min_num_pts=num_pts,
+            ref_position=self.ref_position,
+            num_records=num_records,
             enforce_realtime=True
             )
-        
-        with session.initiate():
-            waveforms = session.channels[1].fetch()  # Really only concerned with channel 1. This was [0,1]
-        #for wfm in waveforms:
-        #    print('Channel {}, record {} samples acquired: {:,}\n'.format(wfm.channel, wfm.record, len(wfm.samples)))
+        self.num_records = num_records
+        self.num_pts = int(s.horz_record_length)  # the driver may round up
+        self.sample_rate = float(s.horz_sample_rate)
+
+    def fetch_into(self, buf):
+        """Acquire `num_records` records into `buf` (float64, num_records*num_pts)."""
+        with self.session.initiate():
+            return self.session.channels[self.channel].fetch_into(buf, num_records=self.num_records)
+
+    def abort(self):
+        if self.session is not None:
+            self.session.abort()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+
+class FakeScope:
+    """
+    Stand-in backend for development without the digitizer.
+
+    A record is a lock-in output: a level plus white noise, and optionally
+    mains pickup (`mains` volts at `mains_hz`), a slow random-walk offset
+    (`drift` volts per fetch) and ADC quantization (`bits` over `vrange`).
+    With `spectrum` and `wavelength` (callables: nm -> volts, () -> nm)
+    the level follows the simulated grating. `realtime` makes a fetch
+    take as long as the record lasts, like the hardware.
+    """
+    def __init__(self, num_pts=5000000, level=1.0, noise=0.01, seed=None, sample_rate=50000000, realtime=False,
+                 spectrum=None, wavelength=None, mains=0.0, mains_hz=50.0, drift=0.0, bits=None, vrange=40.0):
+        self.num_pts = num_pts
+        self.realtime = realtime  # sleep for the record duration like real hardware
+        self.num_records = 1
+        self.sample_rate = sample_rate
+        self.level = level
+        self.noise = noise
+        self.spectrum, self.wavelength = spectrum, wavelength
+        self.mains, self.mains_hz = mains, mains_hz
+        self.drift, self.offset = drift, 0.0
+        self.lsb = vrange / 2 ** bits if bits else None
+        self.rng = np.random.default_rng(seed)
+        self.fetches = 0
+        self._hum = None
+
+    def open(self): pass
+
+    def configure(self, num_records, num_pts):
+        self.num_records, self.num_pts = num_records, num_pts
+
+    def _level(self):
+        if self.spectrum is None or self.wavelength is None:
+            return self.level
+        nm = self.wavelength()
+        return self.level if nm is None else self.spectrum(nm)
 
-        wfm = waveforms[0]
+    def fetch_into(self, buf):
+        self.fetches += 1
+        if self.realtime:
+            time.sleep(buf.size / self.sample_rate)
+        if self.drift:
+            self.offset += self.rng.normal(0.0, self.drift)
+        level = self._level() + self.offset
+        if self.noise:
+            self.rng.standard_normal(out=buf)
+            buf *= self.noise
+            buf += level
+        else:
+            buf.fill(level)
+        if self.mains:
+            # One record's worth of hum, computed once per record length
+            n = self.num_pts
+            if self._hum is None or self._hum.size != n:
+                self._hum = self.mains * np.sin(2 * np.pi * self.mains_hz / self.sample_rate * np.arange(n))
+            buf.reshape(-1, n)[:] += self._hum
+        if self.lsb:
+            buf /= self.lsb
+            np.round(buf, out=buf)
+            buf *= self.lsb
 
-        data_store = []
-        for i in range(len(wfm.samples)):
-            data_store.append(wfm.samples[i])
+    def abort(self): pass
 
-        data_point = np.average(data_store)
-        print(data_point)
+    def close(self): pass
 
-        return data_point
 
+def sim_spectrum(nm):
+    """Default FakeScope spectrum: two emission lines on a sloped background (volts)."""
+    return (0.2 + 0.0004 * (nm - 400.0)
+            + 1.5 * np.exp(-0.5 * ((nm - 532.0) / 6.0) ** 2)
+            + 0.8 * np.exp(-0.5 * ((nm - 610.0) / 15.0) ** 2))
+
+
+# --- Measurer -----------------------------------------------------------------
+class Measurer:
+    """
+    Persistent scope measurer: the session stays open and configured, samples
+    land in a preallocated buffer and are reduced with vectorized NumPy.
+    `reduce` is a name from REDUCTIONS or any callable taking the record array.
+    """
+    def __init__(self, backend=None, reduce="mean"):
+        self.backend = backend if backend is not None else NIScopeBackend()
+        self.reduce = reduce
+        self.record_pts = self.backend.num_pts   # single-record length used by record()
+        self._buf = None
+        self._config = None                      # (num_records, num_pts) last requested
+
+    @property
+    def reduce(self):
+        return self._reduce
+
+    @reduce.setter
+    def reduce(self, fn):
+        self._reduce = REDUCTIONS[fn] if isinstance(fn, str) else fn
+
+    def open(self):
+        self.backend.open()
+        self._alloc()
+        self._config = (self.backend.num_records, self.record_pts)
+        return self
+
+    def _alloc(self):
+        n = self.backend.num_pts * self.backend.num_records
+        if self._buf is None or self._buf.size != n:
+            self._buf = np.empty(n, dtype=np.float64)
+
+    def configure(self, num_records=1, num_pts=None):
+        """Change records per fetch / points per record (no-op when unchanged)."""
+        req = (num_records, num_pts or self.record_pts)
+        if req != self._config or self._buf is None:
+            self.backend.configure(*req)
+            self._alloc()
+            self._config = req
+
+    def record(self):
+        """One record reduced to a single value."""
+        self.configure(1, self.record_pts)
+        self.backend.fetch_into(self._buf)
+        return self._reduce(self._buf)
+
+    def record_multi(self, num_records, num_pts=None):
+        """
+        Acquire `num_records` back-to-back records in one fetch.
+        Returns (values, t_mid): per-record reductions and the host
+        time.monotonic() at the middle of each record.
+        """
+        self.configure(num_records, num_pts)
+        n, pts = self.backend.num_records, self.backend.num_pts
+        t0 = time.monotonic()
+        self.backend.fetch_into(self._buf)
+        dt = pts / self.backend.sample_rate
+        values = np.atleast_1d(self._reduce(self._buf.reshape(n, pts)))
+        return values, t0 + (np.arange(n) + 0.5) * dt
+
+    def abort(self):
+        self.backend.abort()
+
+    def close(self):
+        self.backend.close()
+        self._buf = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Module-level API (kept for existing callers) -------------------------------
+_measurer = None
+
+def get():
+    """The shared, persistent Measurer (opened on first use)."""
+    global _measurer
+    if _measurer is None:
+        from config import CONFIG
+        backend = FakeScope(spectrum=sim_spectrum, **CONFIG.get("sim_scope", {})) if CONFIG.get("sim") else None
+        _measurer = Measurer(backend).open()
+    return _measurer
+
+def record():
+    return get().record()
+
+def close():
+    global _measurer
+    if _measurer is not None:
+        try:
+            _measurer.close()
+        finally:
+            _measurer = None
@@ -3,6 +3,11 @@ import ttkbootstrap as tb
 from ttkbootstrap.constants import *
 from tkinter import ttk
 
+from config import CONFIG
+from clients.registry import DeviceRegistry
+from telemetry import TRACER
+from widgets.notice_bar import NoticeBar
+
 MODES = {
     "HyperSpectral": "modes.hyperspectral:HyperSpectralView",
     "FLIM": "modes.flim:FlimView",
@@ -24,6 +29,20 @@ class App(tb.Window):
         self.container.rowconfigure(0, weight=1)
         self.container.columnconfigure(0, weight=1)
 
+        # Helper fallbacks and reconnects (telemetry notices), whatever the mode
+        self.notices = NoticeBar(self, padding=(8, 2))
+        self.notices.grid(row=1, column=0, sticky="ew")
+
+        # Command/phase timing (replaces the old console echo of helper traffic)
+        TRACER.configure(**CONFIG.get("telemetry", {}))
+
+        # Helper sessions shared by every mode, started in the background
+        dev = CONFIG.get("devices", {})
+        self.devices = DeviceRegistry(CONFIG, health_s=dev.get("health_s", 5.0))
+        if dev.get("prewarm", True):
+            self.devices.prewarm()
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+
         self.current_view = None
         self.show_home()
 
@@ -39,6 +58,13 @@ class App(tb.Window):
         y = (sh - h) // 2
         self.geometry(f"{w}x{h}+{x}+{y}")
 
+    def _on_close(self):
+        try:
+            self._clear_view()
+        finally:
+            self.devices.close()
+            self.destroy()
+
     def show_home(self):
         self._clear_view()
         def _show():
@@ -0,0 +1,258 @@
+# analysis/lifetime.py
+from __future__ import annotations
+
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+try:
+    from scipy.optimize import curve_fit
+except ImportError:  # multi-exponential fits are optional
+    curve_fit = None
+
+
+# -----------------------------------------------------------------------------
+# Vectorized estimators: `hists` is (..., bins), `res_ns` the bin width
+# -----------------------------------------------------------------------------
+def phasor(hists, res_ns: float, period_ns: float | None = None, harmonic=1, t0_ns=None):
+    """
+    Phasor coordinates (G, S) and phase lifetime per histogram.
+    `period_ns` defaults to the full histogram range (bins * res_ns). Time
+    zero `t0_ns` (scalar or per histogram) defaults to each histogram's peak;
+    pass the IRF position for calibrated phasors.
+    """
+    h = np.asarray(hists, dtype=np.float64)
+    bins = h.shape[-1]
+    period = period_ns or bins * res_ns
+    w = 2 * np.pi * harmonic / period
+    t = np.arange(bins) * res_ns
+    if t0_ns is None:
+        t0_ns = h.argmax(axis=-1) * res_ns
+    total = h.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (h @ np.exp(1j * w * t)) / total * np.exp(-1j * w * np.asarray(t0_ns))
+        g, s = z.real, z.imag
+        tau_phase = s / (g * w)
+    return g, s, tau_phase
+
+
+def tail_fit(hists, res_ns: float, skip_bins=2, min_photons=100):
+    """
+    Mono-exponential lifetime by maximum likelihood over the decay tail, from
+    `skip_bins` after the rise to the end of the histogram. The photons of an
+    exponential binned and truncated to K bins follow a truncated geometric
+    distribution, P(k) ~ exp(-k*res/tau), whose mean delay fixes tau (solved
+    by bisection); unlike a log-linear fit it stays unbiased on sparse
+    histograms. The constant background is estimated from the bins before
+    the rise and subtracted. NaN with fewer than `min_photons` in the tail,
+    or where the tail is too flat for the window to constrain tau.
+    """
+    h = np.asarray(hists, dtype=np.float64)
+    shape = h.shape[:-1]
+    h = h.reshape(-1, h.shape[-1])
+    n, bins = h.shape
+    idx = np.arange(bins)
+    # The rise is where a 9-bin moving sum first reaches half its maximum (the
+    # raw argmax of a sparse histogram is noise, often far into the tail)
+    m = min(9, bins)
+    c = np.concatenate([np.zeros((n, 1)), np.cumsum(h, axis=1)], axis=1)
+    run = c[:, m:] - c[:, :-m]
+    rise = (run >= 0.5 * run.max(axis=1, keepdims=True)).argmax(axis=1) + m // 2
+    start = rise + m // 2 + skip_bins
+    pre = idx[None, :] < (rise - m - skip_bins)[:, None]     # background well before the rise
+    npre = pre.sum(1)
+    bg = np.where(npre >= 5, (h * pre).sum(1) / np.maximum(npre, 1), 0.0)
+    k = idx[None, :] - start[:, None]                   # delay in bins after the window start
+    K = np.maximum(bins - start, 1).astype(np.float64)  # window length in bins
+    w = np.where(k >= 0, h, 0.0)
+    # Background subtracted from the sums (per bin it would be clipped at zero counts)
+    photons = w.sum(1) - bg * K
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = ((w * np.maximum(k, 0)).sum(1) - bg * K * (K - 1) / 2) / photons
+
+    def mean_delay(x):
+        # Mean of the truncated geometric with q = exp(-x), x = res/tau
+        return 1.0 / np.expm1(x) - K / np.expm1(np.minimum(K * x, 700.0))
+
+    # mean_delay falls monotonically from (K-1)/2 (x -> 0) to 0: bisect log(x)
+    lo, hi = np.full(n, np.log(1e-6)), np.full(n, np.log(50.0))
+    for _ in range(60):
+        mid = 0.5 * (lo + hi)
+        above = mean_delay(np.exp(mid)) > mean
+        lo = np.where(above, mid, lo)
+        hi = np.where(above, hi, mid)
+    x = np.exp(0.5 * (lo + hi))
+    tau = res_ns / x
+    flat = mean >= mean_delay(np.full(n, 1e-6)) * 0.999
+    tau[(photons < min_photons) | ~(mean > 0) | flat | (K < 3)] = np.nan
+    return tau.reshape(shape)
+
+
+# -----------------------------------------------------------------------------
+# Multi-exponential fits (process pool, optional scipy)
+# -----------------------------------------------------------------------------
+def _multiexp_model(n):
+    def model(t, *p):
+        y = np.full_like(t, p[-1])
+        for i in range(n):
+            y += p[2 * i] * np.exp(-t / p[2 * i + 1])
+        return y
+    return model
+
+
+def fit_multiexp(hist, res_ns: float, n_components=2):
+    """Least-squares fit of the tail; returns [a1, tau1, ..., an, taun, offset] or NaNs."""
+    out = np.full(2 * n_components + 1, np.nan)
+    if curve_fit is None:
+        return out
+    h = np.asarray(hist, dtype=np.float64)
+    k = int(h.argmax())
+    y = h[k:]
+    if y.sum() < 50:
+        return out
+    t = np.arange(y.size) * res_ns
+    span = t[-1] if t[-1] > 0 else 1.0
+    p0 = []
+    for i in range(n_components):
+        p0 += [y[0] / n_components, span / 20 * (4 ** i)]
+    p0.append(max(y[-10:].mean(), 0.0))
+    try:
+        p, _ = curve_fit(_multiexp_model(n_components), t, y, p0=p0,
+                         sigma=np.sqrt(np.maximum(y, 1.0)), bounds=(0, np.inf), maxfev=2000)
+        return p
+    except Exception:
+        return out
+
+
+def fit_multiexp_batch(hists, res_ns: float, n_components=2):
+    """Fit a (n, bins) batch in one process (the unit of work for the pool)."""
+    return np.array([fit_multiexp(h, res_ns, n_components) for h in hists])
+
+
+# -----------------------------------------------------------------------------
+# Streaming stage
+# -----------------------------------------------------------------------------
+class OnlineLifetimeEstimator:
+    """
+    Fits histograms as the scan delivers them.
+
+    `submit(step, hist)` is cheap (it only queues); a worker thread takes
+    whatever has accumulated and runs the vectorized phasor and tail-fit
+    estimators on the whole batch. Results go to (H, W, λ) maps stored as
+    .npy memmaps in `out_dir` (next to the raw cube): intensity, tau_tail,
+    g, s, tau_phase and, with `multiexp=n`, the amplitude-weighted mean
+    lifetime of an n-component fit run in a process pool.
+    `on_batch(iy, ix, k, results)` (if given) is called from the worker
+    thread after each batch with index arrays and a dict of result arrays.
+    """
+    MAPS = ("intensity", "tau_tail", "g", "s", "tau_phase")
+
+    def __init__(self, out_dir, height, width, wavelengths, res_ns: float,
+                 multiexp: int = 0, workers: int | None = None, batch=256, on_batch=None):
+        self.out_dir = Path(out_dir)
+        self.shape = (height, width, len(wavelengths))
+        self.wls = np.asarray(wavelengths, dtype=float)
+        self.res_ns = res_ns
+        self.multiexp = multiexp if curve_fit is not None else 0
+        self.batch = batch
+        self.on_batch = on_batch
+        self.maps: dict[str, np.ndarray] = {}
+        self._q: queue.Queue = queue.Queue()
+        self._pool = ProcessPoolExecutor(workers) if self.multiexp else None
+        self._fits = []
+        self._t = threading.Thread(target=self._loop, name="lifetime", daemon=True)
+        self._t.start()
+
+    def _alloc(self):
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        names = self.MAPS + (("tau_multi",) if self.multiexp else ())
+        for name in names:
+            m = np.lib.format.open_memmap(self.out_dir / f"{name}.npy", mode="w+",
+                                          dtype=np.float32, shape=self.shape)
+            m[:] = np.nan
+            self.maps[name] = m
+
+    def wl_index(self, nm: float) -> int:
+        return int(np.abs(self.wls - nm).argmin())
+
+    def submit(self, step, hist):
+        """Queue one histogram ((bins,) or (channels, bins)) for pixel/wavelength `step`."""
+        h = np.asarray(hist)
+        if h.ndim > 1:
+            h = h.sum(axis=0)
+        k = self.wl_index(step.wl)
+        self._q.put((step.iy, step.ix, k, np.array(h, dtype=np.float64)))  # copy: ring slots get reused
+
+    def __call__(self, step, hist):
+        if hist is not None:
+            self.submit(step, hist)
+
+    def _loop(self):
+        while True:
+            item = self._q.get()
+            if item is None:
+                return
+            items = [item]
+            while len(items) < self.batch:
+                try:
+                    nxt = self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._process(items)
+                    return
+                items.append(nxt)
+            self._process(items)
+
+    def _process(self, items):
+        if not self.maps:
+            self._alloc()
+        bins = min(len(it[3]) for it in items)
+        iy = np.array([it[0] for it in items])
+        ix = np.array([it[1] for it in items])
+        k = np.array([it[2] for it in items])
+        H = np.stack([it[3][:bins] for it in items])
+
+        g, s, tau_phase = phasor(H, self.res_ns)
+        res = {"intensity": H.sum(axis=1), "tau_tail": tail_fit(H, self.res_ns),
+               "g": g, "s": s, "tau_phase": tau_phase}
+        for name, v in res.items():
+            self.maps[name][iy, ix, k] = v
+        if self.on_batch is not None:
+            self.on_batch(iy, ix, k, res)
+
+        if self._pool is not None:
+            fut = self._pool.submit(fit_multiexp_batch, H, self.res_ns, self.multiexp)
+            fut.add_done_callback(lambda f, loc=(iy, ix, k): self._store_multi(loc, f))
+            self._fits.append(fut)
+
+    def _store_multi(self, loc, fut):
+        try:
+            p = fut.result()
+        except Exception:
+            return
+        n = self.multiexp
+        amps, taus = p[:, 0:2 * n:2], p[:, 1:2 * n:2]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.maps["tau_multi"][loc] = (amps * taus).sum(1) / amps.sum(1)
+
+    def value(self, name, iy, ix, k):
+        m = self.maps.get(name)
+        return np.nan if m is None else float(m[iy, ix, k])
+
+    def close(self):
+        """Finish queued work (and pending multi-exponential fits) and flush the maps."""
+        self._q.put(None)
+        self._t.join()
+        if self._pool is not None:
+            for f in self._fits:
+                try:
+                    f.result()
+                except Exception:
+                    pass
+            self._pool.shutdown()
+        for m in self.maps.values():
+            m.flush()
@@ -0,0 +1,204 @@
+# bench/cases.py
+"""
+Benchmark cases. Each takes its parameters as keyword arguments and
+returns a dict of metrics; names ending in `_per_s` are better when
+higher, everything else (`_us`, `_ms`, `_s`) when lower. Peak memory is
+added by the runner.
+
+Device cases start the Python simulators (sim/*.py) with zero command
+latency, so they measure this code, not a latency model.
+"""
+from __future__ import annotations
+
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import DataMeasurer as dm
+from clients.cached import CachedCornerstone, CachedStage, CachedTH260
+from clients.cornerstone_client import CornerstoneClient
+from clients.proc import _LineProcess
+from clients.stage_client import StageClient
+from clients.th260_client import TH260Client
+from scan.engine import ScanEngine
+from scan.planner import plan
+from scan.program import ProgramScan
+from scan.settle import mono_settler
+from scan.worker import AcquisitionWorker
+from storage.datacube import ScratchIngestor
+
+SIMS = Path(__file__).resolve().parent.parent / "sim"
+
+# Simulator settings for every device case: no artificial latency or faults
+SIM_ENV = {"SIM_LATENCY_MS": "0", "SIM_JITTER_MS": "0", "SIM_ERR_RATE": "0", "SIM_DROP_RATE": "0",
+           "SIM_SLOW_RATE": "0", "SIM_CRASH_AFTER": "0", "SIM_SEED": "1"}
+
+
+@contextlib.contextmanager
+def sim_env(**extra):
+    """SIM_* variables for helpers started inside the block."""
+    env = {**SIM_ENV, **{k: str(v) for k, v in extra.items()}}
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None: os.environ.pop(k, None)
+            else: os.environ[k] = v
+
+
+@contextlib.contextmanager
+def devices(stage=True, th260=True, cornerstone=True):
+    """(stage, th260, mono) simulator clients, cached and opened as the app does."""
+    st = th = mono = None
+    try:
+        with sim_env():
+            if stage:
+                st = CachedStage(StageClient(str(SIMS / "stage_sim.py"))); st.open()
+            if th260:
+                th = CachedTH260(TH260Client(str(SIMS / "th260_sim.py")))
+                th.connect(output_dir=tempfile.gettempdir(), ix=1, iy=1)
+                th.open_ring()
+            if cornerstone:
+                mono = CachedCornerstone(CornerstoneClient(str(SIMS / "cornerstone_sim.py"))); mono.open()
+        yield st, th, mono
+    finally:
+        for c in (st, th, mono):
+            if c is not None:
+                try: c.close()
+                except Exception: pass
+
+
+def _percentiles_us(dt):
+    dt = np.asarray(dt) * 1e6
+    return float(np.median(dt)), float(np.percentile(dt, 95))
+
+
+# -----------------------------------------------------------------------------
+# Cases
+# -----------------------------------------------------------------------------
+def roundtrip(n=2000, batch=200) -> dict:
+    """_LineProcess: one command at a time, then pipelined batches (`send_many`)."""
+    with sim_env():
+        proc = _LineProcess(str(SIMS / "cornerstone_sim.py"))
+    try:
+        proc.send("open")
+        dt = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            proc.send("position")
+            dt.append(time.perf_counter() - t0)
+        p50, p95 = _percentiles_us(dt)
+        t0 = time.perf_counter()
+        for _ in range(max(1, n // batch)):
+            proc.send_many(["position"] * batch)
+        pipelined = max(1, n // batch) * batch / (time.perf_counter() - t0)
+    finally:
+        proc.close()
+    return {"rtt_p50_us": p50, "rtt_p95_us": p95, "cmds_per_s": n / sum(dt), "pipelined_cmds_per_s": pipelined}
+
+
+def measurer(num_pts=5_000_000, repeats=5) -> dict:
+    """DataMeasurer reductions of one record, and full record() including the (simulated) fetch."""
+    m = dm.Measurer(dm.FakeScope(num_pts=num_pts, noise=0.01, seed=1)).open()
+    try:
+        m.record()                                  # buffer allocated and filled
+        out = {}
+        for name, fn in (("mean", dm.mean), ("rms", dm.rms), ("boxcar", dm.boxcar(0.25, 0.75))):
+            t0 = time.perf_counter()
+            for _ in range(repeats):
+                fn(m._buf)
+            out[f"{name}_msamples_per_s"] = repeats * num_pts / (time.perf_counter() - t0) / 1e6
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            m.record()
+        out["record_ms"] = (time.perf_counter() - t0) / repeats * 1e3
+    finally:
+        m.close()
+    return out
+
+
+def flim(width=8, height=8, n_wl=2, tacq_ms=5, order="wavelength-serpentine", engine="steps") -> dict:
+    """
+    Full FLIM scan against the simulators: ScanEngine (`engine="steps"`) or
+    helper programs (`"program"`), histograms into a datacube as the app does.
+    """
+    wls = np.linspace(600.0, 610.0, n_wl).tolist()
+    steps = plan(order, width, height, wls).steps(width, height, wls)
+    n = width * height * n_wl
+    work = Path(tempfile.mkdtemp(prefix="ltb_bench_"))
+    try:
+        with devices() as (st, th, mono):
+            ingest = ScratchIngestor(work / "cube", height, width, wls, work / "_incoming", tacq_ms=tacq_ms)
+            cls = ProgramScan if engine == "program" else ScanEngine
+            with contextlib.redirect_stdout(io.StringIO()), cls(st, mono, th) as eng:
+                t0 = time.perf_counter()
+                done = eng.run(steps, width, height, tacq_ms, str(work / "_incoming"), post_acquire=ingest)
+                elapsed = time.perf_counter() - t0
+            ingest.close()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    if done != n:
+        raise RuntimeError(f"completed {done} of {n} steps")
+    # Time not spent exposing: moves, settling, transfer, bookkeeping
+    return {"points_per_s": n / elapsed, "elapsed_s": elapsed,
+            "overhead_ms_per_point": (elapsed / n - tacq_ms / 1000.0) * 1e3}
+
+
+def hyperspectral(n_points=50, start=500.0, end=600.0, record_pts=500_000) -> dict:
+    """
+    Step scan as the hyperspectral view runs it: goto, closed-loop settle and
+    one digitizer record per point, on an AcquisitionWorker drained by a
+    second thread in place of the UI.
+    """
+    wls = np.linspace(start, end, n_points).tolist()
+    m = dm.Measurer(dm.FakeScope(num_pts=record_pts, noise=0.01, seed=1, realtime=True)).open()
+    got = []
+    try:
+        with devices(stage=False, th260=False) as (_st, _th, mono):
+            settler = mono_settler(mono, fallback_s=0.8)
+            mono.goto(wls[0]); settler.wait(wls[0])
+
+            def run(stop, emit):
+                prev = wls[0]
+                for wl in wls:
+                    if stop.is_set(): return
+                    if mono.goto(wl) is not False:
+                        settler.wait(wl, distance=abs(wl - prev), stop=stop, timeout=0.3)
+                    prev = wl
+                    emit((wl, m.record()))
+
+            t0 = time.perf_counter()
+            w = AcquisitionWorker(run).start()
+            while w.is_alive() or not w.results.empty():
+                got += w.drain()
+                time.sleep(0.005)
+            elapsed = time.perf_counter() - t0
+            if w.error is not None:
+                raise w.error
+    finally:
+        m.close()
+    record_s = record_pts / 50e6
+    return {"points_per_s": len(got) / elapsed, "elapsed_s": elapsed,
+            "overhead_ms_per_point": (elapsed / len(got) - record_s) * 1e3}
+
+
+# name -> (case, standard kwargs, quick kwargs)
+CASES = {
+    "roundtrip":             (roundtrip, {"n": 5000}, {"n": 1000}),
+    "measurer_5M":           (measurer, {"num_pts": 5_000_000, "repeats": 10}, {"num_pts": 5_000_000, "repeats": 3}),
+    "flim_steps":            (flim, {"width": 16, "height": 16, "n_wl": 3, "tacq_ms": 10},
+                                    {"width": 8, "height": 8, "n_wl": 2, "tacq_ms": 5}),
+    "flim_program":          (flim, {"width": 16, "height": 16, "n_wl": 3, "tacq_ms": 10, "engine": "program"},
+                                    {"width": 8, "height": 8, "n_wl": 2, "tacq_ms": 5, "engine": "program"}),
+    "flim_long_dwell":       (flim, {"width": 8, "height": 8, "n_wl": 2, "tacq_ms": 100},
+                                    {"width": 4, "height": 4, "n_wl": 1, "tacq_ms": 100}),
+    "hyperspectral_steps":   (hyperspectral, {"n_points": 101}, {"n_points": 26}),
+}
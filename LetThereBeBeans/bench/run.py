@@ -0,0 +1,166 @@
+# bench/run.py
+"""
+Scan throughput benchmarks against the simulated helpers.
+
+    python -m bench.run [--quick] [--cases flim_steps,roundtrip] [--repeat 3]
+                        [--baseline FILE] [--threshold 0.1] [--fail-on-regression]
+
+Run from the LetThereBeBeans folder (or `python bench/run.py`). Results are written to
+bench/results/<time>.json (metrics, peak memory per case, machine and
+git revision) and compared with the previous results file (or
+`--baseline`): a metric that is worse by more than `threshold` (10%) is
+flagged as a regression. Compare only runs of the same kind (--quick or
+not) on the same machine.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from bench.cases import CASES       # noqa: E402  (needs ROOT on the path)
+
+RESULTS = Path(__file__).resolve().parent / "results"
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_s")
+
+
+def run_case(name, quick=False, repeat=1) -> dict:
+    """
+    Metrics of one case plus its peak traced memory (numpy buffers
+    included). With `repeat` > 1 each metric keeps its best value, which
+    damps scheduling noise on a busy machine.
+    """
+    fn, standard, small = CASES[name]
+    best: dict = {}
+    for _ in range(max(1, repeat)):
+        tracemalloc.start()
+        try:
+            metrics = fn(**(small if quick else standard))
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        metrics["peak_mem_mb"] = peak / 2**20
+        for k, v in metrics.items():
+            if k not in best:
+                best[k] = v
+            else:
+                best[k] = max(best[k], v) if higher_is_better(k) else min(best[k], v)
+    return best
+
+
+def _git_rev() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold=0.10) -> list[dict]:
+    """One row per metric present in both: relative change (+ = better) and a regression flag."""
+    rows = []
+    for case, metrics in current.get("results", {}).items():
+        base = baseline.get("results", {}).get(case, {})
+        for metric, value in metrics.items():
+            old = base.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                continue
+            change = (value - old) / abs(old)
+            if not higher_is_better(metric):
+                change = -change
+            rows.append({"case": case, "metric": metric, "old": old, "new": value, "change": change,
+                         "regression": change < -threshold})
+    return rows
+
+
+def latest_results(exclude: Path | None = None, quick: bool | None = None, cases=()) -> Path | None:
+    """Newest results file of the same kind (quick or full) sharing a case with `cases`."""
+    for path in sorted(RESULTS.glob("*.json"), reverse=True):
+        if path == exclude:
+            continue
+        try:
+            doc = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if quick is not None and doc.get("meta", {}).get("quick") != quick:
+            continue
+        if not cases or set(cases) & set(doc.get("results", {})):
+            return path
+    return None
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--quick", action="store_true", help="small configurations (about a minute)")
+    ap.add_argument("--cases", default="", help="comma list of cases (default: all): " + ", ".join(CASES))
+    ap.add_argument("--repeat", type=int, default=1, help="runs per case; the best value of each metric is kept")
+    ap.add_argument("--out", type=Path, help="results file (default: bench/results/<time>.json)")
+    ap.add_argument("--baseline", type=Path, help="results to compare with (default: the previous run)")
+    ap.add_argument("--threshold", type=float, default=0.10, help="relative change flagged as a regression")
+    ap.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+    args = ap.parse_args(argv)
+
+    names = [n.strip() for n in args.cases.split(",") if n.strip()] or list(CASES)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        ap.error(f"unknown case(s): {', '.join(unknown)}")
+
+    results, errors = {}, {}
+    for name in names:
+        print(f"{name} ...", flush=True)
+        try:
+            results[name] = run_case(name, args.quick, args.repeat)
+        except Exception as e:
+            errors[name] = f"{type(e).__name__}: {e}"
+            print(f"  failed: {errors[name]}")
+            continue
+        for metric, value in results[name].items():
+            print(f"  {metric:<28} {value:12.3f}")
+
+    doc = {
+        "meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "quick": args.quick, "repeat": args.repeat,
+                 "git": _git_rev(),
+                 "python": platform.python_version(), "numpy": np.__version__,
+                 "platform": platform.platform(), "machine": platform.node()},
+        "results": results,
+        "errors": errors,
+    }
+    out = args.out or RESULTS / time.strftime("%Y%m%d_%H%M%S.json")
+    baseline = args.baseline or latest_results(out, args.quick, results)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(doc, indent=2))
+    print(f"Results: {out}")
+
+    regressions = []
+    if baseline is not None and baseline.exists():
+        base = json.loads(baseline.read_text())
+        if base.get("meta", {}).get("quick") != args.quick:
+            print(f"Baseline {baseline.name} is a {'quick' if base['meta'].get('quick') else 'full'} run; "
+                  "changes are not comparable")
+        rows = compare(doc, base, args.threshold)
+        print(f"\nAgainst {baseline.name} ({base.get('meta', {}).get('git') or '?'}):")
+        for r in rows:
+            flag = "  REGRESSION" if r["regression"] else ""
+            print(f"  {r['case']:<22} {r['metric']:<28} {r['old']:12.3f} -> {r['new']:12.3f}  {100 * r['change']:+6.1f}%{flag}")
+        regressions = [r for r in rows if r["regression"]]
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {100 * args.threshold:.0f}%")
+    return 1 if (errors or (regressions and args.fail_on_regression)) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
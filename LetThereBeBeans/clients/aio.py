@@ -0,0 +1,206 @@
+# aio.py
+from __future__ import annotations
+import asyncio
+import time
+
+from .cornerstone_client import CornerstoneClient
+from .proc import _LineProcess
+from .stage_client import _StageCommands
+from .th260_client import Acquisition, HistogramRing, _TH260Commands, _fixed
+
+
+class _AsyncPending:
+    """A command waiting for its reply, resolved on the event loop."""
+    def __init__(self, line, tag=None, on_progress=None, owner=None):
+        self.line = line
+        self.tag = tag
+        self.on_progress = on_progress
+        self.owner = owner
+        self.t0 = time.perf_counter()
+        self.future = asyncio.get_running_loop().create_future()
+        # Replies nobody awaits any more (cancelled callers) must not warn
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def _resolve(self, resp=None, error=None):
+        if self.future.done():
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        elif not resp.startswith("OK"):
+            self.future.set_exception(RuntimeError(resp))
+        else:
+            self.future.set_result(resp)
+
+    def done(self):
+        return self.future.done()
+
+    async def result(self, timeout=10.0):
+        """
+        Wait for the reply; raises TimeoutError, or RuntimeError on ERR/exit.
+        Cancelling the caller only stops the wait: the entry stays queued so
+        the late reply is still matched to this command. A timeout gives the
+        command up as `_LineProcess` does.
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.future), timeout)
+        except asyncio.TimeoutError:
+            if self.owner is not None and not self.owner._abandon(self):
+                return await self.future
+            raise TimeoutError(f"no reply to {self.line!r} within {timeout:.1f} s") from None
+
+
+class AsyncLineProcess(_LineProcess):
+    """
+    asyncio version of _LineProcess: the same protocol and reply matching
+    (inherited), with the subprocess and its reader as a task on the
+    running loop instead of a thread. Create it with
+    `await AsyncLineProcess.start(exe)`; callbacks (`on_progress`,
+    listeners) run on the loop.
+    """
+    PENDING = _AsyncPending
+
+    def _start(self, greet_timeout):
+        pass        # the subprocess needs the running loop: see start()
+
+    @classmethod
+    async def start(cls, exe_path, greet_timeout=30.0):
+        self = cls(exe_path)
+        self._greet = self.PENDING("<greeting>")
+        self.p = await asyncio.create_subprocess_exec(
+            *self._argv(), stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT)
+        self._reader = asyncio.create_task(self._read_loop())
+        try:
+            greet = await self._greet.result(greet_timeout)
+        except Exception as e:
+            self._kill()
+            raise RuntimeError(f"{self.name} not ready: {e}") from None
+        self._greeted(greet)
+        return self
+
+    # --- Reader task
+    async def _read_loop(self):
+        try:
+            while True:
+                raw = await self.p.stdout.readline()
+                if not raw:
+                    break
+                self._dispatch(raw.decode("utf-8", "replace").rstrip("\r\n"))
+        except Exception:
+            pass
+        self._fail_all(RuntimeError(f"{self.name} {self.desynced or 'exited'}"))
+
+    def _running(self) -> bool:
+        return self.p.returncode is None
+
+    def _write(self, text):
+        self.p.stdin.write((text + "\n").encode("utf-8"))
+
+    # --- Commands
+    async def send(self, line, timeout=10.0):
+        return await self.submit(line).result(timeout)
+
+    async def send_many(self, lines, timeout=10.0):
+        pending = [self.submit(l) for l in lines]
+        return [await p.result(timeout) for p in pending]
+
+    async def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.send("exit", timeout=2.0)
+        except Exception:
+            pass
+        self._kill()
+        try:
+            await asyncio.wait_for(self.p.wait(), 2.0)
+        except Exception:
+            pass
+
+    def _kill(self):
+        try:
+            self.p.terminate()
+        except Exception:
+            pass
+
+
+# -----------------------------------------------------------------------------
+# Clients: the threaded clients' commands, with `_cmd` as a coroutine
+# -----------------------------------------------------------------------------
+class _AsyncCommands:
+    @classmethod
+    async def start(cls, exe):
+        return cls(proc=await AsyncLineProcess.start(exe))
+
+    async def _cmd(self, line, parse=None, timeout=10.0, on_progress=None):
+        resp = await self.proc.submit(line, on_progress).result(timeout)
+        return parse(resp) if parse else None
+
+    async def _cmd_many(self, lines, timeout=10.0):
+        return await self.proc.send_many(lines, timeout)
+
+
+class AsyncStageClient(_AsyncCommands, _StageCommands):
+    """StageClient's commands, awaitable (no scan programs: see scan.program)."""
+
+    async def disable(self):
+        try:
+            await self._cmd("disable")
+        except Exception:
+            pass
+
+    async def close(self):
+        try:
+            await self.disable()
+        finally:
+            await self.proc.close()
+
+
+class AsyncCornerstoneClient(_AsyncCommands, CornerstoneClient):
+    """CornerstoneClient with awaitable commands."""
+
+    async def close(self):
+        await self.proc.close()
+
+
+class AsyncTH260Client(_AsyncCommands, _TH260Commands):
+    """
+    TH260Client's commands, awaitable (no scan programs). Cancelling
+    `acquire_until` writes `stop`, so the helper ends the measurement
+    instead of finishing it; other cancelled commands just stop waiting
+    (the reply is absorbed).
+    """
+
+    async def acquire_until(self, tmax_ms: int, output_dir: str, wl: float, ix: int, iy: int,
+                            target_counts: int | None = None, target_snr: float | None = None,
+                            part_ms: int = 50, on_exposed=None) -> Acquisition:
+        if self.partial is False:
+            return _fixed(await self.acquire(tmax_ms, output_dir, wl, ix, iy, on_exposed), tmax_ms)
+        cmd, slot = self._part_cmd(tmax_ms, output_dir, wl, ix, iy, part_ms)
+        progress, stop = self._part_progress(target_counts, target_snr, on_exposed)
+        try:
+            resp = await self.proc.submit(cmd, on_progress=progress).result(max(10.0, tmax_ms / 1000.0 + 10.0))
+        except asyncio.CancelledError:
+            stop()
+            raise
+        except RuntimeError as e:
+            if self._part_unsupported(e):
+                return await self.acquire_until(tmax_ms, output_dir, wl, ix, iy, on_exposed=on_exposed)
+            raise
+        return self._part_result(resp, slot, tmax_ms)
+
+    async def open_ring(self, slots: int = 16) -> HistogramRing:
+        ring = self._new_ring(await self.info(), slots)
+        try:
+            await self._cmd(f"shm_open {ring.name} {ring.slots} {ring.channels} {ring.bins}")
+        except Exception:
+            ring.close()
+            raise
+        return self._use_ring(ring)
+
+    async def close(self) -> None:
+        await self.proc.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
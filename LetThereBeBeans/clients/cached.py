@@ -0,0 +1,128 @@
+# cached.py
+from __future__ import annotations
+
+
+class _StateCache:
+    """
+    Wraps a client and remembers the last state it commanded.
+
+    Commands that would not change anything are skipped and return False;
+    commands that were sent return True, so callers can also skip the settle
+    delay. Any error from the wrapped client clears the cached state (the
+    device may be anywhere now); call `invalidate()` after a reconnect or
+    when something else moved the hardware.
+    Methods without a cached counterpart are passed through unchanged.
+    """
+    def __init__(self, client):
+        self._client = client
+        self.state: dict = {}
+
+    @property
+    def client(self):
+        return self._client
+
+    def invalidate(self, *keys):
+        """Forget `keys` (or everything)."""
+        if not keys:
+            self.state.clear()
+        for k in keys:
+            self.state.pop(k, None)
+
+    def _set(self, key, value, fn, *args, **kwargs) -> bool:
+        if key in self.state and self.state[key] == value:
+            return False
+        self.state.pop(key, None)
+        self._guard(fn, *args, **kwargs)
+        self.state[key] = value
+        return True
+
+    def _guard(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            self.invalidate()
+            raise
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+        return lambda *a, **kw: self._guard(attr, *a, **kw)
+
+
+class CachedCornerstone(_StateCache):
+    """CornerstoneClient with wavelength/shutter tracking."""
+
+    def open(self):
+        self.invalidate()
+        self._guard(self._client.open)
+
+    def goto(self, nm: float) -> bool:
+        return self._set("wavelength", round(float(nm), 4), self._client.goto, nm)
+
+    def sweep(self, start_nm: float, end_nm: float, nm_per_s: float):
+        self.invalidate("wavelength")   # the grating ends up wherever the sweep stopped
+        self._guard(self._client.sweep, start_nm, end_nm, nm_per_s)
+
+    def open_shutter(self) -> bool:
+        return self._set("shutter", True, self._client.open_shutter)
+
+    def close_shutter(self) -> bool:
+        return self._set("shutter", False, self._client.close_shutter)
+
+    def close(self):
+        self.invalidate()
+        self._client.close()
+
+
+class CachedStage(_StateCache):
+    """StageClient with pixel/DAC tracking (a pixel move changes the DAC codes and vice versa)."""
+
+    def open(self, *args, **kwargs):
+        self.invalidate()
+        self._guard(self._client.open, *args, **kwargs)
+
+    def move_ix(self, ix, iy, width, height) -> bool:
+        changed = self._set("pixel", (int(ix), int(iy), int(width), int(height)),
+                            self._client.move_ix, ix, iy, width, height)
+        if changed: self.invalidate("dac")
+        return changed
+
+    def setdac(self, vx_code, vy_code) -> bool:
+        changed = self._set("dac", (int(vx_code), int(vy_code)), self._client.setdac, vx_code, vy_code)
+        if changed: self.invalidate("pixel")
+        return changed
+
+    def wave_run(self, rate_hz, timeout=60.0):
+        self.invalidate()   # the waveform leaves the stage at its last sample
+        return self._guard(self._client.wave_run, rate_hz, timeout)
+
+    def run_program(self, *args, **kwargs):
+        self.invalidate()   # the program leaves the stage at its last pixel
+        return self._guard(self._client.run_program, *args, **kwargs)
+
+    def reset(self, ix, width):
+        self.invalidate()
+        self._guard(self._client.reset, ix, width)
+
+    def disable(self):
+        self.invalidate()
+        self._client.disable()
+
+    def close(self):
+        self.invalidate()
+        self._client.close()
+
+
+class CachedTH260(_StateCache):
+    """TH260Client that only re-runs `init` when its arguments change."""
+
+    def init(self, output_dir: str, ix: int, iy: int) -> bool:
+        return self._set("init", (str(output_dir), int(ix), int(iy)), self._client.init, output_dir, ix, iy)
+
+    def connect(self, output_dir: str = "dump", ix: int = 1, iy: int = 1) -> bool:
+        return self.init(output_dir, ix, iy)
+
+    def close(self):
+        self.invalidate()
+        self._client.close()
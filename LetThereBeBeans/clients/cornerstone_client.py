@@ -1,29 +1,36 @@
-from .proc import _LineProcess
+from .proc import _Client
 
-class CornerstoneClient:
-    def __init__(self, exe_path: str):
-        self.proc = _LineProcess(exe_path)
 
+def _parse_position(r):
+    # "OK POS=###.###"
+    for tok in r.split():
+        if tok.startswith("POS="):
+            return float(tok.split("=")[1])
+    raise RuntimeError(f"bad position line: {r}")
+
+
+class CornerstoneClient(_Client):
     def open(self):
-        self.proc.send("open")
+        return self._cmd("open")
 
     def goto(self, nm: float):
-        self.proc.send(f"goto {float(nm)}")
+        return self._cmd(f"goto {float(nm)}")
+
+    def sweep(self, start_nm: float, end_nm: float, nm_per_s: float):
+        """
+        Start a continuous grating sweep and return immediately (helper must
+        support `sweep`; older helpers answer ERR). Poll `position()` to follow it.
+        """
+        return self._cmd(f"sweep {float(start_nm)} {float(end_nm)} {float(nm_per_s)}")
 
     def position(self) -> float:
-        r = self.proc.send("position")  # "OK POS=###.###"
-        for tok in r.split():
-            if tok.startswith("POS="):
-                return float(tok.split("=")[1])
-        raise RuntimeError(f"bad position line: {r}")
+        return self._cmd("position", parse=_parse_position)
 
     def open_shutter(self):
-        self.proc.send("open_shutter")
+        return self._cmd("open_shutter")
 
     def close_shutter(self):
-        self.proc.send("close_shutter")
+        return self._cmd("close_shutter")
 
     def close(self):
         self.proc.close()
-
-
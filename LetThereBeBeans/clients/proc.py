@@ -1,42 +1,312 @@
 # proc.py
 import os
+import sys
 import subprocess
+import threading
+import itertools
+import time
+from collections import deque
+
+from telemetry import TRACER
+
+
+class _Pending:
+    """A command that was written to the helper and is waiting for its reply."""
+    def __init__(self, line, tag=None, on_progress=None, owner=None):
+        self.line = line
+        self.tag = tag
+        self.on_progress = on_progress
+        self.owner = owner
+        self.t0 = time.perf_counter()
+        self.resp = None
+        self.error = None
+        self._done = threading.Event()
+
+    def _resolve(self, resp=None, error=None):
+        self.resp, self.error = resp, error
+        self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=10.0):
+        """Wait for the reply line; raises TimeoutError, or RuntimeError on ERR/exit."""
+        if not self._done.wait(timeout):
+            # The reply may have arrived just now: only give up if it did not
+            if self.owner is None or self.owner._abandon(self):
+                raise TimeoutError(f"no reply to {self.line!r} within {timeout:.1f} s")
+        if self.error is not None:
+            raise self.error
+        if not self.resp.startswith("OK"):
+            raise RuntimeError(self.resp)
+        return self.resp
+
 
 class _LineProcess:
     """
-    Minimal line-oriented subprocess wrapper (stdin/stdout).
-    Used for th260_helper.exe and stage_helper.exe.
+    Line-oriented subprocess wrapper (stdin/stdout).
+    Used for th260_helper.exe, stage_helper.exe and cornerstone_helper.exe.
+
+    A background thread reads stdout, so every command has a real deadline and
+    several commands can be in flight (`submit`). Replies are matched to
+    commands in order; if the helper's greeting advertises `TAGS=1`, commands
+    are sent as `@<id> <cmd>` and replies `@<id> OK ...` are matched by id.
+    Lines that are not replies (log output on the merged stderr) never
+    consume a pending command; they are kept in `unsolicited`. Untagged, a
+    reply must start with `OK` or `ERR` to count: anything else is taken
+    for log output, so a helper answering otherwise leaves the command to
+    time out (and be given up, below). Tagged, any `@<id>` line that is not
+    progress is the reply, and one without `OK` fails as an error.
+    A command that times out is given up: tagged, its late reply is just
+    unsolicited. Untagged, a late or missing reply would be matched to the
+    next command and shift every match after it, so the helper is
+    terminated instead (`desynced`); pending commands fail and the device
+    registry reopens it like any helper that exited. Progress
+    lines (`PART ...`, or `@<id> PART ...`) of a long command go to its
+    `on_progress` callback on the reader thread and do not complete it.
+    Every reply is timed from write to reply and recorded in the telemetry
+    tracer as a `cmd` span ("<helper>:<verb>"); the traffic is only
+    printed when the tracer's `echo` is on.
+    Events a helper emits on its own (`EV ...` from an uploaded program) go
+    to the callbacks registered with `listen(prefix, callback)`.
     """
-    def __init__(self, exe_path):
+    PROGRESS = ("PART",)
+
+    PENDING = _Pending
+
+    def __init__(self, exe_path, greet_timeout=30.0):
         self.exe_path = exe_path
+        self.name = os.path.basename(exe_path)
+        self.p = None
+        self.greeting = None
+        self.unsolicited = deque(maxlen=500)
+        self._listeners = []        # (prefix, callback)
+        self.tagged = False
+        self._ids = itertools.count(1)
+        self._fifo = deque()        # untagged pending, in send order
+        self._by_tag = {}           # tag -> pending
+        self._lock = threading.Lock()
+        self._greet = None
+        self._reader = None
+        self._closed = False
+        self._eof = False
+        self.desynced = None        # reason, once replies can no longer be matched
+        self._start(greet_timeout)
+
+    def _argv(self):
+        # Python stand-in helpers (sim/*.py) run under the current interpreter
+        if str(self.exe_path).endswith(".py"):
+            return [sys.executable, "-u", self.exe_path]
+        return [self.exe_path]
+
+    def _start(self, greet_timeout):
+        """Spawn the helper with its reader thread and wait for the greeting."""
+        self._greet = self.PENDING("<greeting>")
         self.p = subprocess.Popen(
-            [exe_path],
+            self._argv(),
             stdin=subprocess.PIPE, stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True, encoding="utf-8", bufsize=1
         )
-        greet = self.p.stdout.readline()
-        print(greet, "\n")
-        if not greet.startswith("OK"):
-            raise RuntimeError(f"{os.path.basename(exe_path)} not ready: {greet}")
+        self._reader = threading.Thread(target=self._read_loop, name=f"{self.name}-reader", daemon=True)
+        self._reader.start()
 
-    def send(self, line, timeout=10.0):
-        self.p.stdin.write(line + "\n")
-        print(line, "\n")
+        try:
+            greet = self._greet.result(greet_timeout)
+        except Exception as e:
+            self._kill()
+            raise RuntimeError(f"{self.name} not ready: {e}") from None
+        self._greeted(greet)
+
+    def _greeted(self, greet):
+        self.greeting = greet
+        if TRACER.echo: print(greet)
+        TRACER.record("cmd", f"{self.name}:<start>", self._greet.t0)
+        self.tagged = "TAGS=1" in greet.split()
+
+    # --- Reader thread
+    def _read_loop(self):
+        try:
+            for raw in self.p.stdout:
+                self._dispatch(raw.rstrip("\r\n"))
+        except Exception:
+            pass
+        self._fail_all(RuntimeError(f"{self.name} {self.desynced or 'exited'}"))
+
+    def _running(self) -> bool:
+        return self.p.poll() is None
+
+    def _write(self, text):
+        self.p.stdin.write(text + "\n")
         self.p.stdin.flush()
-        resp = self.p.stdout.readline()
-        print("resp", resp)
-        if not resp.startswith("OK"):
-            raise RuntimeError(resp)
-        return resp
+
+    def _dispatch(self, line):
+        if not self._greet.done():
+            # Anything printed before the greeting is log output, except the greeting itself
+            if line.startswith("OK") or line.startswith("ERR"):
+                self._greet._resolve(line)
+            else:
+                self.unsolicited.append(line)
+            return
+
+        with self._lock:
+            pending = progress = None
+            if self.tagged and line.startswith("@"):
+                tag, _, rest = line[1:].partition(" ")
+                line = rest
+                if line.startswith(self.PROGRESS):
+                    progress = self._by_tag.get(tag)
+                else:
+                    pending = self._by_tag.pop(tag, None)
+            elif not self.tagged and self._fifo:
+                if line.startswith("OK") or line.startswith("ERR"):
+                    pending = self._fifo.popleft()
+                elif line.startswith(self.PROGRESS):
+                    progress = self._fifo[0]
+        if progress is not None and progress.on_progress is not None:
+            try:
+                progress.on_progress(line)
+            except Exception:
+                pass
+        elif pending is None:
+            for prefix, callback in self._listeners:
+                if line.startswith(prefix):
+                    try:
+                        callback(line)
+                    except Exception:
+                        pass
+                    return
+            self.unsolicited.append(line)
+        else:
+            pending._resolve(line)
+            self._trace(pending, line)
+
+    def _trace(self, pending, line=None):
+        TRACER.record("cmd", f"{self.name}:{pending.line.split(' ', 1)[0]}", pending.t0,
+                      ok=line is not None and line.startswith("OK"))
+        if TRACER.echo: print(f"{self.name}: {pending.line} -> {line}")
+
+    def _fail_all(self, error):
+        # The reader saw the end of stdout: nothing can be answered any more
+        with self._lock:
+            self._eof = True
+            waiting = list(self._fifo) + list(self._by_tag.values())
+            self._fifo.clear(); self._by_tag.clear()
+            listeners = list(self._listeners)
+        for _prefix, callback in listeners:
+            try:
+                callback(error)
+            except Exception:
+                pass
+        if not self._greet.done():
+            self._greet._resolve(error=error)
+        for pending in waiting:
+            pending._resolve(error=error)
+            self._trace(pending)
+
+    # --- Events
+    def listen(self, prefix, callback):
+        """
+        Call `callback(line)` on the reader thread for every non-reply line
+        starting with `prefix`; if the helper exits it gets the exception.
+        """
+        with self._lock:
+            self._listeners.append((prefix, callback))
+
+    def unlisten(self, callback):
+        with self._lock:
+            self._listeners = [(p, c) for p, c in self._listeners if c != callback]
+
+    # --- Commands
+    def submit(self, line, on_progress=None):
+        """
+        Write `line` without waiting; returns a handle whose `result(timeout)`
+        gives the reply. `on_progress(text)` receives the command's PART lines.
+        """
+        with self._lock:
+            if self.desynced or self._eof or not self._running():
+                raise RuntimeError(f"{self.name} {self.desynced or 'exited'}")
+            if self.tagged:
+                pending = self.PENDING(line, str(next(self._ids)), on_progress, self)
+                self._by_tag[pending.tag] = pending
+                wire = f"@{pending.tag} {line}"
+            else:
+                pending = self.PENDING(line, on_progress=on_progress, owner=self)
+                self._fifo.append(pending)
+                wire = line
+            try:
+                self._write(wire)
+            except (OSError, ValueError, RuntimeError) as e:
+                if pending.tag is None: self._fifo.remove(pending)
+                else: self._by_tag.pop(pending.tag, None)
+                raise RuntimeError(f"{self.name}: write failed ({e})") from None
+        return pending
+
+    def write(self, line):
+        """Write an out-of-band line that gets no reply of its own (e.g. `stop`)."""
+        with self._lock:
+            try:
+                self._write(line)
+            except (OSError, ValueError, RuntimeError) as e:
+                raise RuntimeError(f"{self.name}: write failed ({e})") from None
+
+    def send(self, line, timeout=10.0):
+        """Send one command and wait up to `timeout` seconds for its OK reply."""
+        return self.submit(line).result(timeout)
+
+    def send_many(self, lines, timeout=10.0):
+        """Pipeline several commands; returns their replies in order."""
+        pending = [self.submit(l) for l in lines]
+        return [p.result(timeout) for p in pending]
+
+    def _abandon(self, pending) -> bool:
+        """Give up on `pending` after its timeout; False if it was answered meanwhile."""
+        with self._lock:
+            if pending.tag is not None:
+                return self._by_tag.pop(pending.tag, None) is not None
+            if pending not in self._fifo:
+                return False
+            self._fifo.remove(pending)
+            self.desynced = f"desynced (no reply to {pending.line.split(' ', 1)[0]!r})"
+        self._trace(pending)
+        try:
+            self.p.terminate()
+        except Exception:
+            pass
+        return True
 
     def close(self):
+        if self._closed:
+            return
+        self._closed = True
         try:
-            self.send("exit")
+            self.send("exit", timeout=2.0)
         except Exception:
             pass
+        self._kill()
+
+    def _kill(self):
         try:
             self.p.terminate()
         except Exception:
             pass
+        self._reader.join(timeout=1.0)
+
+
+class _Client:
+    """
+    Base of the device clients. Every command goes through `_cmd` (or
+    `_cmd_many`), so the asyncio clients (clients.aio) reuse each method by
+    overriding just these two: the methods then return awaitables.
+    """
+    def __init__(self, exe=None, proc=None):
+        self.proc = proc if proc is not None else _LineProcess(exe)
+
+    def _cmd(self, line, parse=None, timeout=10.0, on_progress=None):
+        """Send `line`, wait for its OK and return `parse(reply)` (None without `parse`)."""
+        resp = self.proc.submit(line, on_progress).result(timeout)
+        return parse(resp) if parse else None
 
+    def _cmd_many(self, lines, timeout=10.0):
+        """Pipeline `lines`; returns the replies."""
+        return self.proc.send_many(lines, timeout)
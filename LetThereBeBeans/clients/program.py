@@ -0,0 +1,132 @@
+# program.py
+from __future__ import annotations
+import base64
+import queue
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+# One step of an uploaded scan program, as sent in `prog_add` lines
+STEP_DTYPE = np.dtype([("ix", "<i4"), ("iy", "<i4"), ("wl", "<f8")])
+PROG_CHUNK = 4096   # steps per prog_add line
+
+
+class ProgramStep(NamedTuple):
+    """A step the helper reported as completed."""
+    index: int                  # position in the uploaded program
+    step: object                # the ScanStep that was uploaded
+    hist: np.ndarray | None     # copy of the ring slot, or None (file written / stage)
+    dwell_ms: float | None
+    counts: int | None
+
+
+def _kv(text: str) -> dict:
+    return dict(p.split("=", 1) for p in text.split() if "=" in p)
+
+
+def upload(proc, steps) -> int:
+    """Send `steps` (objects with ix, iy, wl) as `prog_clear` + pipelined `prog_add <b64>`."""
+    data = np.array([(s.ix, s.iy, s.wl) for s in steps], dtype=STEP_DTYPE)
+    lines = ["prog_clear"]
+    for i in range(0, len(data), PROG_CHUNK):
+        lines.append("prog_add " + base64.b64encode(data[i:i + PROG_CHUNK].tobytes()).decode("ascii"))
+    proc.send_many(lines)
+    return len(data)
+
+
+class ProgramRun:
+    """
+    A scan program the helper is executing on its own.
+
+    The helper streams one line per completed step and a final one:
+        EV STEP <i> [T=<ms>] [N=<counts>] [SLOT=<n>]
+        EV DONE N=<completed>
+        EV ERR <message>
+    Events are parsed on the reader thread; with a shared-memory ring the
+    slot is copied there, before the helper can reuse it. Iterating yields
+    ProgramStep items until DONE (raises RuntimeError on ERR or if the
+    helper exits, TimeoutError if it goes quiet for `idle_timeout` s).
+    `cancel()` writes `stop`: the helper finishes the current step and
+    reports DONE. `fail(error)` ends the run from the caller's side (e.g.
+    the command starting it failed).
+    """
+    def __init__(self, proc, steps, ring=None, idle_timeout=30.0, on_error=None):
+        self.proc = proc
+        self.steps = list(steps)
+        self.ring = ring
+        self.idle_timeout = idle_timeout
+        self.on_error = on_error
+        self.completed = 0
+        self.error: BaseException | None = None
+        self.finished = threading.Event()
+        self._q: queue.Queue = queue.Queue()
+        self._cancelled = False
+        proc.listen("EV ", self._on_line)
+
+    # --- Reader thread
+    def _on_line(self, line):
+        if isinstance(line, BaseException):
+            self._finish(line)
+            return
+        kind, _, rest = line[3:].partition(" ")
+        if kind == "STEP":
+            index, _, fields = rest.partition(" ")
+            kv = _kv(fields)
+            i = int(index)
+            hist = None
+            if self.ring is not None and "SLOT" in kv:
+                hist = self.ring.view(int(kv["SLOT"])).copy()
+            self._q.put(ProgramStep(i, self.steps[i], hist,
+                                    float(kv["T"]) if "T" in kv else None,
+                                    int(kv["N"]) if "N" in kv else None))
+        elif kind == "DONE":
+            self._finish(None)
+        elif kind == "ERR":
+            self._finish(RuntimeError(f"{self.proc.name}: program failed: {rest}"))
+
+    def _finish(self, error):
+        if self.finished.is_set():
+            return
+        self.error = error
+        self.proc.unlisten(self._on_line)
+        self.finished.set()
+        self._q.put(None)
+        if error is not None and self.on_error:
+            self.on_error(error)
+
+    # --- Consumer
+    def __iter__(self):
+        while True:
+            try:
+                item = self._q.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self.cancel()
+                raise TimeoutError(f"{self.proc.name}: no program event within {self.idle_timeout:.0f} s") from None
+            if item is None:
+                break
+            self.completed += 1
+            yield item
+        if self.error is not None:
+            raise self.error
+
+    def cancel(self):
+        if self._cancelled or self.finished.is_set():
+            return
+        self._cancelled = True
+        try:
+            self.proc.write("stop")
+        except RuntimeError:
+            pass
+
+    def fail(self, error: BaseException):
+        """End the run with `error` (no-op once finished): iteration and wait() raise it."""
+        self._finish(error)
+
+    def wait(self, timeout=None) -> bool:
+        """Block until DONE/ERR; raises the program's error."""
+        if not self.finished.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
@@ -0,0 +1,271 @@
+# registry.py
+from __future__ import annotations
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from telemetry import notice
+
+from .cached import CachedCornerstone, CachedStage, CachedTH260
+from .cornerstone_client import CornerstoneClient
+from .stage_client import StageClient
+from .th260_client import TH260Client
+
+# Fixed max output voltage for KCube Piezo in tenths of a volt (e.g., 750 = 75.0 V)
+FIXED_VMAX_TENTHS = 750
+
+
+def _open_stage(exe):
+    stage = CachedStage(StageClient(exe))
+    stage.open(vmax_tenths=FIXED_VMAX_TENTHS)
+    return stage
+
+
+def _open_th260(exe):
+    th260 = CachedTH260(TH260Client(exe))
+    # Keep compatibility with the helper's expectations
+    th260.connect(output_dir="dump", ix=1, iy=1)
+    try:
+        # Histograms via shared memory when the helper supports it
+        th260.open_ring()
+    except Exception as e:
+        notice("th260", f"shared memory unavailable ({e}), using files")
+    return th260
+
+
+def _open_cornerstone(exe):
+    mono = CachedCornerstone(CornerstoneClient(exe))
+    mono.open()
+    return mono
+
+
+# name -> (open(exe) -> client, probe(client)); the probe must answer quickly
+DEVICES: dict[str, tuple[Callable[[str], Any], Callable[[Any], Any]]] = {
+    "stage": (_open_stage, lambda c: c.status()),
+    "th260": (_open_th260, lambda c: c.info()),
+    "cornerstone": (_open_cornerstone, lambda c: c.position()),
+}
+
+
+class _Session:
+    def __init__(self, name):
+        self.name = name
+        self.client = None
+        self.error: BaseException | None = None
+        self.refs = 0
+        self.ready = threading.Event()      # set when `client` or `error` is final
+        self.opening = False
+
+
+class DeviceHandle:
+    """
+    A view's reference to a shared device. Attribute access goes to the
+    session's current client, so after an automatic reconnect the handle
+    keeps working. `close()` releases the reference; the helper keeps
+    running for the next user.
+    """
+    def __init__(self, registry: "DeviceRegistry", name: str):
+        self._registry, self._name = registry, name
+        self._released = False
+
+    @property
+    def client(self):
+        return self._registry._client(self._name)
+
+    def __getattr__(self, attr):
+        value = getattr(self.client, attr)
+        if not callable(value):
+            return value
+        # Resolved per call, so bound methods kept by callers (e.g. a settler's
+        # readback) follow a reconnect too
+        return lambda *a, **kw: getattr(self.client, attr)(*a, **kw)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._registry._release(self._name)
+
+    close = release
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class DeviceRegistry:
+    """
+    App-wide helper sessions, shared by all modes.
+
+    `prewarm()` starts every helper (and its hardware init) on background
+    threads at startup. `acquire(name)` returns a reference-counted handle,
+    waiting for the session if it is still opening; UIs use
+    `acquire_later(names)`, which does that on a thread. Sessions outlive the
+    views that use them and are only shut down by `close()` at exit, so
+    switching modes does not respawn anything.
+
+    A health thread checks every `health_s`: a helper whose process exited
+    is reopened in the background. Idle sessions (no handles) are also
+    probed with a cheap command; a probe that times out counts as hung.
+    In-use sessions are not probed, so a running scan is never interleaved.
+    """
+    def __init__(self, config, devices=None, health_s=5.0, open_timeout=60.0):
+        self.config = config
+        self.devices = dict(devices or DEVICES)
+        self.health_s = health_s
+        self.open_timeout = open_timeout
+        self._sessions = {name: _Session(name) for name in self.devices}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._health = threading.Thread(target=self._health_loop, name="device-health", daemon=True)
+        self._health.start()
+
+    # --- Opening
+    def prewarm(self, names=None):
+        """Open the helpers in the background (all registered devices by default)."""
+        for name in names or self.devices:
+            self._open_async(name)
+
+    def _open_async(self, name):
+        s = self._sessions[name]
+        with self._lock:
+            if s.opening or self._closed.is_set():
+                return
+            s.opening = True
+            s.ready.clear()
+        threading.Thread(target=self._open, args=(s,), name=f"open-{name}", daemon=True).start()
+
+    def _open(self, s: _Session):
+        opener, _probe = self.devices[s.name]
+        # The old helper may still hold the hardware: stop it before respawning
+        with self._lock:
+            old, s.client = s.client, None
+        if old is not None:
+            self._shutdown(old)
+        client = error = None
+        try:
+            client = opener(self.config["helpers"][s.name])
+        except Exception as e:
+            error = e
+            notice(s.name, f"open failed: {e}")
+        if client is not None and self._closed.is_set():
+            self._shutdown(client)          # the app closed while this was opening
+            client = None
+        with self._lock:
+            s.client, s.error, s.opening = client, error, False
+            s.ready.set()
+
+    # --- Handles
+    def acquire(self, name, timeout=None) -> DeviceHandle:
+        """A handle to `name`, opening (or reopening) the helper if needed."""
+        s = self._sessions[name]
+        with self._lock:
+            s.refs += 1
+        try:
+            self._client(name, timeout)
+        except Exception:
+            self._release(name)
+            raise
+        return DeviceHandle(self, name)
+
+    def acquire_later(self, names, timeout=None) -> Future:
+        """
+        `acquire` each of `names` on a thread; the future's result is
+        {name: handle}. If one fails, the handles already taken are released
+        and the future holds the error.
+        """
+        future = Future()
+
+        def work():
+            handles = {}
+            try:
+                for name in names:
+                    handles[name] = self.acquire(name, timeout)
+            except Exception as e:
+                for h in handles.values(): h.release()
+                future.set_exception(e)
+            else:
+                future.set_result(handles)
+        threading.Thread(target=work, name="acquire", daemon=True).start()
+        return future
+
+    def _client(self, name, timeout=None):
+        s = self._sessions[name]
+        if s.ready.is_set() and (s.client is None or not self._alive(s.client)):
+            self._open_async(name)          # failed earlier, or the helper died
+        elif not s.ready.is_set() and not s.opening:
+            self._open_async(name)
+        if not s.ready.wait(self.open_timeout if timeout is None else timeout):
+            raise TimeoutError(f"{name}: helper not ready")
+        if s.client is None:
+            raise RuntimeError(f"{name}: {s.error}")
+        return s.client
+
+    def _release(self, name):
+        with self._lock:
+            s = self._sessions[name]
+            s.refs = max(0, s.refs - 1)
+
+    def refs(self, name) -> int:
+        return self._sessions[name].refs
+
+    def status(self) -> dict[str, str]:
+        """Name -> 'ready' / 'opening' / 'failed: ...' / 'closed'."""
+        out = {}
+        for name, s in self._sessions.items():
+            if s.opening: out[name] = "opening"
+            elif s.client is not None: out[name] = "ready"
+            elif s.error is not None: out[name] = f"failed: {s.error}"
+            else: out[name] = "closed"
+        return out
+
+    # --- Health
+    @staticmethod
+    def _alive(client) -> bool:
+        proc = getattr(client, "proc", None)
+        p = getattr(proc, "p", None)
+        return p is None or p.poll() is None
+
+    def _health_loop(self):
+        while not self._closed.wait(self.health_s):
+            for name, s in self._sessions.items():
+                client = s.client
+                if not s.ready.is_set() or client is None:
+                    continue
+                if not self._alive(client):
+                    notice(name, "helper exited, reconnecting")
+                    self._open_async(name)
+                elif s.refs == 0 and not self._probe(name, client):
+                    notice(name, "helper not responding, reconnecting")
+                    self._open_async(name)
+
+    def _probe(self, name, client) -> bool:
+        try:
+            self.devices[name][1](client)
+        except TimeoutError:
+            return False
+        except RuntimeError:
+            # An ERR reply still means the helper is answering
+            return self._alive(client)
+        except Exception:
+            pass
+        return True
+
+    # --- Shutdown
+    @staticmethod
+    def _shutdown(client):
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Stop the health checks and every helper."""
+        self._closed.set()
+        for s in self._sessions.values():
+            s.ready.wait(self.open_timeout if s.opening else 0)
+            with self._lock:
+                client, s.client = s.client, None
+            if client is not None:
+                self._shutdown(client)
@@ -3,35 +3,77 @@ from __future__ import annotations
 
 # Import your minimal line-based IPC helper
 # If this file sits in the same 'clients' package as proc.py, use the relative import:
-from .proc import _LineProcess
-# If it's not in a package, change to: from proc import _LineProcess
+from .proc import _Client
+from . import program
+import base64
 
+import numpy as np
 
-class StageClient:
-    """Wrapper for stage_helper.exe (dynamic-loaded Kinesis, serials hardcoded in the EXE)"""
-    def __init__(self, exe):
-        self.proc = _LineProcess(exe)
+WAVE_CHUNK = 8192   # samples per wave_add line
+
+
+def _parse_status(r):
+    # r: "OK X=<0|1> Y=<0|1>"
+    return dict(kv.split("=") for kv in r[3:].split())
+
+
+class _StageCommands(_Client):
+    """stage_helper.exe commands, shared by StageClient and clients.aio.AsyncStageClient"""
 
     def open(self, serial_x=None, serial_y=None, vmax_tenths=750):
         # If no serials given, the helper uses its hardcoded defaults
         if serial_x and serial_y:
-            self.proc.send(f"open {serial_x} {serial_y} {vmax_tenths}")
-        else:
-            self.proc.send(f"open {vmax_tenths}")
+            return self._cmd(f"open {serial_x} {serial_y} {vmax_tenths}")
+        return self._cmd(f"open {vmax_tenths}")
 
     def move_ix(self, ix, iy, width, height):
-        self.proc.send(f"move_ix {ix} {iy} {width} {height}")
+        return self._cmd(f"move_ix {ix} {iy} {width} {height}")
 
     def reset(self, ix, width):
-        self.proc.send(f"stage_reset {ix} {width}")
+        return self._cmd(f"stage_reset {ix} {width}")
 
     def setdac(self, vx_code, vy_code):
-        self.proc.send(f"setdac {vx_code} {vy_code}")
+        return self._cmd(f"setdac {vx_code} {vy_code}")
+
+    def wave_upload(self, samples):
+        """
+        Load a DAC waveform into the helper: (N, 3) int16 rows of x code,
+        y code and trigger-out marker bits, sent as base64 chunks
+        (`wave_clear`, then pipelined `wave_add <b64>` lines).
+        """
+        data = np.ascontiguousarray(samples, dtype="<i2").reshape(-1, 3)
+        lines = ["wave_clear"]
+        for i in range(0, len(data), WAVE_CHUNK):
+            lines.append("wave_add " + base64.b64encode(data[i:i + WAVE_CHUNK].tobytes()).decode("ascii"))
+        return self._cmd_many(lines)
+
+    def wave_run(self, rate_hz, timeout=60.0):
+        """Play the loaded waveform at `rate_hz` samples/s; returns when it has finished."""
+        return self._cmd(f"wave_run {float(rate_hz)}", parse=str, timeout=timeout)
 
     def status(self):
-        r = self.proc.send("status")
-        # r: "OK X=<0|1> Y=<0|1>"
-        return dict(kv.split("=") for kv in r[3:].split())
+        return self._cmd("status", parse=_parse_status)
+
+
+class StageClient(_StageCommands):
+    """Wrapper for stage_helper.exe (dynamic-loaded Kinesis, serials hardcoded in the EXE)"""
+
+    def run_program(self, steps, width, height, dwell_ms, settle_ms=0.0):
+        """
+        Upload `steps` and let the helper visit their pixels on its own
+        (`prog_run <W> <H> <dwell_ms> <settle_ms>`): move, settle, pulse the
+        trigger output, hold for the dwell, next. Returns the running
+        program; it reports 'EV STEP <i>' per pixel and 'EV DONE'/'EV ERR'.
+        """
+        steps = list(steps)
+        program.upload(self.proc, steps)
+        run = program.ProgramRun(self.proc, steps, idle_timeout=max(30.0, (dwell_ms + settle_ms) / 1000.0 + 30.0))
+        try:
+            self.proc.send(f"prog_run {int(width)} {int(height)} {float(dwell_ms)} {float(settle_ms)}")
+        except Exception as e:
+            run.fail(e)
+            raise
+        return run
 
     def disable(self):
         try:
@@ -1,67 +1,310 @@
 # th260_client.py
 from __future__ import annotations
-from .proc import _LineProcess  # if this file sits in the same 'clients' package
+import os
+import itertools
+import threading
+from multiprocessing import shared_memory
+from typing import NamedTuple
 
-class TH260Client:
+import numpy as np
+
+from telemetry import notice
+
+from .proc import _Client  # if this file sits in the same 'clients' package
+from . import program
+
+
+class HistogramRing:
+    """
+    Named shared memory with `slots` histograms of shape (channels, bins), uint32.
+    The helper writes a measurement into a slot; `view(slot)` is a NumPy view
+    of that memory (no copy), valid until the slot is reused.
+    """
+    def __init__(self, name: str, slots: int, channels: int, bins: int, create=True):
+        self.name, self.slots, self.channels, self.bins = name, slots, channels, bins
+        size = slots * channels * bins * 4
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.array = np.ndarray((slots, channels, bins), dtype=np.uint32, buffer=self.shm.buf)
+        self._owner = create
+
+    def view(self, slot: int) -> np.ndarray:
+        return self.array[slot]
+
+    def close(self):
+        del self.array
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+class Acquisition(NamedTuple):
+    """Result of a count-targeted measurement."""
+    hist: np.ndarray | None     # ring view, or None when the helper wrote a file
+    dwell_ms: float             # actual integration time
+    counts: int                 # photons in the histogram
+
+
+def _fixed(hist, tmax_ms) -> Acquisition:
+    """Acquisition of a fixed-time measurement (helper without measure_part)."""
+    return Acquisition(hist, float(tmax_ms), int(hist.sum()) if hist is not None else 0)
+
+
+def _kv(text: str) -> dict:
+    return dict(p.split("=", 1) for p in text.split() if "=" in p)
+
+
+def _parse_info(resp) -> dict:
+    parts = resp.split()[1:]  # drop 'OK'
+    try:
+        kv = dict(p.split("=", 1) for p in parts)
+        return {
+            "resolution_ps": float(kv.get("RES", "0")),
+            "channels": int(kv.get("CH", "0")),
+            "bins": int(kv.get("LEN", "0")),
+            "sync_ns": float(kv.get("SYNC", "0")),
+        }
+    except Exception:
+        # If helper doesn't support info or format differs, return raw text
+        return {"raw": resp}
+
+
+def _exposed(callback):
     """
-    Thin wrapper around th260_helper.exe using the shared LineProcess.
+    Progress handler calling `callback()` once, on the helper's
+    'PART ... END=1' line (exposure over, histogram still being transferred).
+    Helpers that never send it simply release the light path with their reply.
+    """
+    fired = []
+
+    def progress(line):
+        if callback is not None and not fired and _kv(line).get("END") == "1":
+            fired.append(True)
+            callback()
+    return progress
+
+
+class _TH260Commands(_Client):
+    """
+    th260_helper.exe commands, shared by TH260Client (on the shared
+    LineProcess) and clients.aio.AsyncTH260Client.
     Protocol (as implemented by your helper):
       - init <outDir> <ix> <iy>
       - measure <outDir> <ix> <iy> <wavelength_nm> <tacq_ms>
       - info            (optional; returns OK RES=... CH=... LEN=...)
+      - shm_open <name> <slots> <channels> <bins>          (optional)
+      - measure_shm <slot> <ix> <iy> <wavelength_nm> <tacq_ms>   -> OK SLOT=<n>
+      - measure_part <outDir> <ix> <iy> <wavelength_nm> <tmax_ms> <part_ms>
+      - measure_shm_part <slot> <ix> <iy> <wavelength_nm> <tmax_ms> <part_ms>
+                        (optional) stream 'PART T=<ms> N=<counts>' every part_ms;
+                        a 'stop' line ends the measurement early (ignored when idle);
+                        -> OK T=<ms> N=<counts> [SLOT=<n>]
+      - every measure* command may print 'PART ... END=1' as soon as the
+                        exposure is over (before the histogram is transferred);
+                        the light path is free from then on
+      - tt_start <file> [W H pixel_ms serpentine turn_ms]   (optional) start T3
+                        time-tag recording into <file> (records as in
+                        scan.flyraster.TAG_DTYPE); the raster geometry is a hint
+      - mark <bits>     (optional) insert a software marker record now
+      - tt_stop         -> OK N=<records>
+      - prog_clear / prog_add <b64>   (optional) upload a scan program
+                        (clients.program.STEP_DTYPE records)
+      - prog_run <outDir|-> <tacq_ms> <target_counts> <trigger>
+                        -> OK N=<steps>, then runs the program on its own:
+                        per step (after an external trigger if <trigger> is 1)
+                        one measurement into <outDir> or ring slot i % slots,
+                        ending at <target_counts> photons if > 0; streams
+                        'EV STEP <i> T=<ms> N=<counts> [SLOT=<n>]', then
+                        'EV DONE N=<n>' (early after 'stop') or 'EV ERR <msg>'
       - exit
     """
 
-    def __init__(self, exe: str):
-        self.proc = _LineProcess(exe)
+    def __init__(self, exe: str | None = None, proc=None):
+        super().__init__(exe, proc)
+        self.ring: HistogramRing | None = None
+        self._slots = None
+        self.partial = None     # measure_part support: None until the first acquire_until
 
     # -- Setup / connection ----------------------------------------------------
 
     def init(self, output_dir: str, ix: int, iy: int) -> None:
         """Initialize helper with an output directory and starting pixel coords."""
-        self.proc.send(f"init {output_dir} {int(ix)} {int(iy)}", timeout=20.0)
+        return self._cmd(f"init {output_dir} {int(ix)} {int(iy)}", timeout=20.0)
 
     def connect(self, output_dir: str = "dump", ix: int = 1, iy: int = 1) -> None:
         """
         Convenience: some code paths used a 'connect' that just called `init dump 1 1`.
         Keep that behavior for compatibility.
         """
-        self.init(output_dir, ix, iy)
+        return self.init(output_dir, ix, iy)
 
     # -- Acquisition -----------------------------------------------------------
 
-    def acquire(self, tacq_ms: int, output_dir: str, wl: float, ix: int, iy: int) -> None:
+    def acquire(self, tacq_ms: int, output_dir: str, wl: float, ix: int, iy: int,
+                on_exposed=None) -> np.ndarray | None:
         """
         Trigger a measurement. The helper writes data to disk in output_dir.
         We just ensure the call succeeds (OK) and wait long enough.
+        With a shared-memory ring open, nothing goes to disk: the histogram
+        (channels, bins) is returned as a view into the ring instead.
+        `on_exposed()` is called if the helper reports the end of the
+        exposure before its reply (see `_exposed`).
         """
+        if self.ring is not None:
+            return self.acquire_shm(tacq_ms, wl, ix, iy, on_exposed)
         cmd = f"measure {output_dir} {int(ix)} {int(iy)} {float(wl)} {int(tacq_ms)}"
         # Acquisition time affects how long the helper runs; add a cushion.
         timeout = max(10.0, tacq_ms / 1000.0 + 10.0)
-        self.proc.send(cmd, timeout=timeout)
+        return self._cmd(cmd, timeout=timeout, on_progress=_exposed(on_exposed))
+
+    def acquire_until(self, tmax_ms: int, output_dir: str, wl: float, ix: int, iy: int,
+                      target_counts: int | None = None, target_snr: float | None = None,
+                      part_ms: int = 50, on_exposed=None) -> Acquisition:
+        """
+        Integrate until `target_counts` photons (or a Poisson SNR = sqrt(N)
+        of `target_snr`) are collected, at most `tmax_ms`. The helper streams
+        partial totals; once the target is met a `stop` is written.
+        `on_exposed()` is called when the helper confirms the exposure is
+        over (its `END=1` line), not when `stop` is written.
+        Returns the histogram (as `acquire`), the actual dwell time and counts.
+        Helpers without `measure_part` (ERR on the first try) get fixed-time
+        `acquire` calls of `tmax_ms` from then on.
+        """
+        if self.partial is False:
+            return _fixed(self.acquire(tmax_ms, output_dir, wl, ix, iy, on_exposed), tmax_ms)
+        cmd, slot = self._part_cmd(tmax_ms, output_dir, wl, ix, iy, part_ms)
+        progress, _stop = self._part_progress(target_counts, target_snr, on_exposed)
+        try:
+            resp = self.proc.submit(cmd, on_progress=progress).result(max(10.0, tmax_ms / 1000.0 + 10.0))
+        except RuntimeError as e:
+            if self._part_unsupported(e):
+                return self.acquire_until(tmax_ms, output_dir, wl, ix, iy, on_exposed=on_exposed)
+            raise
+        return self._part_result(resp, slot, tmax_ms)
+
+    # Parts of acquire_until shared with the asyncio client
+    def _part_cmd(self, tmax_ms, output_dir, wl, ix, iy, part_ms):
+        """(command, ring slot or None)"""
+        if self.ring is not None:
+            slot = next(self._slots)
+            return f"measure_shm_part {slot} {int(ix)} {int(iy)} {float(wl)} {int(tmax_ms)} {int(part_ms)}", slot
+        return f"measure_part {output_dir} {int(ix)} {int(iy)} {float(wl)} {int(tmax_ms)} {int(part_ms)}", None
+
+    def _part_progress(self, target_counts, target_snr, on_exposed):
+        """(on_progress handler, stop()): `stop` is written once, when the target is met."""
+        target = max(target_counts or 0, int(np.ceil((target_snr or 0) ** 2)))
+        exposed = _exposed(on_exposed)
+        stopped = threading.Event()
+
+        def stop():
+            if not stopped.is_set():
+                stopped.set()
+                self.proc.write("stop")
+
+        def progress(line):
+            exposed(line)
+            if target and int(_kv(line).get("N", "0")) >= target:
+                stop()
+        return progress, stop
+
+    def _part_unsupported(self, error) -> bool:
+        """True (and from now on fixed dwell) if the first measure_part got ERR."""
+        if self.partial is None and str(error).startswith("ERR"):
+            self.partial = False
+            notice("th260", f"count targets unavailable ({error}), using fixed dwell")
+            return True
+        return False
+
+    def _part_result(self, resp, slot, tmax_ms) -> Acquisition:
+        self.partial = True
+        kv = _kv(resp)
+        hist = self.ring.view(int(kv.get("SLOT", slot))) if self.ring is not None else None
+        return Acquisition(hist, float(kv.get("T", tmax_ms)), int(kv.get("N", "0")))
+
+    # -- Shared-memory histograms ------------------------------------------------
+
+    def open_ring(self, slots: int = 16) -> HistogramRing:
+        """
+        Create a shared-memory ring sized from `info()` and hand it to the helper.
+        Raises RuntimeError if the helper has no `shm_open`.
+        """
+        ring = self._new_ring(self.info(), slots)
+        try:
+            self._cmd(f"shm_open {ring.name} {ring.slots} {ring.channels} {ring.bins}")
+        except Exception:
+            ring.close()
+            raise
+        return self._use_ring(ring)
+
+    def _new_ring(self, inf, slots) -> HistogramRing:
+        if "bins" not in inf or not inf["bins"]:
+            raise RuntimeError(f"helper info unusable for shared memory: {inf}")
+        return HistogramRing(f"ltb_th260_{os.getpid()}_{id(self):x}", slots, max(1, inf["channels"]), inf["bins"])
+
+    def _use_ring(self, ring) -> HistogramRing:
+        self.ring = ring
+        self._slots = itertools.cycle(range(ring.slots))
+        return ring
+
+    def acquire_shm(self, tacq_ms: int, wl: float, ix: int, iy: int, on_exposed=None) -> np.ndarray:
+        """Measure into the next ring slot; returns a (channels, bins) view of it."""
+        slot = next(self._slots)
+        cmd = f"measure_shm {slot} {int(ix)} {int(iy)} {float(wl)} {int(tacq_ms)}"
+        return self._cmd(cmd, parse=lambda r: self.ring.view(int(_kv(r).get("SLOT", slot))),
+                         timeout=max(10.0, tacq_ms / 1000.0 + 10.0), on_progress=_exposed(on_exposed))
+
+    # -- Time-tagged mode -------------------------------------------------------
+
+    def tt_start(self, path: str, geometry=None) -> None:
+        hint = "" if geometry is None else " " + " ".join(f"{g:g}" for g in geometry)
+        return self._cmd(f"tt_start {path}{hint}", timeout=20.0)
+
+    def mark(self, bits: int) -> None:
+        return self._cmd(f"mark {int(bits)}")
+
+    def tt_stop(self) -> int:
+        """Stop recording; returns the number of records written."""
+        return self._cmd("tt_stop", parse=lambda r: int(_kv(r).get("N", "0")), timeout=60.0)
 
     # -- Optional helpers ------------------------------------------------------
 
     def info(self) -> dict:
         """
         Ask the helper for instrument info if it supports `info`.
-        Expected line: 'OK RES=<ps> CH=<n> LEN=<bins>'
+        Expected line: 'OK RES=<ps> CH=<n> LEN=<bins> [SYNC=<ns>]'
         """
-        resp = self.proc.send("info")
-        parts = resp.split()[1:]  # drop 'OK'
+        return self._cmd("info", parse=_parse_info)
+
+
+class TH260Client(_TH260Commands):
+    """Thin wrapper around th260_helper.exe using the shared LineProcess; adds scan programs."""
+
+    # -- Scan programs -----------------------------------------------------------
+
+    def run_program(self, steps, tacq_ms: int, output_dir: str, target_counts: int | None = None,
+                    trigger: bool = True) -> program.ProgramRun:
+        """
+        Upload `steps` and start them; returns the running program, an
+        iterator of completed steps. Histograms come from the ring (copied
+        per step) or are written to `output_dir` as `measure` does.
+        With `trigger` every step waits for the stage's trigger output.
+        Raises RuntimeError if the helper has no program commands.
+        """
+        steps = list(steps)
+        program.upload(self.proc, steps)
+        run = program.ProgramRun(self.proc, steps, ring=self.ring,
+                                 idle_timeout=max(30.0, tacq_ms / 1000.0 + 30.0))
+        out = "-" if self.ring is not None else output_dir
         try:
-            kv = dict(p.split("=", 1) for p in parts)
-            return {
-                "resolution_ps": float(kv.get("RES", "0")),
-                "channels": int(kv.get("CH", "0")),
-                "bins": int(kv.get("LEN", "0")),
-            }
-        except Exception:
-            # If helper doesn't support info or format differs, return raw text
-            return {"raw": resp}
+            self.proc.send(f"prog_run {out} {int(tacq_ms)} {int(target_counts or 0)} {int(trigger)}")
+        except Exception as e:
+            run.fail(e)
+            raise
+        return run
 
     # -- Shutdown --------------------------------------------------------------
 
     def close(self) -> None:
         """Gracefully stop the helper process."""
         self.proc.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
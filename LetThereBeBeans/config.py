@@ -1,13 +1,38 @@
+import os
+import sys
 from pathlib import Path
 ROOT = Path(__file__).parent.resolve()
 HELPERS = ROOT / "helpers"
+SIMS = ROOT / "sim"
+
+# Simulated instruments (sim/*.py speak the helpers' protocol): HYPER_SIM=1
+# forces them, HYPER_SIM=0 the real helpers; by default only Windows has hardware
+SIM = os.environ.get("HYPER_SIM", "0" if sys.platform == "win32" else "1") == "1"
 
 CONFIG = {
+    "sim": SIM,
     "helpers": {
         "stage": str(HELPERS / "stage_helper_ultra.exe"),
         "th260": str(HELPERS / "th260_helper_ultra.exe"),
         "cornerstone": str(HELPERS / "cornerstone_helper.exe"),  # ← new name
+    } if not SIM else {
+        # Latency/settle models and fault injection: SIM_* variables, see sim/common.py
+        "stage": str(SIMS / "stage_sim.py"),
+        "th260": str(SIMS / "th260_sim.py"),
+        "cornerstone": str(SIMS / "cornerstone_sim.py"),
+    },
+    "devices": {
+        "prewarm": True,    # start the helpers in the background when the app opens
+        "health_s": 5.0,    # helper health-check interval
+    },
+    "telemetry": {
+        "enabled": True,        # time every helper command and scan phase
+        "capacity": 200000,     # spans kept for trace export
+        "trace_files": True,    # write trace_<mode>_<time>.json next to each scan's output
+        "echo": False,          # print helper commands/replies to the console
     },
+    # FakeScope settings when simulating (DataMeasurer)
+    "sim_scope": {"level": 1.0, "noise": 0.02, "mains": 0.005, "drift": 0.001, "bits": 14, "realtime": True},
     "paths": {
         "default_output": str((ROOT / "data").resolve()),
     }
@@ -5,25 +5,42 @@ import threading
 import numpy as np
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
+import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
 from config import CONFIG
-from clients.stage_client import StageClient
-from clients.th260_client import TH260Client
-from clients.cornerstone_client import CornerstoneClient
-
-# Fixed max output voltage for KCube Piezo in tenths of a volt (e.g., 750 = 75.0 V)
-FIXED_VMAX_TENTHS = 750
+from clients.registry import DeviceRegistry
+from scan.engine import ScanEngine, ScanStep, ScanStopped
+from scan.program import ProgramScan, ProgramUnsupported
+from scan.planner import ORDERS, MotionCostModel, plan, plan_all
+from scan.roi import dilate, mask_from_text, mask_to_text, plan_roi, prescan_steps, threshold_mask
+from scan.journal import ScanJournal, find_unfinished, read_journal
+from scan.flyraster import FlyRaster, FlyRasterUnsupported
+from scan.settle import mono_settler
+from storage.datacube import FlimCube, ScratchIngestor
+from storage.sparse_hist import SUFFIX as ARCHIVE_SUFFIX, write_archive
+from analysis.lifetime import OnlineLifetimeEstimator
+from widgets.flim_map import FlimMap
+from telemetry import TRACER, scan_report, span
 
 class FlimView(ttk.Frame):
     def __init__(self, parent, app=None, config=None, go_home=None):
         super().__init__(parent, padding=12)
         self.app, self.config, self.go_home = app, config or CONFIG, go_home
+        # Helper sessions are shared with the other modes; stand-alone views get their own
+        self.devices = getattr(app, "devices", None)
+        self._own_devices = self.devices is None
+        if self._own_devices:
+            self.devices = DeviceRegistry(self.config)
         self.stage = None
         self.th260 = None
         self.mono  = None
+        self._connecting = None     # future of the handles being acquired
+        self._connect_job = None
         self.stop_flag = False
         self.worker = None
+        self.engine = None
+        self.fly_stop = None
 
         # Header
         hdr = ttk.Frame(self); hdr.pack(fill="x")
@@ -44,19 +61,63 @@ class FlimView(ttk.Frame):
 
         self.tacq_e   = ttk.Entry(left);  self._row(left, "Tacq (ms):",   self.tacq_e,   5, "1000")
 
-        self.out_e = ttk.Entry(left, width=30); self._row(left, "Output folder:", self.out_e, 6)
-        tb.Button(left, text="Browse", bootstyle=INFO, command=self._pick_dir).grid(row=6, column=2, padx=4)
+        self.order_cb = ttk.Combobox(left, values=["auto", *ORDERS], state="readonly")
+        self._row(left, "Scan order:", self.order_cb, 6); self.order_cb.set("auto")
+
+        self.out_e = ttk.Entry(left, width=30); self._row(left, "Output folder:", self.out_e, 7)
+        tb.Button(left, text="Browse", bootstyle=INFO, command=self._pick_dir).grid(row=7, column=2, padx=4)
 
-        btns = ttk.Frame(left); btns.grid(row=7, column=0, columnspan=3, pady=8, sticky="ew")
+        opts = ttk.Frame(left); opts.grid(row=8, column=0, columnspan=3, pady=(6, 0), sticky="w")
+        self.cube_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(opts, text="Write datacube", variable=self.cube_var).grid(row=0, column=0, sticky="w")
+        self.tau_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(opts, text="Live lifetime", variable=self.tau_var).grid(row=0, column=1, sticky="w", padx=(8, 0))
+        self.multi_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(opts, text="Multi-exp fit", variable=self.multi_var).grid(row=0, column=2, sticky="w", padx=(8, 0))
+        # Count-targeted acquisition: stop each pixel at this many photons (Tacq is then the cap)
+        ttk.Label(opts, text="Target counts:").grid(row=1, column=0, sticky="w", pady=(4, 0))
+        self.target_e = ttk.Entry(opts, width=10); self.target_e.grid(row=1, column=1, sticky="w", padx=(8, 0), pady=(4, 0))
+        # Two-pass ROI: quick single-λ prescan, then the full scan on masked pixels only
+        ttk.Label(opts, text="ROI:").grid(row=2, column=0, sticky="w", pady=(4, 0))
+        self.roi_cb = ttk.Combobox(opts, values=["off", "threshold", "drawn"], state="readonly", width=10)
+        self.roi_cb.grid(row=2, column=1, sticky="w", padx=(8, 0), pady=(4, 0)); self.roi_cb.set("off")
+        ttk.Label(opts, text="Prescan (ms):").grid(row=3, column=0, sticky="w", pady=(4, 0))
+        self.prescan_e = ttk.Entry(opts, width=10); self.prescan_e.grid(row=3, column=1, sticky="w", padx=(8, 0), pady=(4, 0))
+        self.prescan_e.insert(0, "100")
+        ttk.Label(opts, text="Threshold:").grid(row=4, column=0, sticky="w", pady=(4, 0))
+        self.thresh_e = ttk.Entry(opts, width=10); self.thresh_e.grid(row=4, column=1, sticky="w", padx=(8, 0), pady=(4, 0))
+        ttk.Label(opts, text="(blank: auto)").grid(row=4, column=2, sticky="w", padx=(8, 0))
+        ttk.Label(opts, text="Dilate (px):").grid(row=5, column=0, sticky="w", pady=(4, 0))
+        self.dilate_e = ttk.Entry(opts, width=10); self.dilate_e.grid(row=5, column=1, sticky="w", padx=(8, 0), pady=(4, 0))
+        self.dilate_e.insert(0, "1")
+        # Continuous piezo raster with time-tagged photons (Tacq = pixel dwell)
+        self.fly_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(opts, text="Fly raster (time tags)", variable=self.fly_var).grid(row=6, column=0, columnspan=2, sticky="w", pady=(4, 0))
+        # Upload each wavelength's pixel list to the helpers (falls back to step commands)
+        self.prog_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(opts, text="Helper programs", variable=self.prog_var).grid(row=6, column=2, sticky="w", padx=(8, 0), pady=(4, 0))
+        # Compressed copy of the finished cube (sparse, chunked by tile; see storage.sparse_hist)
+        self.archive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(opts, text="Sparse archive", variable=self.archive_var).grid(row=7, column=0, columnspan=2, sticky="w", pady=(4, 0))
+
+        btns = ttk.Frame(left); btns.grid(row=9, column=0, columnspan=3, pady=8, sticky="ew")
         tb.Button(btns, text="Connect",    bootstyle=SUCCESS,   command=self._connect).grid(row=0, column=0, padx=4)
         tb.Button(btns, text="Disconnect", bootstyle=SECONDARY, command=self._disconnect).grid(row=0, column=1, padx=4)
         tb.Button(btns, text="Start",      bootstyle=PRIMARY,   command=self._start).grid(row=0, column=2, padx=4)
         tb.Button(btns, text="Stop",       bootstyle=DANGER,    command=self._stop).grid(row=0, column=3, padx=4)
+        tb.Button(btns, text="Prescan",    bootstyle=INFO,      command=lambda: self._start(prescan_only=True)).grid(row=1, column=2, padx=4, pady=(4, 0))
+        tb.Button(btns, text="Resume",     bootstyle=WARNING,   command=self._resume).grid(row=1, column=3, padx=4, pady=(4, 0))
 
         # Status panel
         right = ttk.LabelFrame(self, text="Status", padding=10)
         right.pack(side="left", fill="both", expand=True, padx=10, pady=10)
         self.status = ttk.Label(right, text="Idle"); self.status.pack(anchor="w")
+        self.map = FlimMap(right, 1, 1, limits={"lifetime": (0.0, 5.0)})
+        self.map.pack(fill="both", expand=True, pady=(8, 0))
+
+        # Scan thread -> UI: latest status text, picked up by a timer
+        self._status_text = None
+        self._status_job = self.after(100, self._poll_status)
 
     # --- UI helpers
     def _row(self, parent, label, entry, r, default=None):
@@ -71,24 +132,51 @@ class FlimView(ttk.Frame):
             self.out_e.delete(0, "end"); self.out_e.insert(0, d)
 
     # --- Device lifecycle
+    HANDLES = {"stage": "stage", "th260": "th260", "cornerstone": "mono"}    # registry name -> attribute
+
     def _connect(self):
+        # Handles to the shared sessions (opened with fixed Vmax, TH260 ring if
+        # supported); instant when the app has prewarmed the helpers, otherwise
+        # opening takes a while, so it runs on a thread and a timer picks it up
+        if self._connecting is not None:
+            return
+        missing = [name for name, attr in self.HANDLES.items() if getattr(self, attr) is None]
+        self._connecting = self.devices.acquire_later(missing)
+        self._connected()
+
+    def _connected(self):
+        future = self._connecting
+        if future is None:
+            return
+        if not future.done():
+            opening = [n for n, st in self.devices.status().items() if n in self.HANDLES and st == "opening"]
+            self.status.config(text=f"Opening {', '.join(opening)}…" if opening else "Connecting…")
+            self._connect_job = self.after(100, self._connected)
+            return
+        self._connecting = self._connect_job = None
         try:
-            if self.stage is None:
-                self.stage = StageClient(self.config["helpers"]["stage"])
-                # Use fixed vmax
-                self.stage.open(vmax_tenths=FIXED_VMAX_TENTHS)
-            if self.th260 is None:
-                self.th260 = TH260Client(self.config["helpers"]["th260"])
-                # Keep compatibility with your helper's expectations
-                self.th260.connect(output_dir="dump", ix=1, iy=1)
-            if self.mono is None:
-                self.mono = CornerstoneClient(self.config["helpers"]["cornerstone"])
-                self.mono.open()
-            self.status.config(text=f"Connected.")
+            handles = future.result()
         except Exception as e:
+            self.status.config(text="Not connected.")
             messagebox.showerror("Connect", str(e))
+            return
+        for name, handle in handles.items():
+            setattr(self, self.HANDLES[name], handle)
+        self.status.config(text="Connected.")
+
+    def _cancel_connect(self):
+        # Handles that arrive after Disconnect/Back are released at once
+        future, self._connecting = self._connecting, None
+        if self._connect_job is not None:
+            self.after_cancel(self._connect_job)
+            self._connect_job = None
+        if future is not None:
+            future.add_done_callback(
+                lambda f: f.exception() is None and [h.release() for h in f.result().values()])
 
     def _disconnect(self):
+        # Releases the handles; the helpers stay up for the next mode
+        self._cancel_connect()
         try:
             if self.stage: self.stage.close()
             if self.th260: self.th260.close()
@@ -98,7 +186,7 @@ class FlimView(ttk.Frame):
             self.stage = self.th260 = self.mono = None
 
     # --- Scan orchestration
-    def _start(self):
+    def _start(self, prescan_only=False):
         if not (self.stage and self.th260 and self.mono):
             messagebox.showerror("FLIM", "Connect devices first.")
             return
@@ -107,45 +195,349 @@ class FlimView(ttk.Frame):
             s = float(self.wl_start_e.get()); e = float(self.wl_end_e.get()); steps = int(self.wl_steps_e.get())
             wls = np.linspace(s, e, steps + 1).tolist()
             tacq = int(self.tacq_e.get())
+            order = self.order_cb.get()
+            cube = self.cube_var.get()
+            fits = 2 if self.multi_var.get() else (0 if self.tau_var.get() else None)
+            target = int(self.target_e.get()) if self.target_e.get().strip() else None
             out = self.out_e.get().strip()
             if not out: raise ValueError("Please choose an output folder.")
+            roi = self._roi_settings(W, H, prescan_only) if (prescan_only or self.roi_cb.get() != "off") else None
 
             self.stop_flag = False
             if self.worker and self.worker.is_alive():
                 messagebox.showinfo("FLIM", "A scan is already running.")
                 return
-            self.worker = threading.Thread(target=self._run_scan, args=(W,H,wls,tacq,out), daemon=True)
+            self.map.reset(H, W, wls)
+            if roi and roi["mask"] is not None:
+                self.map.set_mask(roi["mask"])
+            if prescan_only:
+                self.worker = threading.Thread(target=self._run_prescan, args=(W,H,wls,roi,out), daemon=True)
+            elif self.fly_var.get():
+                self.worker = threading.Thread(target=self._run_fly_raster, args=(W,H,wls,tacq,out,fits), daemon=True)
+            else:
+                self.worker = threading.Thread(target=self._run_scan, args=(W,H,wls,tacq,out,order,cube,fits,target,roi,self.prog_var.get()),
+                                               kwargs={"archive": self.archive_var.get()}, daemon=True)
             self.worker.start()
             self.status.config(text=f"Running... λ from {s:.2f} to {e:.2f} in {steps} steps")
         except Exception as e:
             messagebox.showerror("FLIM", str(e))
 
-    def _run_scan(self, W, H, wls, tacq, out):
+    def _resume(self):
+        """Continue the newest unfinished scan in the output folder, with its own settings."""
+        if not (self.stage and self.th260 and self.mono):
+            messagebox.showerror("FLIM", "Connect devices first.")
+            return
+        if self.worker and self.worker.is_alive():
+            messagebox.showinfo("FLIM", "A scan is already running.")
+            return
+        try:
+            out = self.out_e.get().strip()
+            if not out: raise ValueError("Please choose an output folder.")
+            path = find_unfinished(out, "flim")
+            if path is None:
+                messagebox.showinfo("FLIM", "No unfinished scan in this folder.")
+                return
+            header, steps, _ = read_journal(path)
+            p = header["params"]
+            W, H, wls = p["W"], p["H"], p["wls"]
+            roi = None
+            if p.get("roi_mask"):
+                roi = {"mask": mask_from_text(p["roi_mask"], H, W), "prescan_ms": 0, "threshold": None, "dilate": 0}
+            self.stop_flag = False
+            self.map.reset(H, W, wls)
+            if roi: self.map.set_mask(roi["mask"])
+            self.worker = threading.Thread(target=self._run_scan, args=(W,H,wls,p["tacq"],out,p["order"],p["cube"],
+                                           p["fits"],p["target"],roi,self.prog_var.get(),path),
+                                           kwargs={"archive": self.archive_var.get()}, daemon=True)
+            self.worker.start()
+            self.status.config(text=f"Resuming {path.name}: {len(steps)} steps already done")
+        except Exception as e:
+            messagebox.showerror("FLIM", str(e))
+
+    def _roi_settings(self, W, H, prescan_only=False):
+        mask = None
+        if self.roi_cb.get() == "drawn" and not prescan_only:
+            mask = self.map.get_mask()
+            if mask is None or mask.shape != (H, W):
+                raise ValueError("Draw a mask on a W×H map first (Prescan, then 'Draw mask').")
+        thr = self.thresh_e.get().strip()
+        return {"mask": mask,
+                "prescan_ms": int(self.prescan_e.get()),
+                "threshold": float(thr) if thr else None,
+                "dilate": int(self.dilate_e.get() or 0)}
+
+    def _prescan(self, W, H, wl, tacq_ms, out):
+        """Pass 1: fast single-wavelength intensity image (counts), kept as its own cube."""
+        image = np.full((H, W), np.nan)
+        view = self.map
+        k = view.wl_index(wl)
+        helper_out = os.path.join(out, "_incoming")
+        ingest = ScratchIngestor(os.path.join(out, time.strftime("prescan_%Y%m%d_%H%M%S")),
+                                 H, W, [wl], helper_out, tacq_ms=tacq_ms, order="prescan")
+
+        def post_acquire(step, hist):
+            h = ingest(step, hist)
+            if h is not None:
+                image[step.iy, step.ix] = np.sum(h)
+                view.set_values("intensity", step.iy, step.ix, k, float(np.sum(h)) * 1000.0 / tacq_ms)
+
+        def on_step(i, st):
+            self._post_status(f"[prescan] {i+1}/{W*H}  ({st.iy+1}/{H}, {st.ix+1}/{W})  λ={wl:.2f} nm")
+
+        try:
+            with ScanEngine(self.stage, self.mono, self.th260) as self.engine:
+                if self.stop_flag: raise ScanStopped()
+                self.engine.run(prescan_steps(W, H, wl), W, H, tacq_ms, helper_out,
+                                on_step=on_step, post_acquire=post_acquire)
+        finally:
+            self.engine = None
+            ingest.close()
+        return image
+
+    def _roi_mask(self, W, H, wls, roi, out):
+        """Prescan + threshold, or the drawn mask; dilated either way."""
+        if roi["mask"] is not None:
+            mask = dilate(roi["mask"], roi["dilate"])
+        else:
+            image = self._prescan(W, H, wls[len(wls) // 2], roi["prescan_ms"], out)
+            mask = threshold_mask(image, roi["threshold"], roi["dilate"])
+        self.map.set_mask(mask)
+        return mask
+
+    def _run_prescan(self, W, H, wls, roi, out):
+        try:
+            mask = self._roi_mask(W, H, wls, roi, out)
+            self._post_status(f"Prescan done: {int(mask.sum())} of {W*H} pixels above threshold.")
+        except ScanStopped:
+            self._post_status("Stopped.")
+        except Exception as e:
+            self._post_status(f"Error: {e}")
+
+    def _run_scan(self, W, H, wls, tacq, out, order="auto", cube=True, fits=0, target=None, roi=None,
+                  program=False, resume=None, archive=False):
+        mask = None
+        plans = []
+        costs = MotionCostModel.learned()       # settle times measured by earlier scans
+        if roi is not None:
+            try:
+                mask = self._roi_mask(W, H, wls, roi, out)
+            except ScanStopped:
+                self._post_status("Stopped."); return
+            except Exception as e:
+                self._post_status(f"Error: {e}"); return
+            if not mask.any():
+                self._post_status("ROI is empty, nothing to scan."); return
+            # Masked pixels only, in the cheapest stage/grating order
+            best = plan_roi(mask, wls, costs)
+        # Pick the step order with the least predicted stage/grating motion
+        elif order == "auto":
+            plans = plan_all(W, H, wls, costs)
+            best = plans[0]
+        else:
+            best = plan(order, W, H, wls, costs)
+        total = best.n_steps
+        others = ", ".join(f"{p.order} {p.motion_s:.0f} s" for p in plans[1:])
+        self._post_status(f"Order: {best.order} (predicted motion {best.motion_s:.0f} s"
+                          + (f"; {others})" if others else ")"))
+
+        # Journal of completed steps: a new one, or the resumed scan's (its
+        # finished steps are skipped and its cube is filled further)
+        try:
+            if resume is not None:
+                journal = ScanJournal.resume(resume)
+                cube_path = journal.params["cube_path"]
+            else:
+                stamp = time.strftime("%Y%m%d_%H%M%S")
+                cube_path = os.path.join(out, f"cube_{stamp}")
+                journal = ScanJournal.create(os.path.join(out, f"flim_{stamp}.journal"), "flim", {
+                    "W": W, "H": H, "wls": list(wls), "tacq": tacq, "order": best.order, "cube": cube,
+                    "fits": fits, "target": target, "cube_path": cube_path,
+                    "roi_mask": mask_to_text(mask) if mask is not None else None})
+        except Exception as e:
+            self._post_status(f"Error: {e}"); return
+        # A list: if the program scan turns out unsupported, ScanEngine runs the same steps
+        steps = [s for s in best.steps(W, H, wls) if not journal.is_done(s.ix, s.iy, s.wl)]
+        skipped = len(journal.done)
+
+        lifetime = None
+        view = self.map
+
+        def on_step(i, st):
+            journal.record(st.ix, st.iy, st.wl)
+            tau = ""
+            if lifetime is not None:
+                t = lifetime.value("tau_tail", st.iy, st.ix, lifetime.wl_index(st.wl))
+                if t == t: tau = f"  τ≈{t:.2f} ns"
+            self._post_status(f"[{best.order}] {skipped+i+1}/{total}  ({st.iy+1}/{H}, {st.ix+1}/{W}) "
+                              f"λ={st.wl:.2f} nm  tacq={tacq} ms{tau}")
+
+        # Datacube: histograms arrive through shared memory, or the helper writes
+        # into a scratch folder that is drained into the cube. Shared-memory
+        # histograms never touch disk otherwise, so they always go to a cube.
+        ingest = None
+        helper_out = out
+        if cube or getattr(self.th260, "ring", None) is not None:
+            helper_out = os.path.join(out, "_incoming")
+            ingest = ScratchIngestor(cube_path, H, W, wls, helper_out, tacq_ms=tacq, order=best.order,
+                                     target_counts=target)
+            # Journaled steps must not point at cube pages still in memory
+            journal.on_sync = lambda: ingest.cube.flush() if ingest.cube is not None else None
+            # Lifetime/intensity maps are fitted as histograms arrive and
+            # written next to the raw cube (fits=None: off, n>0: n-exp fits too)
+            if fits is not None:
+                lifetime = OnlineLifetimeEstimator(os.path.join(ingest.cube_path, "lifetime"),
+                                                   H, W, wls, self._resolution_ns(), multiexp=fits,
+                                                   on_batch=lambda iy, ix, k, r: view.set_values("lifetime", iy, ix, k, r["tau_tail"]))
+
+        def post_acquire(step, hist, dwell_ms=None):
+            with span("measure", "cube"):
+                h = ingest(step, hist, dwell_ms)
+            if h is None: return
+            # Counts per second, so pixels with different dwell times compare
+            with span("plot", "map"):
+                view.set_values("intensity", step.iy, step.ix, view.wl_index(step.wl),
+                            float(np.sum(h)) * 1000.0 / (dwell_ms or tacq))
+            if lifetime is not None:
+                lifetime.submit(step, h)
+
+        if ingest and ingest.cube is not None and skipped:
+            self._post_status(f"Resuming: rebuilding maps from {skipped} finished steps")
+            self._rebuild(ingest.cube, lifetime)
+
+        completed = False
+        trace_mark, t_start = TRACER.mark(), time.perf_counter()
         try:
-            for iy in range(H):
-                for ix in range(W):
-                    if self.stop_flag: raise KeyboardInterrupt()
-                    self.stage.move_ix(ix, iy, W, H)
-                    time.sleep(0.1)
-
-                    for nm in wls:
-                        if self.stop_flag: raise KeyboardInterrupt()
-                        self.mono.goto(nm)
-                        time.sleep(0.8)  # settle
-                        print(tacq, " ", nm)
-                        self.th260.acquire(tacq_ms=tacq, output_dir=out, wl=nm, ix=ix, iy=iy)
-                        self._post_status(f"({iy+1}/{H}, {ix+1}/{W}) λ={nm:.2f} nm  tacq={tacq} ms")
-            self._post_status("Done.")
-        except KeyboardInterrupt:
+            done = False
+            if program:
+                try:
+                    with ProgramScan(self.stage, self.mono, self.th260, target_counts=target) as self.engine:
+                        if self.stop_flag: raise ScanStopped()
+                        self.engine.run(steps, W, H, tacq, helper_out,
+                                        on_step=on_step, post_acquire=post_acquire if ingest else None)
+                    done = True
+                except ProgramUnsupported as e:
+                    self._post_status(f"Helper programs unavailable ({e}), using step commands")
+            if not done:
+                with ScanEngine(self.stage, self.mono, self.th260, target_counts=target) as self.engine:
+                    if self.stop_flag: raise ScanStopped()
+                    self.engine.run(steps, W, H, tacq, helper_out,
+                                    on_step=on_step, post_acquire=post_acquire if ingest else None)
+            completed = True
+            self._post_status("Done." + (f"  Cube: {ingest.cube_path}" if ingest and ingest.cube else ""))
+        except ScanStopped:
             self._post_status("Stopped.")
         except Exception as e:
             self._post_status(f"Error: {e}")
+        finally:
+            self.engine = None
+            if ingest: ingest.close()
+            if lifetime: lifetime.close()
+            # Stopped or failed scans stay open for Resume
+            if completed: journal.finish()
+            else: journal.close()
+            # Where the time went: summary table and trace file for this scan
+            scan_report(trace_mark, t_start, out if self._trace_files() else None, "flim")
+        if completed and archive and ingest and ingest.cube is not None:
+            self._archive(ingest.cube)
+
+    def _archive(self, cube):
+        """Write the compressed copy next to the cube directory."""
+        self._post_status(f"Archiving {cube.path.name}...")
+        try:
+            st = write_archive(cube, cube.path.with_name(cube.path.name + ARCHIVE_SUFFIX))
+            self._post_status(f"Done.  Cube: {cube.path}  Archive: {st['bytes'] / 2**20:.1f} MB "
+                              f"({st['ratio']:.0f}x smaller, {st['codec']})")
+        except Exception as e:
+            self._post_status(f"Archive failed: {e}")
+
+    def _rebuild(self, cube, lifetime=None):
+        """Map view (and lifetime fits) for the histograms a resumed scan already has."""
+        iy, ix, k = np.nonzero(np.asarray(cube.filled))
+        if iy.size == 0:
+            return
+        rate = cube.rate()
+        for kk in np.unique(k):
+            sel = k == kk
+            self.map.set_values("intensity", iy[sel], ix[sel], int(kk), rate[iy[sel], ix[sel], kk])
+        if lifetime is not None:
+            for y, x, kk in zip(iy.tolist(), ix.tolist(), k.tolist()):
+                lifetime.submit(ScanStep(x, y, float(cube.wls[kk])), cube.histogram(y, x, kk))
+
+    def _run_fly_raster(self, W, H, wls, tacq, out, fits=0):
+        """One continuous raster per wavelength; photons are binned from the time tags."""
+        self.fly_stop = threading.Event()
+        view = self.map
+        scratch = os.path.join(out, "_incoming"); os.makedirs(scratch, exist_ok=True)
+        cube = lifetime = None
+        trace_mark, t_start = TRACER.mark(), time.perf_counter()
+        try:
+            raster = FlyRaster(self.stage, self.th260, W, H, tacq)
+            cube = FlimCube.create(os.path.join(out, time.strftime("cube_%Y%m%d_%H%M%S")), H, W, wls,
+                                   raster.bins, tacq_ms=tacq, order="fly-raster")
+            if fits is not None:
+                lifetime = OnlineLifetimeEstimator(os.path.join(cube.path, "lifetime"), H, W, wls,
+                                                   self._resolution_ns(), multiexp=fits,
+                                                   on_batch=lambda iy, ix, k, r: view.set_values("lifetime", iy, ix, k, r["tau_tail"]))
+            settler = mono_settler(self.mono)
+            iy, ix = np.divmod(np.arange(W * H), W)
+            for k, wl in enumerate(wls):
+                if self.fly_stop.is_set(): raise ScanStopped()
+                with span("goto", "cornerstone"):
+                    moved = self.mono.goto(wl)
+                # Only cached clients report False for "already there"; None still settles
+                if moved is not False:
+                    settler.wait(wl, stop=self.fly_stop)
+                self._post_status(f"[fly raster] λ={wl:.2f} nm ({k+1}/{len(wls)}), ~{raster.duration_s:.0f} s per image")
+                tags = os.path.join(scratch, f"tags_{k}.bin")
+                with span("acquire", "fly raster"):
+                    hists = raster.run(tags, self.fly_stop)
+                os.remove(tags)
+                with span("measure", "cube"):
+                    cube.write_plane(k, hists, dwell_ms=tacq)
+                counts = hists.sum(axis=-1, dtype=np.float64)
+                with span("plot", "map"):
+                    view.set_values("intensity", iy, ix, k, counts.ravel() * 1000.0 / tacq)
+                if lifetime is not None:
+                    for y, x in zip(iy, ix):
+                        lifetime.submit(ScanStep(int(x), int(y), wl), hists[y, x])
+            if self.fly_stop.is_set(): raise ScanStopped()
+            self._post_status(f"Done.  Cube: {cube.path}")
+        except ScanStopped:
+            self._post_status("Stopped.")
+        except FlyRasterUnsupported as e:
+            self._post_status(f"{e}. Untick 'Fly raster' to scan pixel by pixel.")
+        except Exception as e:
+            self._post_status(f"Error: {e}")
+        finally:
+            if cube is not None: cube.close()
+            if lifetime is not None: lifetime.close()
+            scan_report(trace_mark, t_start, out if self._trace_files() else None, "flim_fly")
+
+    def _trace_files(self) -> bool:
+        return self.config.get("telemetry", {}).get("trace_files", True)
+
+    def _resolution_ns(self):
+        """TH260 bin width from the helper's `info`, 25 ps if it does not say."""
+        try:
+            res_ps = self.th260.info().get("resolution_ps") or 25.0
+        except Exception:
+            res_ps = 25.0
+        return res_ps / 1000.0
 
     def _post_status(self, text):
-        self.after(0, lambda: self.status.config(text=text))
+        # Called from the scan thread; only the newest text is shown
+        self._status_text = text
+
+    def _poll_status(self):
+        text, self._status_text = self._status_text, None
+        if text is not None:
+            self.status.config(text=text)
+        self._status_job = self.after(100, self._poll_status)
 
     def _stop(self):
         self.stop_flag = True
+        if self.fly_stop: self.fly_stop.set()
+        if self.engine: self.engine.stop()
 
     def _back(self):
         self._stop()
@@ -154,7 +546,9 @@ class FlimView(ttk.Frame):
 
     def destroy(self):
         try:
+            self.after_cancel(self._status_job)
             self._stop()
             self._disconnect()
+            if self._own_devices: self.devices.close()
         finally:
             super().destroy()
@@ -6,15 +6,22 @@ import numpy as np
 
 import matplotlib
 matplotlib.use("TkAgg")
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 import ttkbootstrap as tb
 from ttkbootstrap.constants import *
+import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 
 from config import CONFIG
-from clients.cornerstone_client import CornerstoneClient
+from clients.registry import DeviceHandle, DeviceRegistry
+from scan.settle import Settler, mono_settler
+from scan.flyscan import FlySweep
+from scan.adaptive import AdaptiveSampler
+from scan.journal import ScanJournal, read_journal
+from scan.worker import AcquisitionWorker
+from widgets.live_plot import LivePlot, TraceBuffer
+from telemetry import TRACER, scan_report, span
+import DataMeasurer as dm
 
 # --- Detect if running as a bundled EXE (optional, keeps stdout quiet when frozen) ---
 IS_FROZEN = getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS')
@@ -26,23 +33,30 @@ if IS_FROZEN:
 class HyperSpectralView(ttk.Frame):
     """HyperSpectral GUI (Cornerstone spectrograph + DataMeasurer) with ttkbootstrap styling."""
 
+    POLL_MS = 30  # how often the UI drains acquisition results
+
     def __init__(self, parent, app=None, config=None, go_home=None):
         super().__init__(parent, padding=12)
         self.app, self.config, self.go_home = app, config or CONFIG, go_home
 
-        # Backend
-        self.mono: CornerstoneClient | None = None
+        # Backend: the Cornerstone session is shared with the other modes
+        self.devices = getattr(app, "devices", None)
+        self._own_devices = self.devices is None
+        if self._own_devices:
+            self.devices = DeviceRegistry(self.config)
+        self.mono: DeviceHandle | None = None
+        self.settler: Settler | None = None
+        self._connecting = None     # future of the handle being acquired
+        self._connect_job = None
 
         # Scan state
         self.scan_stopped = False
-        self.scan_wls: list[float] = []
-        self.scan_data: list[float] = []
+        self.worker: AcquisitionWorker | None = None
+        self.journal: ScanJournal | None = None
 
-        # Plot handles
-        self.plot_fig = None
-        self.plot_ax = None
-        self.plot_line = None
-        self.canvas_widget = None
+        # Plot (its "scan" trace is also the scan's data store)
+        self.plot: LivePlot | None = None
+        self.scan: TraceBuffer | None = None
 
         # --- UI ---
         self._build_header()
@@ -76,11 +90,24 @@ class HyperSpectralView(ttk.Frame):
         self.end_e   = ttk.Entry(scan); self._row(scan, "End   λ (nm):", self.end_e,   1, "520")
         self.steps_e = ttk.Entry(scan); self._row(scan, "Step Count:",    self.steps_e, 2, "20")
 
-        self.out_e = ttk.Entry(scan, width=28); self._row(scan, "Save CSV:", self.out_e, 3)
+        self.rate_e  = ttk.Entry(scan); self._row(scan, "Fly Rate (nm/s):", self.rate_e, 3, "5")
+        self.fly_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(scan, text="Fly scan", variable=self.fly_var).grid(row=3, column=2, padx=4)
+
+        # Adaptive: Step Count is the coarse grid, refined up to Max Points
+        self.budget_e = ttk.Entry(scan); self._row(scan, "Max Points:", self.budget_e, 4, "200")
+        self.adaptive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(scan, text="Adaptive", variable=self.adaptive_var).grid(row=4, column=2, padx=4)
+        self.tol_e = ttk.Entry(scan); self._row(scan, "Tolerance (%):", self.tol_e, 5, "1")
+        # Continue an interrupted step/adaptive scan from the journal next to the CSV
+        self.resume_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(scan, text="Resume", variable=self.resume_var).grid(row=5, column=2, padx=4)
+
+        self.out_e = ttk.Entry(scan, width=28); self._row(scan, "Save CSV:", self.out_e, 6)
         tb.Button(scan, text="Browse", bootstyle=INFO, command=self._pick_csv)\
-          .grid(row=3, column=2, padx=4)
+          .grid(row=6, column=2, padx=4)
 
-        btns = ttk.Frame(scan); btns.grid(row=4, column=0, columnspan=3, pady=8, sticky="ew")
+        btns = ttk.Frame(scan); btns.grid(row=7, column=0, columnspan=3, pady=8, sticky="ew")
         tb.Button(btns, text="Connect",  bootstyle=SUCCESS,  command=self._connect).grid(row=0, column=0, padx=4)
         tb.Button(btns, text="Start",    bootstyle=PRIMARY,  command=self._start_with_plot).grid(row=0, column=1, padx=4)
         tb.Button(btns, text="Stop",     bootstyle=DANGER,   command=self._stop_scan).grid(row=0, column=2, padx=4)
@@ -115,17 +142,14 @@ class HyperSpectralView(ttk.Frame):
         plot.grid_columnconfigure(0, weight=1)
         plot.grid_rowconfigure(0, weight=1)
 
-        # Initialize Matplotlib canvas
-        self.plot_fig, self.plot_ax = plt.subplots()
-        self.plot_line, = self.plot_ax.plot([], [], 'b-')
-        self.plot_ax.set_xlabel("Wavelength (nm)")
-        self.plot_ax.set_ylabel("Lock-In Amp Voltage")
-        self.plot_ax.set_title("Live Data")
-        self.plot_ax.grid(True)
-        self.plot_fig.tight_layout()
+        self.plot = LivePlot(plot, xlabel="Wavelength (nm)", ylabel="Lock-In Amp Voltage", title="Live Data")
+        self.plot.add_trace("reference", "k-", alpha=0.5, lw=1)
+        self.plot.add_trace("previous", "-", color="0.6", lw=1)
+        self.scan = self.plot.add_trace("scan", "b-")
+        self.plot.widget.grid(row=0, column=0, sticky="nsew")
 
-        self.canvas_widget = FigureCanvasTkAgg(self.plot_fig, master=plot)
-        self.canvas_widget.get_tk_widget().grid(row=0, column=0, sticky="nsew")
+        tb.Button(plot, text="Load Reference", bootstyle=INFO, command=self._load_reference)\
+          .grid(row=1, column=0, sticky="e", pady=(6, 0))
 
     # -------------------------------------------------------------------------
     # UI HELPERS
@@ -137,6 +161,16 @@ class HyperSpectralView(ttk.Frame):
         if default is not None:
             entry.insert(0, default)
 
+    def _load_reference(self):
+        p = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
+        if not p:
+            return
+        try:
+            ref = np.atleast_2d(np.loadtxt(p, delimiter=",", skiprows=1))
+            self.plot.set_trace("reference", ref[:, 0], ref[:, 1])
+        except Exception as e:
+            messagebox.showerror("HyperSpectral", f"Could not load reference: {e}")
+
     def _pick_csv(self):
         p = filedialog.asksaveasfilename(defaultextension=".csv",
                                          filetypes=[("CSV files", "*.csv")])
@@ -147,20 +181,54 @@ class HyperSpectralView(ttk.Frame):
     # DEVICE COMMANDS
     # -------------------------------------------------------------------------
     def _connect(self):
+        # Opening the helper can take a while (instant when prewarmed): it runs
+        # on a thread and a timer picks the handle up
+        if self.mono is None and self._connecting is None:
+            self._connecting = self.devices.acquire_later(["cornerstone"])
+            self._connected()
+
+    def _connected(self):
+        future = self._connecting
+        if future is None:
+            return
+        if not future.done():
+            opening = self.devices.status().get("cornerstone") == "opening"
+            self._set_status("Opening Cornerstone…" if opening else "Connecting…")
+            self._connect_job = self.after(self.POLL_MS, self._connected)
+            return
+        self._connecting = self._connect_job = None
         try:
-            if self.mono is None:
-                exe = self.config["helpers"]["cornerstone"]
-                self.mono = CornerstoneClient(exe)
-                self.mono.open()
+            self.mono = future.result()["cornerstone"]
+            self.settler = mono_settler(self.mono, fallback_s=0.8)
+            if self.config.get("sim"):
+                # The simulated scope's signal follows the simulated grating
+                dm.get().backend.wavelength = lambda: self.mono.state.get("wavelength") if self.mono else None
             self._set_status("Cornerstone connected.")
         except Exception as e:
+            self._set_status("Not connected.")
             messagebox.showerror("HyperSpectral", str(e))
 
     def _shutdown(self):
         try:
+            if self.worker:
+                self.scan_stopped = True
+                self.worker.stop()
+                self.worker.join(timeout=2.0)
+                self.worker = None
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+            future, self._connecting = self._connecting, None
+            if self._connect_job is not None:
+                self.after_cancel(self._connect_job)
+                self._connect_job = None
+            if future is not None:
+                # A handle that arrives after this is released at once
+                future.add_done_callback(lambda f: f.exception() is None and f.result()["cornerstone"].release())
             if self.mono:
-                self.mono.close()
+                self.mono.close()       # release; the helper stays up
                 self.mono = None
+            dm.close()  # release the persistent scope session
             self._set_status("Disconnected.")
         except Exception as e:
             messagebox.showerror("HyperSpectral", str(e))
@@ -170,8 +238,8 @@ class HyperSpectralView(ttk.Frame):
             if not self.mono:
                 raise RuntimeError("Connect Cornerstone first.")
             nm = float(self.wl_entry.get())
-            self.mono.goto(nm)
-            time.sleep(0.3)
+            if self.mono.goto(nm) is not False:
+                self.settler.wait(nm, timeout=0.3)
             self._get_wavelength()
         except Exception as e:
             messagebox.showerror("HyperSpectral", str(e))
@@ -205,14 +273,17 @@ class HyperSpectralView(ttk.Frame):
     # SCAN LOGIC
     # -------------------------------------------------------------------------
     def _start_with_plot(self):
-        # Initialize empty plot
-        self.scan_data = []
-        self.scan_wls = []
-        self._update_plot()
-        # Run in the GUI thread using .after loop (keeps UI responsive)
+        # Keep the last scan as an overlay, then start an empty trace
+        if len(self.scan):
+            self.plot.set_trace("previous", self.scan.x.copy(), self.scan.y.copy())
+        self.plot.clear("scan")
+        # Acquisition runs on a worker thread; the UI drains its results
         self._start_scan()
 
     def _start_scan(self):
+        if self.worker and self.worker.is_alive():
+            messagebox.showinfo("HyperSpectral", "A scan is already running.")
+            return
         self.scan_stopped = False
         try:
             if not self.mono:
@@ -226,84 +297,195 @@ class HyperSpectralView(ttk.Frame):
                 messagebox.showerror("Input Error", "Please select a save location.")
                 return
 
-            self.scan_wls = np.linspace(start_wl, end_wl, steps + 1).tolist()
-            self.scan_data = []
-
-            # Go to start and open shutter
-            self.mono.goto(start_wl)
-            time.sleep(0.8)
-            self.mono.open_shutter()
-
-            # Kick off step loop
-            self.after(0, lambda: self._step_loop(0, save_path))
+            if self.fly_var.get():
+                rate = float(self.rate_e.get())
+                target = lambda stop, emit: self._run_fly(start_wl, end_wl, rate, stop, emit)
+                self._set_status(f"Fly scan {start_wl:.2f} → {end_wl:.2f} nm at {rate:g} nm/s")
+                self.plot.clear("scan")
+            else:
+                # Step and adaptive scans are journaled point by point (<csv>.journal)
+                params = {"start": start_wl, "end": end_wl, "steps": steps, "adaptive": self.adaptive_var.get(),
+                          "budget": int(self.budget_e.get()), "tol_pct": float(self.tol_e.get())}
+                journal_path = os.path.splitext(save_path)[0] + ".journal"
+                points = []
+                if self.resume_var.get() and os.path.exists(journal_path):
+                    if read_journal(journal_path)[2]:
+                        messagebox.showinfo("HyperSpectral", "That scan already finished; uncheck Resume to start over.")
+                        return
+                    self.journal = ScanJournal.resume(journal_path)
+                    params = self.journal.params      # the interrupted scan's settings
+                    points = [(r["wl"], r["v"]) for r in self.journal.steps]
+                else:
+                    self.journal = ScanJournal.create(journal_path, "hyperspectral", params)
+                journal = self.journal
+                start_wl, end_wl, steps = params["start"], params["end"], params["steps"]
+
+                if params["adaptive"]:
+                    sampler = AdaptiveSampler(start_wl, end_wl, coarse=steps, budget=params["budget"],
+                                              rel_tol=params["tol_pct"] / 100.0)
+                    sampler.restore(points)
+                    target = lambda stop, emit: self._run_adaptive(sampler, stop, emit, journal)
+                    self._set_status(f"Adaptive scan {start_wl:.2f} → {end_wl:.2f} nm, ≤ {sampler.budget} points")
+                    points.sort()
+                else:
+                    wls = np.linspace(start_wl, end_wl, steps + 1).tolist()
+                    target = lambda stop, emit: self._run_steps(wls, stop, emit, journal)
+                self.plot.clear("scan")
+                if points:
+                    self.plot.set_trace("scan", [p[0] for p in points], [p[1] for p in points])
+                    self._set_status(f"Resuming: {len(points)} points already measured")
+
+            self._trace_mark, self._trace_t0 = TRACER.mark(), time.perf_counter()
+            self.worker = AcquisitionWorker(target, on_stop=self._abort_measurement).start()
+            self.after(self.POLL_MS, lambda: self._drain(save_path))
 
         except ValueError:
             messagebox.showerror("Input Error", "Start/End wavelengths and steps must be numbers.")
         except Exception as e:
             messagebox.showerror("Unexpected Error", str(e))
 
-    def _step_loop(self, index: int, save_path: str):
-        if self.scan_stopped or index >= len(self.scan_wls):
-            # Close shutter and save (if not stopped)
-            try:
-                if self.mono:
-                    self.mono.close_shutter()
-            finally:
-                if not self.scan_stopped and len(self.scan_data) > 0:
-                    arr = np.column_stack([np.array(self.scan_wls[:len(self.scan_data)]),
-                                           np.array(self.scan_data)])
-                    np.savetxt(save_path, arr, delimiter=",",
-                               header="Wavelength,Intensity", comments='')
-                    self._set_status(f"Saved: {save_path}")
-            return
+    # --- Worker thread -------------------------------------------------------
+    def _run_steps(self, wls, stop, emit, journal=None):
+        """Step scan: move, settle, measure; no artificial delay between points."""
+        try:
+            m = dm.get()
+        except Exception:
+            m = None   # no digitizer: record 0.0 as before
+        if self.mono.goto(wls[0]) is not False:
+            self.settler.wait(wls[0], stop=stop)
+        self.mono.open_shutter()
+        try:
+            prev = wls[0]
+            for i, wl in enumerate(wls):
+                if stop.is_set(): return
+                if journal is not None and journal.is_done(None, None, wl):
+                    continue    # measured before the resume
+                # goto() is skipped (False) when already there, e.g. index 0 after the start move
+                with span("goto", "cornerstone"):
+                    moved = self.mono.goto(wl)
+                if moved is not False:
+                    self.settler.wait(wl, distance=abs(wl - prev), stop=stop, timeout=0.3)
+                prev = wl
+                if stop.is_set(): return
+                try:
+                    with span("measure", "scope"):
+                        intensity = m.record() if m else 0.0
+                except Exception:
+                    if stop.is_set(): return   # fetch aborted by Stop
+                    intensity = 0.0
+                if journal is not None: journal.record(None, None, wl, v=float(intensity))
+                emit(("point", i, len(wls), wl, float(intensity)))
+        finally:
+            self.mono.close_shutter()
 
-        wl = self.scan_wls[index]
+    def _run_adaptive(self, sampler, stop, emit, journal=None):
+        """Coarse grid first, then refine where the spectrum bends or rises fastest."""
         try:
-            # Move to wavelength
-            self.mono.goto(wl)
-            time.sleep(0.3)
+            m = dm.get()
+        except Exception:
+            m = None
+        self.mono.open_shutter()
+        try:
+            prev = None
+            while not stop.is_set():
+                batch = sampler.next_batch()
+                if not batch:
+                    return
+                for wl in batch:
+                    if stop.is_set(): return
+                    with span("goto", "cornerstone"):
+                        moved = self.mono.goto(wl)
+                    if moved is not False:
+                        self.settler.wait(wl, distance=abs(wl - prev) if prev is not None else 1.0,
+                                          stop=stop, timeout=0.3)
+                    prev = wl
+                    if stop.is_set(): return
+                    try:
+                        with span("measure", "scope"):
+                            intensity = m.record() if m else 0.0
+                    except Exception:
+                        if stop.is_set(): return
+                        intensity = 0.0
+                    sampler.add(wl, float(intensity))
+                    if journal is not None: journal.record(None, None, wl, v=float(intensity))
+                    emit(("sorted_point", len(sampler), sampler.budget, wl, float(intensity)))
+        finally:
+            self.mono.close_shutter()
 
-            # Measure intensity
-            try:
-                import DataMeasurer as dm
-                intensity = dm.record()
-            except Exception:
-                intensity = 0.0
+    def _run_fly(self, start_wl, end_wl, rate, stop, emit):
+        """Continuous sweep; batches are plotted as they arrive."""
+        self.mono.open_shutter()
+        try:
+            sweep = FlySweep(self.mono, dm.get(), start_wl, end_wl, nm_per_s=rate)
+            res = sweep.run(stop, on_batch=lambda w, v: emit(("batch", w, v)))
+            emit(("fly_done", res))
+        finally:
+            self.mono.close_shutter()
 
-            self.scan_data.append(float(intensity))
-            self._update_plot()
-            self._set_status(f"{index+1}/{len(self.scan_wls)}  λ={wl:.2f} nm  val={intensity:.4g}")
+    def _abort_measurement(self):
+        if dm._measurer is not None:
+            dm._measurer.abort()
 
-            # Schedule next step
-            self.after(100, lambda: self._step_loop(index + 1, save_path))
+    # --- UI thread -------------------------------------------------------------
+    def _drain(self, save_path: str):
+        w = self.worker
+        if w is None:
+            return
+        alive = w.is_alive()
+        items = w.drain()
+        t_plot = time.perf_counter()
+        for item in items:
+            kind = item[0]
+            if kind == "point":
+                _, i, n, wl, val = item
+                self.plot.append("scan", wl, val)
+                self._set_status(f"{i+1}/{n}  λ={wl:.2f} nm  val={val:.4g}")
+            elif kind == "sorted_point":
+                # Adaptive refinement arrives out of order; the trace (and CSV) stay sorted
+                _, i, n, wl, val = item
+                self.plot.insert("scan", wl, val)
+                self._set_status(f"{i} (≤{n})  λ={wl:.2f} nm  val={val:.4g}")
+            elif kind == "batch":
+                _, wls, vals = item
+                self.plot.append("scan", wls, vals)
+                self._set_status(f"Fly scan: {len(self.scan)} records  λ≈{wls[-1]:.2f} nm")
+            elif kind == "fly_done":
+                # Final wavelengths use every readback, so replace the live estimates
+                res = item[1]
+                order = np.argsort(res.wls)
+                self.plot.set_trace("scan", res.wls[order], res.values[order])
+        if items:
+            TRACER.record("plot", "live plot", t_plot)
+
+        if alive or not w.results.empty():
+            self.after(self.POLL_MS, lambda: self._drain(save_path))
+            return
 
-        except Exception as e:
-            messagebox.showerror("HyperSpectral", str(e))
-            # Attempt to close shutter if error
-            try:
-                if self.mono:
-                    self.mono.close_shutter()
-            except Exception:
-                pass
+        # Worker finished
+        self.worker = None
+        scan_report(self._trace_mark, self._trace_t0,
+                    os.path.dirname(save_path) if self.config.get("telemetry", {}).get("trace_files", True) else None,
+                    "hyperspectral")
+        journal, self.journal = self.journal, None
+        if w.error is not None:
+            if journal: journal.close()     # kept for Resume
+            messagebox.showerror("HyperSpectral", str(w.error))
+        elif not self.scan_stopped and len(self.scan) > 0:
+            arr = np.column_stack([self.scan.x, self.scan.y])
+            np.savetxt(save_path, arr, delimiter=",",
+                       header="Wavelength,Intensity", comments='')
+            if journal: journal.finish()
+            self._set_status(f"Saved: {save_path}")
+        else:
+            if journal: journal.close()
+            self._set_status("Stopped.")
 
     def _stop_scan(self):
         self.scan_stopped = True
+        if self.worker:
+            self.worker.stop()
         self._set_status("Stopping...")
 
-    # -------------------------------------------------------------------------
-    # PLOT
-    # -------------------------------------------------------------------------
-    def _update_plot(self):
-        if self.plot_line is None:  # safety
-            return
-        x = np.array(self.scan_wls[:len(self.scan_data)])
-        y = np.array(self.scan_data)
-        self.plot_line.set_data(x, y)
-        self.plot_ax.relim()
-        self.plot_ax.autoscale_view()
-        if self.plot_fig:
-            self.plot_fig.canvas.draw_idle()
-
     # -------------------------------------------------------------------------
     # NAV / LIFECYCLE
     # -------------------------------------------------------------------------
@@ -319,5 +501,6 @@ class HyperSpectralView(ttk.Frame):
     def destroy(self):
         try:
             self._shutdown()
+            if self._own_devices: self.devices.close()
         finally:
             super().destroy()
@@ -0,0 +1,101 @@
+# scan/adaptive.py
+from __future__ import annotations
+
+import numpy as np
+
+
+class AdaptiveSampler:
+    """
+    Adaptive 1-D sampling of a spectrum y(λ).
+
+    Starts with `coarse + 1` evenly spaced wavelengths, then repeatedly
+    bisects the intervals with the largest error estimate until every
+    interval is below `tol` (or narrower than `min_step_nm`), or `budget`
+    points have been measured. The estimate of an interval is the larger of
+
+      - curvature: |y''| h² / 8, the error of linear interpolation, with y''
+        from the divided differences at both ends, and
+      - gradient: `grad_weight` × |Δy|, so steep edges are resolved too.
+
+    `tol` defaults to `rel_tol` × the span of the values seen so far.
+    Use `next_batch()` / `add()` from the acquisition loop; batches come in
+    monotonic order, alternating direction, to keep grating moves short.
+    """
+    def __init__(self, start_nm: float, end_nm: float, coarse=10, budget=200,
+                 tol: float | None = None, rel_tol=0.01, grad_weight=0.25,
+                 min_step_nm=0.05, batch=4):
+        self.start, self.end = float(start_nm), float(end_nm)
+        self.budget = max(int(budget), coarse + 1)
+        self.tol, self.rel_tol = tol, rel_tol
+        self.grad_weight = grad_weight
+        self.min_step = min_step_nm
+        self.batch = max(1, int(batch))
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self._queued = list(np.linspace(self.start, self.end, coarse + 1))
+        self._ascending = self.end >= self.start
+        self.done = False
+
+    def __len__(self):
+        return self.x.size
+
+    # --- Measurements
+    def add(self, wl: float, value: float):
+        """Record one measurement (kept sorted by wavelength)."""
+        i = int(np.searchsorted(self.x, wl))
+        self.x = np.insert(self.x, i, wl)
+        self.y = np.insert(self.y, i, value)
+
+    def restore(self, points):
+        """Re-add (wl, value) pairs measured before a resume; they are not queued again."""
+        for wl, value in points:
+            self.add(wl, value)
+        if self.x.size:
+            self._queued = [w for w in self._queued if np.abs(self.x - w).min() > 1e-9]
+
+    def next_batch(self) -> list[float]:
+        """Wavelengths to measure next; empty (and `done`) when converged or out of budget."""
+        if self._queued:
+            out, self._queued = self._queued, []
+            return out
+        left = self.budget - self.x.size
+        if left <= 0:
+            self.done = True
+            return []
+        err = self.interval_errors()
+        h = np.diff(self.x)
+        tol = self.tolerance()
+        err[h < 2 * self.min_step] = 0.0
+        candidates = np.flatnonzero(err > tol)
+        if candidates.size == 0:
+            self.done = True
+            return []
+        worst = candidates[np.argsort(err[candidates])[::-1][:min(self.batch, left)]]
+        mids = sorted(((self.x[worst] + self.x[worst + 1]) / 2).tolist(), reverse=not self._ascending)
+        self._ascending = not self._ascending
+        return mids
+
+    # --- Error model
+    def tolerance(self) -> float:
+        if self.tol is not None:
+            return self.tol
+        span = float(np.ptp(self.y)) if self.y.size else 0.0
+        return self.rel_tol * span if span > 0 else np.inf
+
+    def interval_errors(self) -> np.ndarray:
+        """Error estimate for each of the len(x) - 1 intervals."""
+        x, y = self.x, self.y
+        if x.size < 2:
+            return np.zeros(0)
+        h = np.diff(x)
+        dy = np.diff(y)
+        grad = self.grad_weight * np.abs(dy)
+        if x.size < 3:
+            return grad
+        slope = dy / np.where(h == 0, np.inf, h)
+        # Second derivative at interior points from neighbouring slopes
+        d2 = np.zeros(x.size)
+        d2[1:-1] = 2 * np.diff(slope) / (h[:-1] + h[1:])
+        d2[0], d2[-1] = d2[1], d2[-2]
+        curv = np.maximum(np.abs(d2[:-1]), np.abs(d2[1:])) * h * h / 8
+        return np.maximum(curv, grad)
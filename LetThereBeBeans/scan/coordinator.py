@@ -0,0 +1,126 @@
+# scan/coordinator.py
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, Iterable
+
+from scan import settle
+from scan.engine import ScanStep
+from scan.settle import Settler
+from telemetry import span
+
+
+class AsyncScanCoordinator:
+    """
+    ScanEngine for the asyncio clients (clients.aio): the same pipeline on
+    one event loop instead of one thread per device.
+
+    The stage move and the grating move of a step run concurrently
+    (`asyncio.gather`, each only when its target changed) and the
+    acquisition waits for both. With `overlap_readout` (the default) the
+    moves for the next step start as soon as the helper reports the exposure
+    over (`PART ... END=1`), while it is still returning the histogram;
+    helpers that do not report it release the light path with their reply.
+    Cancel the task running `run()` to stop: pending waits end at once and a count-targeted
+    measurement is told to `stop`.
+    """
+    def __init__(self, stage, mono, th260, *, stage_settle_s=0.1, mono_settle_s=0.8,
+                 stage_settler: Settler | None = None, mono_settler: Settler | None = None,
+                 overlap_readout=True,
+                 target_counts: int | None = None, target_snr: float | None = None):
+        self.stage, self.mono, self.th260 = stage, mono, th260
+        self.stage_settler = stage_settler or settle.stage_settler(stage, stage_settle_s)
+        self.mono_settler = mono_settler or settle.mono_settler(mono, mono_settle_s)
+        self.overlap_readout = overlap_readout
+        self.target_counts, self.target_snr = target_counts, target_snr
+
+    @property
+    def adaptive(self) -> bool:
+        return bool(self.target_counts or self.target_snr)
+
+    # --- Jobs
+    async def _move_stage(self, step: ScanStep, W: int, H: int, distance_px: int):
+        with span("move", "stage"):
+            await self.stage.move_ix(step.ix, step.iy, W, H)
+        await self.stage_settler.wait_async(distance=distance_px)
+
+    async def _goto(self, nm: float, distance_nm: float):
+        with span("goto", "cornerstone"):
+            await self.mono.goto(nm)
+        await self.mono_settler.wait_async(nm, distance=distance_nm)
+
+    async def _acquire(self, step: ScanStep, tacq_ms: int, output_dir: str, released: asyncio.Event):
+        """Returns (hist, dwell_ms); sets `released` when the light path is free."""
+        try:
+            with span("acquire", "th260"):
+                if self.adaptive:
+                    res = await self.th260.acquire_until(
+                        tacq_ms, output_dir, wl=step.wl, ix=step.ix, iy=step.iy,
+                        target_counts=self.target_counts, target_snr=self.target_snr,
+                        on_exposed=released.set)
+                    return res.hist, res.dwell_ms
+                hist = await self.th260.acquire(tacq_ms, output_dir, step.wl, step.ix, step.iy,
+                                               on_exposed=released.set)
+                return hist, None
+        finally:
+            released.set()
+
+    # --- Run
+    async def run(self, steps: Iterable[ScanStep], W: int, H: int, tacq_ms: int, output_dir: str,
+                  on_step: Callable[[int, ScanStep], None] | None = None,
+                  post_acquire: Callable[[ScanStep, object], None] | None = None) -> int:
+        """
+        Execute `steps` and return the number completed; callbacks as in
+        ScanEngine.run, called on the loop right after each acquisition.
+        """
+        last_pixel = last_wl = None
+        prev = None             # (index, step, task, released) of the running acquisition
+        completed = 0
+
+        async def finish(entry):
+            nonlocal completed
+            i, st, task, _released = entry
+            hist, dwell_ms = await task
+            if post_acquire:
+                if self.adaptive:
+                    post_acquire(st, hist, dwell_ms=dwell_ms)
+                else:
+                    post_acquire(st, hist)
+            completed += 1
+            if on_step: on_step(i, st)
+
+        try:
+            for i, step in enumerate(steps):
+                moves = []
+                if (step.ix, step.iy) != last_pixel:
+                    d_px = W + H if last_pixel is None else max(abs(step.ix - last_pixel[0]), abs(step.iy - last_pixel[1]))
+                    moves.append(self._move_stage(step, W, H, d_px))
+                    last_pixel = (step.ix, step.iy)
+                if step.wl != last_wl:
+                    d_nm = 1000.0 if last_wl is None else abs(step.wl - last_wl)
+                    moves.append(self._goto(step.wl, d_nm))
+                    last_wl = step.wl
+
+                if prev is not None:
+                    if moves and self.overlap_readout:
+                        await prev[3].wait()
+                        await asyncio.gather(*moves)
+                        moves = []
+                    await finish(prev)
+                    prev = None
+                await asyncio.gather(*moves)
+
+                released = asyncio.Event()
+                task = asyncio.create_task(self._acquire(step, tacq_ms, output_dir, released))
+                prev = (i, step, task, released)
+            if prev is not None:
+                await finish(prev)
+                prev = None
+        finally:
+            if prev is not None and not prev[2].done():
+                prev[2].cancel()
+                try:
+                    await prev[2]
+                except BaseException:
+                    pass
+        return completed
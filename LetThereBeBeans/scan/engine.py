@@ -0,0 +1,254 @@
+# scan/engine.py
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Callable, Iterable, NamedTuple
+
+from scan import settle
+from scan.settle import Settler
+from telemetry import span
+
+
+class ScanStep(NamedTuple):
+    """One acquisition point: stage pixel (ix, iy) at wavelength wl (nm)."""
+    ix: int
+    iy: int
+    wl: float
+
+
+class ScanStopped(Exception):
+    """Raised when a scan is stopped before it finished."""
+
+
+class _Gate:
+    """
+    Completion handle for a submitted job.
+
+    `done` is set when the job finished (successfully or not). For acquisitions
+    `release_at` is set once the helper reports the end of the exposure; jobs
+    that only need the optics can start then, even though the helper is still
+    writing the histogram to disk. It is never guessed from the dwell time: a
+    helper that starts late would otherwise see the sample move mid-exposure.
+    """
+    def __init__(self):
+        self.started = threading.Event()
+        self.done = threading.Event()
+        self.release_at: float | None = None
+        self.error: BaseException | None = None
+
+
+_DONE = _Gate()
+_DONE.started.set()
+_DONE.done.set()
+
+
+def _wait_gate(gate: _Gate, stop: threading.Event, light_only=False, poll=0.05):
+    """Block until `gate` is done (or its light path released); honours `stop`."""
+    while not gate.started.wait(poll):
+        if stop.is_set(): raise ScanStopped()
+    while True:
+        timeout = poll
+        if light_only and gate.release_at is not None:
+            remaining = gate.release_at - time.monotonic()
+            if remaining <= 0:
+                break
+            timeout = min(poll, remaining)
+        if gate.done.wait(timeout):
+            break
+        if stop.is_set(): raise ScanStopped()
+    if gate.error is not None:
+        raise gate.error
+
+
+class DeviceWorker:
+    """
+    Runs jobs for a single client on its own thread.
+    Jobs execute in submission order, each one after its dependencies.
+    """
+    def __init__(self, name: str, stop: threading.Event):
+        self.name = name
+        self._stop = stop
+        self._q: queue.Queue = queue.Queue()
+        self._t = threading.Thread(target=self._loop, name=f"scan-{name}", daemon=True)
+        self._t.start()
+
+    def submit(self, fn: Callable[[_Gate], None], deps: Iterable[tuple[_Gate, bool]] = ()) -> _Gate:
+        """Queue `fn(gate)`; `deps` are (gate, light_only) pairs to wait for first."""
+        gate = _Gate()
+        self._q.put((fn, list(deps), gate))
+        return gate
+
+    def _loop(self):
+        while True:
+            item = self._q.get()
+            if item is None:
+                return
+            fn, deps, gate = item
+            try:
+                for dep, light_only in deps:
+                    _wait_gate(dep, self._stop, light_only)
+                if self._stop.is_set(): raise ScanStopped()
+                gate.started.set()
+                fn(gate)
+            except BaseException as e:
+                gate.error = e
+            finally:
+                gate.started.set()
+                gate.done.set()
+
+    def close(self, timeout=5.0):
+        self._q.put(None)
+        self._t.join(timeout)
+
+
+class ScanEngine:
+    """
+    Pipelined FLIM scan: one worker per client (stage, monochromator, TH260).
+
+    For every step the stage move and the grating move run concurrently (each
+    only when its target changed); the acquisition waits for both. The moves
+    for the next step wait only until the helper reports the exposure over
+    ('PART ... END=1'), so they overlap with it writing the histogram to disk.
+    With helpers that do not report it they wait for the reply instead, as
+    they always do with `overlap_readout=False`.
+
+    With `target_counts`/`target_snr` every acquisition stops as soon as
+    the target is reached (`tacq_ms` becomes the cap); the light path is
+    released when the helper confirms the stop, as above.
+    """
+    def __init__(self, stage, mono, th260, *,
+                 stage_settle_s=0.1, mono_settle_s=0.8,
+                 stage_settler: Settler | None = None, mono_settler: Settler | None = None,
+                 overlap_readout=True, lookahead=4,
+                 target_counts: int | None = None, target_snr: float | None = None):
+        self.stage, self.mono, self.th260 = stage, mono, th260
+        # Closed-loop settle; the old fixed sleeps are the upper bound
+        self.stage_settler = stage_settler or settle.stage_settler(stage, stage_settle_s)
+        self.mono_settler = mono_settler or settle.mono_settler(mono, mono_settle_s)
+        self.overlap_readout = overlap_readout
+        self.lookahead = max(1, int(lookahead))
+        self.target_counts, self.target_snr = target_counts, target_snr
+
+        self._stop = threading.Event()
+        self._workers = {
+            "stage": DeviceWorker("stage", self._stop),
+            "mono":  DeviceWorker("mono",  self._stop),
+            "th260": DeviceWorker("th260", self._stop),
+        }
+
+    # --- Control
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def close(self):
+        self._stop.set()
+        for w in self._workers.values():
+            w.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Jobs
+    def _move_stage(self, step: ScanStep, W: int, H: int, distance_px: int):
+        def job(_gate):
+            # Cached clients return False when nothing moved: no settle needed
+            with span("move", "stage"):
+                moved = self.stage.move_ix(step.ix, step.iy, W, H)
+            if moved is not False:
+                self.stage_settler.wait(distance=distance_px, stop=self._stop)
+        return job
+
+    def _goto(self, nm: float, distance_nm: float):
+        def job(_gate):
+            with span("goto", "cornerstone"):
+                moved = self.mono.goto(nm)
+            if moved is not False:
+                self.mono_settler.wait(nm, distance=distance_nm, stop=self._stop)
+        return job
+
+    @property
+    def adaptive(self) -> bool:
+        return bool(self.target_counts or self.target_snr)
+
+    def _acquire(self, step: ScanStep, tacq_ms: int, output_dir: str, post_acquire=None):
+        def job(gate):
+            def exposed():
+                if self.overlap_readout:
+                    gate.release_at = time.monotonic()
+            if self.adaptive:
+                with span("acquire", "th260"):
+                    res = self.th260.acquire_until(tacq_ms, output_dir, wl=step.wl, ix=step.ix, iy=step.iy,
+                                                   target_counts=self.target_counts, target_snr=self.target_snr,
+                                                   on_exposed=exposed)
+                if post_acquire:
+                    post_acquire(step, res.hist, dwell_ms=res.dwell_ms)
+                return
+            with span("acquire", "th260"):
+                hist = self.th260.acquire(tacq_ms=tacq_ms, output_dir=output_dir, wl=step.wl, ix=step.ix, iy=step.iy,
+                                          on_exposed=exposed)
+            if post_acquire:
+                # Same thread as the acquisitions: the helper output (or the
+                # shared-memory slot returned as `hist`) is this step's alone
+                post_acquire(step, hist)
+        return job
+
+    # --- Run
+    def run(self, steps: Iterable[ScanStep], W: int, H: int, tacq_ms: int, output_dir: str,
+            on_step: Callable[[int, ScanStep], None] | None = None,
+            post_acquire: Callable[[ScanStep, object], None] | None = None) -> int:
+        """
+        Execute `steps` and return the number completed.
+        `on_step(i, step)` is called from this thread after each acquisition;
+        `post_acquire(step, hist)` runs on the TH260 worker right after it, with
+        whatever `acquire` returned (the shared-memory histogram, or None when
+        the helper wrote a file), before the next acquisition starts. In
+        count-targeted mode it is called as `post_acquire(step, hist, dwell_ms=...)`.
+        Raises ScanStopped if stopped, or the first device error.
+        """
+        stage_w, mono_w, th_w = self._workers["stage"], self._workers["mono"], self._workers["th260"]
+        pending: list[tuple[int, ScanStep, _Gate]] = []
+        last_pixel = last_wl = None
+        stage_gate = mono_gate = _DONE
+        light_gate = _DONE          # previous acquisition (optics busy until released)
+        completed = 0
+
+        def _collect(n_keep):
+            nonlocal completed
+            while len(pending) > n_keep:
+                i, st, g = pending.pop(0)
+                _wait_gate(g, self._stop)
+                completed += 1
+                if on_step: on_step(i, st)
+
+        try:
+            for i, step in enumerate(steps):
+                if self._stop.is_set(): raise ScanStopped()
+                optics = (light_gate, self.overlap_readout)
+
+                if (step.ix, step.iy) != last_pixel:
+                    d_px = W + H if last_pixel is None else max(abs(step.ix - last_pixel[0]), abs(step.iy - last_pixel[1]))
+                    stage_gate = stage_w.submit(self._move_stage(step, W, H, d_px), [optics])
+                    last_pixel = (step.ix, step.iy)
+                if step.wl != last_wl:
+                    d_nm = 1000.0 if last_wl is None else abs(step.wl - last_wl)
+                    mono_gate = mono_w.submit(self._goto(step.wl, d_nm), [optics])
+                    last_wl = step.wl
+
+                light_gate = th_w.submit(self._acquire(step, tacq_ms, output_dir, post_acquire),
+                                         [(stage_gate, False), (mono_gate, False)])
+                pending.append((i, step, light_gate))
+                _collect(self.lookahead)
+            _collect(0)
+        except BaseException:
+            self._stop.set()
+            raise
+        return completed
@@ -0,0 +1,191 @@
+# scan/flyraster.py
+from __future__ import annotations
+
+import threading
+import time
+
+import numpy as np
+
+# Time-tag record written by the TH260 helper in T3 mode (tt_start):
+#   nsync    sync pulses since the start of the recording (macro time)
+#   dtime    start-stop time in histogram bins (micro time)
+#   channel  detector channel, or the marker bits for special records
+#   special  1 for marker records, 0 for photons
+TAG_DTYPE = np.dtype([("nsync", "<u8"), ("dtime", "<u2"), ("channel", "u1"), ("special", "u1")])
+
+LINE_MARK = 1       # marker bit at the first pixel of every line
+PIXEL_MARK = 2      # marker bit at the start of every pixel
+
+DAC_FULL = (0, 32767)
+
+
+def read_tags(path) -> np.ndarray:
+    return np.fromfile(path, dtype=TAG_DTYPE)
+
+
+# -----------------------------------------------------------------------------
+# Waveform
+# -----------------------------------------------------------------------------
+def pixel_codes(n: int, codes=DAC_FULL) -> np.ndarray:
+    """DAC code at the centre of each of `n` pixels spanning `codes`."""
+    lo, hi = codes
+    return np.round(lo + (np.arange(n) + 0.5) * (hi - lo) / n).astype(np.int16)
+
+
+def raster_waveform(W: int, H: int, samples_per_pixel=4, x_codes=DAC_FULL, y_codes=DAC_FULL,
+                    serpentine=True, turn_samples=8) -> np.ndarray:
+    """
+    (N, 3) int16 samples (x code, y code, marker bits) for a line raster.
+
+    Each line starts with `turn_samples` unmarked samples in which the slow
+    axis steps and the fast axis settles (turnaround / flyback), followed by
+    W pixels of `samples_per_pixel` samples; the first sample of each pixel
+    carries PIXEL_MARK, the first pixel of the line also LINE_MARK. Within a
+    pixel the fast axis ramps linearly, so the beam sweeps the pixel.
+    """
+    xs = pixel_codes(W, x_codes).astype(np.float64)
+    ys = pixel_codes(H, y_codes)
+    step = (xs[1] - xs[0]) if W > 1 else 0.0
+    # Fast-axis ramp for one left-to-right line, sampled within each pixel
+    frac = (np.arange(samples_per_pixel) + 0.5) / samples_per_pixel - 0.5
+    ramp = (xs[:, None] + frac[None, :] * step).ravel()
+    marks = np.zeros((W, samples_per_pixel), dtype=np.int16)
+    marks[:, 0] = PIXEL_MARK
+    marks[0, 0] |= LINE_MARK
+    marks = marks.ravel()
+
+    lines = []
+    for iy in range(H):
+        x = ramp[::-1] if (serpentine and iy % 2) else ramp
+        turn = np.full(turn_samples, x[0])
+        line = np.empty((turn_samples + x.size, 3), dtype=np.int16)
+        line[:, 0] = np.round(np.concatenate([turn, x]))
+        line[:, 1] = ys[iy]
+        line[:turn_samples, 2] = 0
+        line[turn_samples:, 2] = marks
+        lines.append(line)
+    return np.concatenate(lines)
+
+
+# -----------------------------------------------------------------------------
+# Binning
+# -----------------------------------------------------------------------------
+def bin_tags(tags: np.ndarray, W: int, H: int, bins: int, pixel_syncs: float,
+             serpentine=True) -> np.ndarray:
+    """
+    Sort photons into an (H, W, bins) uint32 FLIM stack using the line and
+    pixel markers. A photon belongs to the last pixel marker before it if it
+    arrived within `pixel_syncs` of it (later photons fell into a
+    turnaround); the column counts pixel markers since the last line marker.
+    """
+    special = tags["special"] != 0
+    marks, photons = tags[special], tags[~special]
+    pix = marks[(marks["channel"] & PIXEL_MARK) != 0]
+    pix_t = pix["nsync"].astype(np.int64)
+    is_line = (pix["channel"] & LINE_MARK) != 0
+    line_of = np.cumsum(is_line) - 1                    # line index of each pixel marker
+    line_start = np.flatnonzero(is_line)
+    col_of = np.arange(pix_t.size) - np.where(line_of >= 0, line_start[np.maximum(line_of, 0)], 0)
+
+    t = photons["nsync"].astype(np.int64)
+    p = np.searchsorted(pix_t, t, side="right") - 1
+    ok = p >= 0
+    p = np.where(ok, p, 0)
+    iy = line_of[p] if pix_t.size else np.zeros_like(p)
+    cx = col_of[p] if pix_t.size else np.zeros_like(p)
+    ok &= (iy >= 0) & (iy < H) & (cx >= 0) & (cx < W)
+    if pix_t.size:
+        ok &= (t - pix_t[p]) < pixel_syncs
+    iy, cx = iy[ok], cx[ok]
+    ix = np.where(serpentine & (iy % 2 == 1), W - 1 - cx, cx)
+    dt = np.minimum(photons["dtime"][ok].astype(np.int64), bins - 1)
+    flat = (iy * W + ix) * bins + dt
+    return np.bincount(flat, minlength=H * W * bins).astype(np.uint32).reshape(H, W, bins)
+
+
+# -----------------------------------------------------------------------------
+# Acquisition
+# -----------------------------------------------------------------------------
+class FlyRasterUnsupported(RuntimeError):
+    """The TH260 helper has no time-tagged (T3) mode; use the step scan instead."""
+
+
+class FlyRaster:
+    """
+    Continuous FLIM raster at one wavelength: the piezo stage follows a
+    precomputed DAC waveform while the TH260 records time tags, and photons
+    are binned into pixels afterwards (no per-pixel acquire or settle).
+
+    mode="upload": the waveform (with its marker column) is uploaded to the
+        stage helper and played at a fixed sample rate; the stage's trigger
+        output drives the TH260 marker inputs.
+    mode="setdac": fallback for helpers without waveform support; pixels are
+        stepped with `setdac` and the TH260 helper inserts software markers
+        (`mark`), so pixel edges carry command latency (use dwell ≫ ms).
+    mode="auto": upload, switching to setdac if the stage helper rejects it.
+    """
+    def __init__(self, stage, th260, W: int, H: int, pixel_ms: float, *, mode="auto",
+                 serpentine=True, x_codes=DAC_FULL, y_codes=DAC_FULL,
+                 samples_per_pixel=4, turn_samples=8, sync_ns: float | None = None):
+        self.stage, self.th260 = stage, th260
+        self.W, self.H, self.pixel_ms = W, H, float(pixel_ms)
+        self.mode = mode
+        self.serpentine = serpentine
+        self.x_codes, self.y_codes = x_codes, y_codes
+        self.samples_per_pixel = samples_per_pixel
+        self.turn_samples = turn_samples
+        info = th260.info()
+        self.bins = int(info.get("bins") or 1024)
+        self.sync_ns = sync_ns or float(info.get("sync_ns") or 50.0)
+
+    @property
+    def rate_hz(self) -> float:
+        return self.samples_per_pixel / (self.pixel_ms / 1000.0)
+
+    @property
+    def duration_s(self) -> float:
+        n = self.H * (self.turn_samples + self.W * self.samples_per_pixel)
+        return n / self.rate_hz
+
+    def run(self, tag_path, stop: threading.Event | None = None) -> np.ndarray:
+        """Record one raster into `tag_path`; returns the (H, W, bins) histograms."""
+        stop = stop or threading.Event()
+        geometry = (self.W, self.H, self.pixel_ms, int(self.serpentine),
+                    self.turn_samples / self.rate_hz * 1000.0)
+        if self.mode in ("upload", "auto"):
+            try:
+                self.stage.wave_upload(raster_waveform(self.W, self.H, self.samples_per_pixel,
+                                                       self.x_codes, self.y_codes,
+                                                       self.serpentine, self.turn_samples))
+            except RuntimeError:
+                if self.mode == "upload": raise
+                self.mode = "setdac"          # helper without waveform commands
+        try:
+            self.th260.tt_start(tag_path, geometry)
+        except RuntimeError as e:
+            if str(e).startswith("ERR"):
+                raise FlyRasterUnsupported(f"fly raster needs a TH260 helper with time-tag mode (tt_start): {e}") from None
+            raise
+        try:
+            if self.mode == "setdac":
+                self._run_setdac(stop)
+            else:
+                self.stage.wave_run(self.rate_hz, timeout=self.duration_s + 10.0)
+        finally:
+            self.th260.tt_stop()
+        pixel_syncs = self.pixel_ms * 1e6 / self.sync_ns
+        return bin_tags(read_tags(tag_path), self.W, self.H, self.bins, pixel_syncs, self.serpentine)
+
+    def _run_setdac(self, stop):
+        xs, ys = pixel_codes(self.W, self.x_codes), pixel_codes(self.H, self.y_codes)
+        dwell = self.pixel_ms / 1000.0
+        for iy in range(self.H):
+            cols = range(self.W - 1, -1, -1) if (self.serpentine and iy % 2) else range(self.W)
+            for n, ix in enumerate(cols):
+                if stop.is_set():
+                    return
+                self.stage.setdac(int(xs[ix]), int(ys[iy]))
+                self.th260.mark(PIXEL_MARK | (LINE_MARK if n == 0 else 0))
+                deadline = time.monotonic() + dwell
+                while (left := deadline - time.monotonic()) > 0:
+                    time.sleep(min(left, 0.05))
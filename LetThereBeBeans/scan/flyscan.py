@@ -0,0 +1,137 @@
+# scan/flyscan.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+
+class FlyResult(NamedTuple):
+    wls: np.ndarray      # nm, one per record (interpolated from readbacks)
+    values: np.ndarray   # reduced scope value per record
+    t: np.ndarray        # time.monotonic() at the middle of each record
+
+
+class FlySweep:
+    """
+    Fly-scan spectrum: the scope records back to back while the grating moves.
+
+    Each record is timestamped (DataMeasurer.Measurer.record_multi) and mapped
+    to a wavelength by interpolating timestamped `position()` readbacks.
+    The grating is driven with the helper's `sweep` command when available,
+    otherwise by a chain of small `goto` steps without settling.
+    """
+    def __init__(self, mono, measurer, start_nm: float, end_nm: float, nm_per_s=5.0,
+                 records_per_fetch=20, record_pts=50000, step_nm=0.2, settle_s=0.8, poll_s=0.02):
+        self.mono = mono
+        self.measurer = measurer
+        self.start_nm, self.end_nm = float(start_nm), float(end_nm)
+        self.nm_per_s = abs(float(nm_per_s))
+        self.records_per_fetch = int(records_per_fetch)
+        self.record_pts = int(record_pts)
+        self.step_nm = abs(float(step_nm))
+        self.settle_s = settle_s
+        self.poll_s = poll_s            # readback interval during a native sweep
+
+        self._pos_t: list[float] = []
+        self._pos_nm: list[float] = []
+        self._lock = threading.Lock()
+
+    # --- Readbacks
+    def _readback(self) -> float:
+        t_a = time.monotonic()
+        nm = self.mono.position()
+        t_b = time.monotonic()
+        with self._lock:
+            self._pos_t.append((t_a + t_b) / 2)
+            self._pos_nm.append(nm)
+        return nm
+
+    def wavelengths_at(self, t: np.ndarray) -> np.ndarray:
+        """Wavelength at monotonic times `t` from the readbacks so far."""
+        with self._lock:
+            tp, nm = np.array(self._pos_t), np.array(self._pos_nm)
+        if tp.size == 0:
+            return np.full(np.shape(t), np.nan)
+        return np.interp(t, tp, nm)
+
+    # --- Grating drive
+    def _start_native(self) -> bool:
+        """Start the helper's sweep; False if it has none (answers ERR)."""
+        try:
+            self.mono.sweep(self.start_nm, self.end_nm, self.nm_per_s)
+        except RuntimeError as e:
+            # Only the ERR reply means "unsupported"; a dead helper is an error
+            if not str(e).startswith("ERR"):
+                raise
+            return False
+        return True
+
+    def _drive_native(self, stop: threading.Event):
+        span = abs(self.end_nm - self.start_nm)
+        deadline = time.monotonic() + span / max(self.nm_per_s, 1e-9) * 1.5 + 5.0
+        while not stop.is_set() and time.monotonic() < deadline:
+            if abs(self._readback() - self.end_nm) <= self.step_nm / 2:
+                break
+            stop.wait(self.poll_s)
+
+    def _drive_stepped(self, stop: threading.Event):
+        direction = 1.0 if self.end_nm >= self.start_nm else -1.0
+        n = int(abs(self.end_nm - self.start_nm) / self.step_nm)
+        t0 = time.monotonic()
+        for k in range(1, n + 2):
+            if stop.is_set(): break
+            nm = self.start_nm + direction * min(k * self.step_nm, abs(self.end_nm - self.start_nm))
+            # Hold the requested sweep rate
+            wait = t0 + k * self.step_nm / max(self.nm_per_s, 1e-9) - time.monotonic()
+            if wait > 0: stop.wait(wait)
+            self.mono.goto(nm)
+            self._readback()
+
+    # --- Run
+    def run(self, stop: threading.Event | None = None,
+            on_batch: Callable[[np.ndarray, np.ndarray], None] | None = None) -> FlyResult:
+        """
+        Sweep once and return all records with their wavelengths.
+        `on_batch(wls, values)` is called from the scope thread per fetch
+        (wavelengths interpolated from the readbacks available at that time).
+        """
+        stop = stop or threading.Event()
+        if self.mono.goto(self.start_nm) is not False:
+            stop.wait(self.settle_s)
+        self._readback()
+
+        done = threading.Event()
+        vals, times, errors = [], [], []
+
+        def scope_loop():
+            try:
+                while not (done.is_set() or stop.is_set()):
+                    v, t = self.measurer.record_multi(self.records_per_fetch, self.record_pts)
+                    vals.append(v); times.append(t)
+                    if on_batch: on_batch(self.wavelengths_at(t), v)
+            except Exception as e:
+                errors.append(e)
+
+        scope = threading.Thread(target=scope_loop, name="flyscan-scope", daemon=True)
+        scope.start()
+        try:
+            if self._start_native():
+                self._drive_native(stop)
+            else:
+                # Helper has no `sweep`: step the grating without settling
+                self._drive_stepped(stop)
+        finally:
+            done.set()
+            scope.join()
+        if errors:
+            raise errors[0]
+
+        values = np.concatenate(vals) if vals else np.empty(0)
+        t = np.concatenate(times) if times else np.empty(0)
+        with self._lock:
+            t_lo, t_hi = self._pos_t[0], self._pos_t[-1]
+        keep = (t >= t_lo) & (t <= t_hi)   # only records inside the tracked sweep
+        return FlyResult(self.wavelengths_at(t[keep]), values[keep], t[keep])
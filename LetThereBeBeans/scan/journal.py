@@ -0,0 +1,158 @@
+# scan/journal.py
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+SUFFIX = ".journal"
+
+
+def step_key(ix, iy, wl) -> tuple:
+    """Identity of a completed step (wavelength rounded so JSON round trips match)."""
+    return (None if ix is None else int(ix), None if iy is None else int(iy), round(float(wl), 6))
+
+
+def read_journal(path) -> tuple[dict, list[dict], bool]:
+    """
+    (header, step records, finished). A torn last line (the process died
+    mid-write) is ignored; everything before it is intact.
+    """
+    header, steps, finished = {}, [], False
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                break
+            kind = rec.get("type")
+            if kind == "scan":
+                header = rec
+            elif kind == "step":
+                steps.append(rec)
+            elif kind == "done":
+                finished = True
+    return header, steps, finished
+
+
+def find_unfinished(folder, mode: str) -> Path | None:
+    """Newest journal of `mode` in `folder` that did not reach its end."""
+    folder = Path(folder)
+    if not folder.is_dir():
+        return None
+    for path in sorted(folder.glob("*" + SUFFIX), key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            header, _steps, finished = read_journal(path)
+        except OSError:
+            continue
+        if header.get("mode") == mode and not finished:
+            return path
+    return None
+
+
+class ScanJournal:
+    """
+    Append-only record of a scan: one JSON line with the mode and parameters,
+    one per completed step, and a final `done` line.
+
+    Every record is written through to the OS at once, so it survives the
+    app crashing or being closed. `fsync` (surviving power loss too) is
+    batched: after `sync_every` records or `sync_s` seconds, whichever
+    comes first. `on_sync()` runs just before each fsync, e.g. to flush the
+    data cube, so a journaled step never points at data still in memory.
+    A scan that is stopped or fails is closed without `done` and can be
+    resumed with `ScanJournal.resume(path)`.
+    """
+    def __init__(self, path, header: dict, steps: list[dict], sync_every=64, sync_s=2.0,
+                 on_sync: Callable[[], None] | None = None):
+        self.path = Path(path)
+        self.header = header
+        self.params: dict = header.get("params", {})
+        self.steps = steps
+        self.done = {step_key(r.get("ix"), r.get("iy"), r["wl"]) for r in steps}
+        self.sync_every, self.sync_s = sync_every, sync_s
+        self.on_sync = on_sync
+        self._f = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def create(cls, path, mode: str, params: dict, **kw) -> "ScanJournal":
+        header = {"type": "scan", "mode": mode, "started": time.strftime("%Y-%m-%d %H:%M:%S"), "params": params}
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return cls(path, header, [], **kw)
+
+    @classmethod
+    def resume(cls, path, **kw) -> "ScanJournal":
+        header, steps, finished = read_journal(path)
+        if not header:
+            raise ValueError(f"{path}: not a scan journal")
+        if finished:
+            raise ValueError(f"{path}: scan already finished")
+        _truncate_torn_tail(path)
+        journal = cls(path, header, steps, **kw)
+        journal._write({"type": "resume", "at": time.strftime("%Y-%m-%d %H:%M:%S"), "done": len(steps)})
+        journal.sync()
+        return journal
+
+    def is_done(self, ix, iy, wl) -> bool:
+        return step_key(ix, iy, wl) in self.done
+
+    # --- Writing
+    def _write(self, rec: dict):
+        self._f.write(json.dumps(rec) + "\n")
+        self._f.flush()
+
+    def record(self, ix, iy, wl, **extra):
+        """Append one completed step (extra fields, e.g. the measured value, are kept)."""
+        rec = {"type": "step", "ix": ix, "iy": iy, "wl": float(wl), **extra}
+        with self._lock:
+            self._write(rec)
+            self.steps.append(rec)
+            self.done.add(step_key(ix, iy, wl))
+            self._unsynced += 1
+            due = self._unsynced >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_s
+        if due:
+            self.sync()
+
+    def sync(self):
+        if self.on_sync:
+            self.on_sync()
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.flush()
+            os.fsync(self._f.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def finish(self):
+        """Mark the scan complete (no longer offered for resume) and close."""
+        with self._lock:
+            self._write({"type": "done", "steps": len(self.steps)})
+        self.close()
+
+    def close(self):
+        if self._f.closed:
+            return
+        self.sync()
+        with self._lock:
+            self._f.close()
+
+
+def _truncate_torn_tail(path):
+    """Drop a partial last line so appended records start on a line of their own."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
@@ -0,0 +1,169 @@
+# scan/planner.py
+from __future__ import annotations
+
+from typing import Callable, Iterator, NamedTuple, Sequence
+
+from scan import settle
+from scan.engine import ScanStep
+
+
+class MotionCostModel:
+    """
+    Predicts time spent moving between consecutive scan steps.
+    A move costs its settle time plus a per-unit travel term; no move costs nothing.
+    With `concurrent=True` stage and grating move at the same time (ScanEngine).
+    Settle times come from `stage_model`/`mono_model` (scan.settle) where
+    they have observations for a move of that size, from the fixed
+    `*_settle_s` otherwise; `learned()` uses the app's settlers' models.
+    """
+    def __init__(self, mono_settle_s=0.8, mono_s_per_nm=0.002,
+                 stage_settle_s=0.1, stage_s_per_px=0.001, concurrent=True,
+                 stage_model: settle.SettleModel | None = None, mono_model: settle.SettleModel | None = None):
+        self.mono_settle_s = mono_settle_s
+        self.mono_s_per_nm = mono_s_per_nm
+        self.stage_settle_s = stage_settle_s
+        self.stage_s_per_px = stage_s_per_px
+        self.concurrent = concurrent
+        self.stage_model, self.mono_model = stage_model, mono_model
+
+    @classmethod
+    def learned(cls, **kw) -> "MotionCostModel":
+        """Settle times measured so far by the stage and Cornerstone settlers."""
+        return cls(stage_model=settle.model_for("stage"), mono_model=settle.model_for("cornerstone"), **kw)
+
+    def mono_time(self, d_nm: float) -> float:
+        d = abs(d_nm)
+        if d == 0:
+            return 0.0
+        t = self.mono_settle_s if self.mono_model is None else self.mono_model.expected(d, self.mono_settle_s)
+        return t + self.mono_s_per_nm * d
+
+    def stage_time(self, dx: int, dy: int) -> float:
+        d = max(abs(dx), abs(dy))
+        if d == 0:
+            return 0.0
+        t = self.stage_settle_s if self.stage_model is None else self.stage_model.expected(d, self.stage_settle_s)
+        return t + self.stage_s_per_px * d
+
+    def step_time(self, prev: ScanStep | None, step: ScanStep) -> float:
+        if prev is None:
+            return max(self.stage_settle_s, self.mono_settle_s)
+        t_stage = self.stage_time(step.ix - prev.ix, step.iy - prev.iy)
+        t_mono = self.mono_time(step.wl - prev.wl)
+        return max(t_stage, t_mono) if self.concurrent else t_stage + t_mono
+
+    def motion_time(self, steps) -> float:
+        total, prev = 0.0, None
+        for st in steps:
+            total += self.step_time(prev, st)
+            prev = st
+        return total
+
+
+# -----------------------------------------------------------------------------
+# Rasters
+# -----------------------------------------------------------------------------
+def raster(W: int, H: int, serpentine=False, x0=0, y0=0) -> Iterator[tuple[int, int]]:
+    """Row-by-row pixels; with `serpentine` every other row runs right-to-left."""
+    for r, iy in enumerate(range(y0, y0 + H)):
+        xs = range(x0, x0 + W)
+        if serpentine and r % 2:
+            xs = reversed(xs)
+        for ix in xs:
+            yield ix, iy
+
+
+def tiles(W: int, H: int, tile: int, serpentine=True) -> Iterator[list[tuple[int, int]]]:
+    """Split the grid into tile×tile blocks (visited in serpentine order)."""
+    ty_n = (H + tile - 1) // tile
+    tx_n = (W + tile - 1) // tile
+    for ty in range(ty_n):
+        txs = range(tx_n)
+        if serpentine and ty % 2:
+            txs = reversed(txs)
+        for tx in txs:
+            x0, y0 = tx * tile, ty * tile
+            yield list(raster(min(tile, W - x0), min(tile, H - y0), serpentine, x0, y0))
+
+
+# -----------------------------------------------------------------------------
+# Orders (pluggable)
+# -----------------------------------------------------------------------------
+ORDERS: dict[str, Callable[[int, int, Sequence[float]], Iterator[ScanStep]]] = {}
+
+
+def register_order(name: str):
+    """Decorator: make a step generator `fn(W, H, wls)` available to the planner."""
+    def deco(fn):
+        ORDERS[name] = fn
+        return fn
+    return deco
+
+
+@register_order("pixel")
+def pixel_major(W, H, wls):
+    """Legacy order: every wavelength at each pixel, rows left-to-right."""
+    for ix, iy in raster(W, H):
+        for nm in wls:
+            yield ScanStep(ix, iy, nm)
+
+
+@register_order("pixel-serpentine")
+def pixel_major_serpentine(W, H, wls):
+    """Serpentine raster; the wavelength sweep reverses at every pixel."""
+    for k, (ix, iy) in enumerate(raster(W, H, serpentine=True)):
+        for nm in (reversed(wls) if k % 2 else wls):
+            yield ScanStep(ix, iy, nm)
+
+
+@register_order("wavelength")
+def wavelength_major(W, H, wls):
+    """One full raster per wavelength: a single grating move per image."""
+    for nm in wls:
+        for ix, iy in raster(W, H):
+            yield ScanStep(ix, iy, nm)
+
+
+@register_order("wavelength-serpentine")
+def wavelength_major_serpentine(W, H, wls):
+    """Wavelength-major with serpentine rows; alternate images run backwards."""
+    pixels = list(raster(W, H, serpentine=True))
+    for k, nm in enumerate(wls):
+        for ix, iy in (reversed(pixels) if k % 2 else pixels):
+            yield ScanStep(ix, iy, nm)
+
+
+@register_order("tiles")
+def tile_interleaved(W, H, wls, tile=16):
+    """All wavelengths per tile: bounded stage travel, few grating moves, early full spectra."""
+    for pixels in tiles(W, H, tile):
+        for k, nm in enumerate(wls):
+            for ix, iy in (reversed(pixels) if k % 2 else pixels):
+                yield ScanStep(ix, iy, nm)
+
+
+# -----------------------------------------------------------------------------
+# Planning
+# -----------------------------------------------------------------------------
+class ScanPlan(NamedTuple):
+    order: str
+    motion_s: float
+    n_steps: int
+
+    def steps(self, W, H, wls) -> Iterator[ScanStep]:
+        return ORDERS[self.order](W, H, list(wls))
+
+
+def plan(order: str, W: int, H: int, wls: Sequence[float], model: MotionCostModel | None = None) -> ScanPlan:
+    """Predict motion time of one registered order."""
+    if order not in ORDERS:
+        raise ValueError(f"unknown scan order: {order}")
+    model = model or MotionCostModel()
+    t = model.motion_time(ORDERS[order](W, H, list(wls)))
+    return ScanPlan(order, t, W * H * len(wls))
+
+
+def plan_all(W, H, wls, model: MotionCostModel | None = None) -> list[ScanPlan]:
+    """All registered orders, cheapest first."""
+    model = model or MotionCostModel()
+    return sorted((plan(name, W, H, wls, model) for name in ORDERS), key=lambda p: p.motion_s)
@@ -0,0 +1,139 @@
+# scan/program.py
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from typing import Callable, Iterable
+
+from scan import settle
+from scan.engine import ScanStep, ScanStopped
+from scan.settle import Settler
+from telemetry import TRACER, span
+
+
+class ProgramUnsupported(RuntimeError):
+    """A helper rejected the program upload; use ScanEngine (step commands) instead."""
+
+
+def segments(steps: Iterable[ScanStep]) -> list[list[ScanStep]]:
+    """Split `steps` into runs at constant wavelength."""
+    return [list(g) for _wl, g in itertools.groupby(steps, key=lambda s: s.wl)]
+
+
+class ProgramScan:
+    """
+    FLIM scan executed by the helpers themselves.
+
+    The step list is cut into runs at one wavelength; for each run the
+    grating is moved from Python, then the run is uploaded to the stage and
+    TH260 helpers as a program. The stage visits the pixels and pulses its
+    trigger output after settling; the TH260 measures one histogram per
+    trigger and streams completion events, so no command round trip sits
+    between two pixels. Same `run()` signature as ScanEngine.
+
+    Orders that change wavelength at (nearly) every step gain nothing:
+    if the average run is shorter than `min_segment`, or a helper does not
+    know the program commands, `run()` raises ProgramUnsupported before
+    anything has been measured. So it does with `target_counts`: the stage
+    program holds every pixel for the full dwell whatever the TH260 counts,
+    so count targets would not shorten anything; ScanEngine honours them.
+    """
+    def __init__(self, stage, mono, th260, *, stage_settle_s=0.1, mono_settle_s=0.8,
+                 mono_settler: Settler | None = None, target_counts: int | None = None,
+                 min_segment=8, trigger=True):
+        self.stage, self.mono, self.th260 = stage, mono, th260
+        self.stage_settle_s = stage_settle_s
+        self.mono_settler = mono_settler or settle.mono_settler(mono, mono_settle_s)
+        self.target_counts = target_counts
+        self.min_segment = min_segment
+        self.trigger = trigger
+        self._stop = threading.Event()
+        self._runs = []
+
+    # --- Control
+    def stop(self):
+        self._stop.set()
+        for run in list(self._runs):
+            run.cancel()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def close(self):
+        self.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Run
+    def run(self, steps: Iterable[ScanStep], W: int, H: int, tacq_ms: int, output_dir: str,
+            on_step: Callable[[int, ScanStep], None] | None = None,
+            post_acquire: Callable[[ScanStep, object], None] | None = None) -> int:
+        """
+        Execute `steps` and return the number completed. `on_step` and
+        `post_acquire` are called on this thread as each step's event
+        arrives.
+        """
+        if self.target_counts:
+            raise ProgramUnsupported("count targets need step commands (the stage holds each pixel for the full dwell)")
+        runs = segments(steps)
+        n = sum(len(r) for r in runs)
+        if not runs or n / len(runs) < self.min_segment:
+            raise ProgramUnsupported(f"runs of {n / max(1, len(runs)):.1f} steps per wavelength are too short")
+        completed = 0
+        last_wl = None
+        for seg_no, seg in enumerate(runs):
+            if self._stop.is_set(): raise ScanStopped()
+            wl = seg[0].wl
+            with span("goto", "cornerstone"):
+                moved = self.mono.goto(wl)
+            if moved is not False:
+                d_nm = 1000.0 if last_wl is None else abs(wl - last_wl)
+                self.mono_settler.wait(wl, distance=d_nm, stop=self._stop)
+            last_wl = wl
+            th_run, st_run = self._start(seg, W, H, tacq_ms, output_dir, first=seg_no == 0)
+            t_prev = time.perf_counter()
+            try:
+                for ev in th_run:
+                    # The helpers step on their own: a step's span is the time since the previous event
+                    TRACER.record("acquire", "th260 program", t_prev)
+                    t_prev = time.perf_counter()
+                    step = ev.step
+                    if post_acquire:
+                        post_acquire(step, ev.hist)
+                    if on_step: on_step(completed, step)
+                    completed += 1
+                st_run.cancel()             # TH260 finished (or stopped): stage may stop too
+                st_run.wait(30.0)
+            finally:
+                th_run.cancel(); st_run.cancel()
+                self._runs.clear()
+            if self._stop.is_set(): raise ScanStopped()
+            if th_run.completed < len(seg):
+                raise RuntimeError(f"program ended after {th_run.completed} of {len(seg)} steps")
+        return completed
+
+    def _start(self, seg, W, H, tacq_ms, output_dir, first):
+        """Upload one run to both helpers and start it: TH260 armed first, then the stage."""
+        try:
+            th_run = self.th260.run_program(seg, tacq_ms, output_dir, trigger=self.trigger)
+        except RuntimeError as e:
+            if first: raise ProgramUnsupported(str(e)) from e
+            raise
+        self._runs.append(th_run)
+        try:
+            # The stage holds each pixel for the full dwell
+            st_run = self.stage.run_program(seg, W, H, tacq_ms, self.stage_settle_s * 1000.0)
+        except RuntimeError as e:
+            th_run.cancel()
+            if first: raise ProgramUnsupported(str(e)) from e
+            raise
+        self._runs.append(st_run)
+        # A stage failure ends the acquisition side too
+        st_run.on_error = lambda _e: th_run.cancel()
+        return th_run, st_run
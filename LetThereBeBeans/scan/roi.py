@@ -0,0 +1,162 @@
+# scan/roi.py
+from __future__ import annotations
+
+import base64
+from typing import Iterator, NamedTuple, Sequence
+
+import numpy as np
+
+from scan.engine import ScanStep
+from scan.planner import MotionCostModel, raster
+
+
+# -----------------------------------------------------------------------------
+# Pass 1: prescan
+# -----------------------------------------------------------------------------
+def prescan_steps(W: int, H: int, wl: float) -> Iterator[ScanStep]:
+    """Serpentine raster at a single wavelength (no grating moves)."""
+    for ix, iy in raster(W, H, serpentine=True):
+        yield ScanStep(ix, iy, wl)
+
+
+# -----------------------------------------------------------------------------
+# Masks
+# -----------------------------------------------------------------------------
+def otsu_threshold(image: np.ndarray, bins=256) -> float:
+    """Threshold that best separates the image into two intensity classes (Otsu)."""
+    v = np.asarray(image, dtype=np.float64)
+    v = v[np.isfinite(v)]
+    if v.size == 0 or v.min() == v.max():
+        return float(v.max()) if v.size else 0.0
+    counts, edges = np.histogram(v, bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    w0 = np.cumsum(counts)
+    w1 = w0[-1] - w0
+    m0 = np.cumsum(counts * centers)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu0 = m0 / w0
+        mu1 = (m0[-1] - m0) / w1
+        between = w0 * w1 * (mu0 - mu1) ** 2
+    return float(edges[1:][np.nanargmax(between[:-1])])
+
+
+def dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Grow a boolean mask by `radius` pixels (square neighbourhood, like the stage metric)."""
+    m = np.asarray(mask, dtype=bool)
+    for _ in range(max(0, int(radius))):
+        p = np.pad(m, ((0, 0), (1, 1)))
+        m = p[:, :-2] | p[:, 1:-1] | p[:, 2:]
+        p = np.pad(m, ((1, 1), (0, 0)))
+        m = p[:-2] | p[1:-1] | p[2:]
+    return m
+
+
+def threshold_mask(image: np.ndarray, threshold: float | None = None, dilate_px: int = 0) -> np.ndarray:
+    """Pixels brighter than `threshold` (Otsu if None), dilated by `dilate_px`."""
+    image = np.asarray(image, dtype=np.float64)
+    if threshold is None:
+        threshold = otsu_threshold(image)
+    with np.errstate(invalid="ignore"):
+        mask = image > threshold
+    return dilate(mask, dilate_px)
+
+
+def mask_to_text(mask: np.ndarray) -> str:
+    """Compact text form of a boolean mask (bit-packed, base64), e.g. for a scan journal."""
+    return base64.b64encode(np.packbits(np.asarray(mask, dtype=bool).ravel()).tobytes()).decode("ascii")
+
+
+def mask_from_text(text: str, height: int, width: int) -> np.ndarray:
+    bits = np.unpackbits(np.frombuffer(base64.b64decode(text), dtype=np.uint8))
+    return bits[:height * width].astype(bool).reshape(height, width)
+
+
+# -----------------------------------------------------------------------------
+# Pixel order for the masked pass
+# -----------------------------------------------------------------------------
+def serpentine_pixels(mask: np.ndarray) -> list[tuple[int, int]]:
+    """Masked pixels in serpentine raster order."""
+    H, W = mask.shape
+    return [(ix, iy) for ix, iy in raster(W, H, serpentine=True) if mask[iy, ix]]
+
+
+def nearest_neighbour_pixels(mask: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Greedy tour: always move to the closest remaining masked pixel
+    (Chebyshev distance, ties broken towards short Manhattan moves).
+    """
+    iy, ix = np.nonzero(mask)
+    n = ix.size
+    if n == 0:
+        return []
+    left = np.ones(n, dtype=bool)
+    cur = 0                                   # first masked pixel in row order
+    order = [cur]
+    left[cur] = False
+    for _ in range(n - 1):
+        dx = np.abs(ix - ix[cur])
+        dy = np.abs(iy - iy[cur])
+        d = np.maximum(dx, dy) + 1e-3 * (dx + dy)
+        d[~left] = np.inf
+        cur = int(d.argmin())
+        order.append(cur)
+        left[cur] = False
+    return [(int(ix[i]), int(iy[i])) for i in order]
+
+
+PIXEL_ORDERS = {"serpentine": serpentine_pixels, "nearest": nearest_neighbour_pixels}
+
+# The greedy tour is O(n^2) and only pays off on sparse masks: above either
+# limit only the serpentine order is tried
+NEAREST_MAX_PIXELS = 4096
+NEAREST_MAX_FILL = 0.25
+
+
+def pixel_orders(mask: np.ndarray) -> dict:
+    """The PIXEL_ORDERS worth trying for `mask`."""
+    n = int(np.count_nonzero(mask))
+    if n > NEAREST_MAX_PIXELS or n > NEAREST_MAX_FILL * mask.size:
+        return {"serpentine": serpentine_pixels}
+    return PIXEL_ORDERS
+
+
+# -----------------------------------------------------------------------------
+# Pass 2 plan
+# -----------------------------------------------------------------------------
+class RoiPlan(NamedTuple):
+    """Masked-pass counterpart of planner.ScanPlan (same `steps(W, H, wls)` call)."""
+    order: str
+    motion_s: float
+    n_steps: int
+    pixels: list
+
+    def steps(self, W=None, H=None, wls=()) -> Iterator[ScanStep]:
+        pixel_major, _, _ = self.order.partition("/")
+        if pixel_major == "pixel":
+            for k, (ix, iy) in enumerate(self.pixels):
+                for nm in (reversed(wls) if k % 2 else wls):
+                    yield ScanStep(ix, iy, nm)
+        else:
+            for k, nm in enumerate(wls):
+                for ix, iy in (reversed(self.pixels) if k % 2 else self.pixels):
+                    yield ScanStep(ix, iy, nm)
+
+
+def plan_roi(mask: np.ndarray, wls: Sequence[float], model: MotionCostModel | None = None) -> RoiPlan:
+    """
+    Cheapest way through the masked pixels: each pixel order in PIXEL_ORDERS
+    (serpentine only for large or dense masks, see `pixel_orders`),
+    pixel-major or wavelength-major, priced by `model` like planner.plan_all.
+    """
+    model = model or MotionCostModel()
+    wls = list(wls)
+    mask = np.asarray(mask, dtype=bool)
+    best = None
+    for name, fn in pixel_orders(mask).items():
+        pixels = fn(mask)
+        for major in ("pixel", "wavelength"):
+            cand = RoiPlan(f"{major}/{name}", 0.0, len(pixels) * len(wls), pixels)
+            t = model.motion_time(cand.steps(wls=wls))
+            if best is None or t < best.motion_s:
+                best = cand._replace(motion_s=t)
+    return best
@@ -0,0 +1,192 @@
+# scan/settle.py
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+from telemetry import notice, span
+
+
+class SettleModel:
+    """
+    Learned settle time as a function of move distance for one device.
+
+    Observations (time until the readback first reached the target) are grouped
+    in power-of-two distance buckets. The prediction is `lead` times the median
+    of recent observations: the caller sleeps that long before polling, and
+    because it undershoots slightly the estimate keeps tracking faster moves.
+    Until a bucket has data the prediction is 0 (polling starts right away).
+    """
+    def __init__(self, history=20, lead=0.8):
+        self.lead = lead
+        self._history = history
+        self._buckets: dict[int, deque] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _bucket(distance: float) -> int:
+        d = abs(distance)
+        return -1 if d == 0 else max(0, math.ceil(math.log2(d)) + 1)
+
+    def observe(self, distance: float, settle_s: float):
+        with self._lock:
+            self._buckets.setdefault(self._bucket(distance), deque(maxlen=self._history)).append(settle_s)
+
+    def predict(self, distance: float) -> float:
+        with self._lock:
+            obs = self._buckets.get(self._bucket(distance))
+            return self.lead * sorted(obs)[len(obs) // 2] if obs else 0.0
+
+    def expected(self, distance: float, default: float) -> float:
+        """Median observed settle for moves like `distance`; `default` until there is one."""
+        with self._lock:
+            obs = self._buckets.get(self._bucket(distance))
+            return sorted(obs)[len(obs) // 2] if obs else default
+
+    def summary(self) -> dict[int, float]:
+        """Bucket upper distance → median observed settle (s)."""
+        with self._lock:
+            return {(0 if b < 0 else 2 ** (b - 1)): sorted(o)[len(o) // 2] for b, o in sorted(self._buckets.items())}
+
+
+# Models persist for the app session so learning carries over between scans.
+MODELS: dict[str, SettleModel] = {}
+
+
+def model_for(name: str) -> SettleModel:
+    if name not in MODELS:
+        MODELS[name] = SettleModel()
+    return MODELS[name]
+
+
+class Settler:
+    """
+    Closed-loop replacement for a fixed post-move sleep.
+
+    After a move, sleep the learned settle time, then poll `read()` until
+    `on_target(reading, target)` holds for `stable_n` consecutive polls whose
+    readings agree (`same`). Never waits longer than `fallback_s`, the old
+    fixed sleep; if readback fails, it falls back to sleeping `fallback_s`.
+    """
+    def __init__(self, name: str, read: Callable[[], Any], fallback_s: float,
+                 on_target: Callable[[Any, Any], bool] = lambda r, t: True,
+                 same: Callable[[Any, Any], bool] = lambda a, b: a == b,
+                 stable_n=2, poll_s=0.02, model: SettleModel | None = None):
+        self.name = name
+        self.read = read
+        self.fallback_s = fallback_s
+        self.on_target = on_target
+        self.same = same
+        self.stable_n = max(1, int(stable_n))
+        self.poll_s = poll_s
+        self.model = model or model_for(name)
+        self.polling = True
+
+    def _sleep(self, s: float, stop: threading.Event | None):
+        if s <= 0: return
+        if stop is not None: stop.wait(s)
+        else: time.sleep(s)
+
+    def wait(self, target=None, distance: float = 1.0, stop: threading.Event | None = None,
+             timeout: float | None = None) -> float:
+        """Block until settled (at most `timeout`, default `fallback_s`); returns seconds waited."""
+        if distance == 0:
+            return 0.0
+        with span("settle", self.name):
+            return self._wait(target, distance, stop, timeout)
+
+    def _wait(self, target, distance, stop, timeout) -> float:
+        t0, deadline, first = self._begin(distance, timeout)
+        polling = self.polling
+        self._sleep(first, stop)
+        if polling:
+            settled = self._tracker(target, distance, t0)
+            try:
+                while time.monotonic() < deadline and not (stop is not None and stop.is_set()):
+                    if settled(self.read()):
+                        break
+                    self._sleep(min(self.poll_s, deadline - time.monotonic()), stop)
+            except Exception as e:
+                self._readback_failed(e)
+                self._sleep(deadline - time.monotonic(), stop)
+        return time.monotonic() - t0
+
+    async def wait_async(self, target=None, distance: float = 1.0, timeout: float | None = None) -> float:
+        """`wait` for asyncio clients (`read` is a coroutine function); cancelling the task ends the wait."""
+        if distance == 0:
+            return 0.0
+        with span("settle", self.name):
+            return await self._wait_async(target, distance, timeout)
+
+    async def _wait_async(self, target, distance, timeout) -> float:
+        t0, deadline, first = self._begin(distance, timeout)
+        polling = self.polling
+        await asyncio.sleep(first)
+        if polling:
+            settled = self._tracker(target, distance, t0)
+            try:
+                while time.monotonic() < deadline:
+                    if settled(await self.read()):
+                        break
+                    await asyncio.sleep(max(0.0, min(self.poll_s, deadline - time.monotonic())))
+            except Exception as e:
+                self._readback_failed(e)
+                await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+        return time.monotonic() - t0
+
+    # --- Shared by wait and wait_async
+    def _begin(self, distance, timeout):
+        """(t0, deadline, first sleep): the learned settle time, or the whole wait without readback."""
+        t0 = time.monotonic()
+        timeout = self.fallback_s if timeout is None else timeout
+        first = min(self.model.predict(distance), timeout) if self.polling else timeout
+        return t0, t0 + timeout, first
+
+    def _tracker(self, target, distance, t0):
+        """
+        `settled(reading)`: True once `stable_n` consecutive readings agree
+        and are on target; the time of the first of them is learned.
+        """
+        prev, stable, t_hit = None, 0, None
+
+        def settled(r) -> bool:
+            nonlocal prev, stable, t_hit
+            if self.on_target(r, target) and (prev is None or self.same(prev, r)):
+                t_hit = t_hit or time.monotonic() - t0
+                stable += 1
+                if stable >= self.stable_n:
+                    self.model.observe(distance, t_hit)
+                    return True
+            else:
+                stable, t_hit = 0, None
+            prev = r
+            return False
+        return settled
+
+    def _readback_failed(self, e):
+        # Helper does not support readback (or it failed): use fixed sleeps from now on
+        self.polling = False
+        notice(self.name, f"settle readback disabled ({e}), using fixed waits")
+
+
+def mono_settler(mono, fallback_s=0.8, tol_nm=0.05, **kw) -> Settler:
+    """Cornerstone: `position()` within `tol_nm` of the target and not drifting."""
+    return Settler(
+        "cornerstone", mono.position, fallback_s,
+        on_target=lambda pos, nm: nm is None or abs(pos - nm) <= tol_nm,
+        same=lambda a, b: abs(a - b) <= tol_nm / 2,
+        **kw,
+    )
+
+
+def stage_settler(stage, fallback_s=0.1, **kw) -> Settler:
+    """KCube piezo: every axis in `status()` reports 1 (on target)."""
+    return Settler(
+        "stage", stage.status, fallback_s,
+        on_target=lambda st, _t: all(v.strip() == "1" for v in st.values()),
+        **kw,
+    )
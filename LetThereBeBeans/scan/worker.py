@@ -0,0 +1,72 @@
+# scan/worker.py
+from __future__ import annotations
+
+import queue
+import threading
+from typing import Any, Callable
+
+
+class AcquisitionWorker:
+    """
+    Runs an acquisition loop on a background thread and hands its results to
+    the UI through a bounded queue.
+
+    `target(stop, emit)` does the work; it calls `emit(item)` for every result
+    and should return soon after `stop` is set. The UI thread polls `drain()`
+    (e.g. from a Tk `after` timer). If the UI falls behind, `emit` blocks, so
+    memory stays bounded. `on_stop` runs when stop is requested, to interrupt
+    a blocking device call (e.g. abort a scope fetch).
+    """
+    def __init__(self, target: Callable[[threading.Event, Callable[[Any], None]], None],
+                 maxsize=1024, on_stop: Callable[[], None] | None = None, name="acquisition"):
+        self.target = target
+        self.on_stop = on_stop
+        self.results: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.stop_event = threading.Event()
+        self.error: BaseException | None = None
+        self._t = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._t.start()
+        return self
+
+    def _run(self):
+        try:
+            self.target(self.stop_event, self.emit)
+        except BaseException as e:
+            if not self.stop_event.is_set():
+                self.error = e
+
+    def emit(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def drain(self, max_items=10000) -> list:
+        """Everything queued so far (non-blocking; call from the UI thread)."""
+        items = []
+        try:
+            while len(items) < max_items:
+                items.append(self.results.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+
+    def stop(self):
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        if self.on_stop:
+            try:
+                self.on_stop()
+            except Exception:
+                pass
+
+    def is_alive(self) -> bool:
+        return self._t.is_alive()
+
+    def join(self, timeout=None):
+        self._t.join(timeout)
@@ -0,0 +1,198 @@
+# sim/common.py
+"""
+Shared parts of the Python stand-in helpers: the command loop, latency
+and settle models, and fault injection.
+
+Every simulator takes the same options, as `--name value` arguments or
+`SIM_NAME` environment variables (arguments win). The app starts helpers
+with no arguments, so set the environment to shape a simulated session:
+
+    latency_ms    mean time to process a command (0.2)
+    jitter_ms     standard deviation around it (0.05)
+    err_rate      probability that a command fails with `ERR injected` (0)
+    drop_rate     probability that a command is never answered (0)
+    slow_rate     probability of an extra `slow_ms` delay (0)
+    slow_ms       that delay (500)
+    crash_after   exit without a reply on this command number (0: never)
+    fault_cmds    comma list of commands faults apply to (all)
+    seed          random seed (none)
+
+Helpers add their own options (settle and slew models, count rates).
+"""
+from __future__ import annotations
+
+import os
+import queue
+import shlex
+import sys
+import threading
+import time
+
+import numpy as np
+
+COMMON = {
+    "latency_ms": 0.2, "jitter_ms": 0.05,
+    "err_rate": 0.0, "drop_rate": 0.0, "slow_rate": 0.0, "slow_ms": 500.0,
+    "crash_after": 0, "fault_cmds": "", "seed": None,
+}
+
+_out = threading.Lock()
+
+
+def println(s):
+    # Events and progress lines come from other threads
+    with _out:
+        sys.stdout.write(s + "\n")
+        sys.stdout.flush()
+
+
+def options(defaults: dict, argv=None) -> dict:
+    """COMMON plus `defaults`, overridden by SIM_* variables, then by `--name value` arguments."""
+    opts = {**COMMON, **defaults}
+    given = {k: os.environ[f"SIM_{k.upper()}"] for k in opts if f"SIM_{k.upper()}" in os.environ}
+    args = list(sys.argv[1:] if argv is None else argv)
+    for i, a in enumerate(args[:-1]):
+        if a.startswith("--") and a[2:].replace("-", "_") in opts:
+            given[a[2:].replace("-", "_")] = args[i + 1]
+    for k, v in given.items():
+        d = opts[k]
+        opts[k] = v if isinstance(d, str) else int(v) if isinstance(d, int) and not isinstance(d, bool) else float(v)
+    if opts["seed"] is not None:
+        opts["seed"] = int(float(opts["seed"]))
+    return opts
+
+
+class Latency:
+    """Normal-distributed delay (never negative), in seconds."""
+    def __init__(self, mean_ms, jitter_ms, rng):
+        self.mean, self.jitter, self.rng = mean_ms / 1000.0, jitter_ms / 1000.0, rng
+
+    def sample(self) -> float:
+        if self.jitter <= 0:
+            return self.mean
+        return max(0.0, self.rng.normal(self.mean, self.jitter))
+
+    def sleep(self):
+        s = self.sample()
+        if s > 0:
+            time.sleep(s)
+
+
+class Faults:
+    """Decides per command whether to fail it, drop it, slow it down or crash."""
+    def __init__(self, opts, rng):
+        self.opts, self.rng = opts, rng
+        self.only = {c.strip().lower() for c in opts["fault_cmds"].split(",") if c.strip()}
+        self.n = 0
+
+    def draw(self, cmd) -> str | None:
+        """None, "err", "drop", "slow" or "crash"."""
+        self.n += 1
+        o = self.opts
+        if o["crash_after"] and self.n >= o["crash_after"]:
+            return "crash"
+        if self.only and cmd not in self.only:
+            return None
+        u = self.rng.random()
+        if u < o["err_rate"]:
+            return "err"
+        u -= o["err_rate"]
+        if u < o["drop_rate"]:
+            return "drop"
+        u -= o["drop_rate"]
+        if u < o["slow_rate"]:
+            return "slow"
+        return None
+
+
+class Motion:
+    """
+    One axis moving to a new target: the readback relaxes exponentially from
+    the old position, with a damped ring, and is on target once `settle_s`
+    has passed (the readback is exact from then on).
+    """
+    def __init__(self, position=0.0):
+        self.start = self.target = float(position)
+        self.t0 = 0.0
+        self.settle_s = 0.0
+
+    def move(self, target, settle_s, now=None):
+        now = time.monotonic() if now is None else now
+        self.start = self.position(now)
+        self.target, self.t0, self.settle_s = float(target), now, settle_s
+
+    def on_target(self, now=None) -> bool:
+        return (time.monotonic() if now is None else now) - self.t0 >= self.settle_s
+
+    def position(self, now=None) -> float:
+        now = time.monotonic() if now is None else now
+        dt = now - self.t0
+        if dt >= self.settle_s or self.settle_s <= 0:
+            return self.target
+        tau = self.settle_s / 4.0
+        env = np.exp(-dt / tau)
+        return self.target + (self.start - self.target) * env * np.cos(2.5 * np.pi * dt / self.settle_s)
+
+
+def ok(fn):
+    """Handler that calls `fn(*args)` and replies a plain OK."""
+    def handler(*args):
+        fn(*args)
+        return "OK"
+    return handler
+
+
+def serve(commands: dict, opts: dict, on_stop=None, greeting="OK ready"):
+    """
+    Run a helper: print the greeting, then answer stdin line by line.
+
+    `commands` maps a command name to `fn(*args) -> reply`; a reply of None
+    sends nothing. A handler exception becomes `ERR <message>`. `stop` is
+    out of band: it calls `on_stop()` at once from the reader thread,
+    even while a long command is running, and gets no reply. Latency and
+    faults from `opts` apply to every other command except `exit`.
+    """
+    rng = np.random.default_rng(opts["seed"])
+    latency = Latency(opts["latency_ms"], opts["jitter_ms"], rng)
+    faults = Faults(opts, rng)
+    q = queue.Queue()
+
+    def read():
+        for raw in sys.stdin:
+            if raw.strip().lower() == "stop":
+                if on_stop: on_stop()
+            else:
+                q.put(raw)
+        q.put(None)
+
+    threading.Thread(target=read, daemon=True).start()
+    println(greeting)
+    for raw in iter(q.get, None):
+        line = raw.strip()
+        if not line:
+            println("OK"); continue
+        parts = shlex.split(line, posix=False)
+        cmd, args = parts[0].lower(), parts[1:]
+        if cmd == "exit":
+            println("OK bye")
+            break
+        fault = faults.draw(cmd)
+        if fault == "crash":
+            sys.stdout.flush()
+            os._exit(3)
+        latency.sleep()
+        if fault == "slow":
+            time.sleep(opts["slow_ms"] / 1000.0)
+        elif fault == "err":
+            println("ERR injected"); continue
+        elif fault == "drop":
+            continue
+        fn = commands.get(cmd)
+        if fn is None:
+            println("ERR unknown_cmd"); continue
+        try:
+            reply = fn(*args)
+        except Exception as e:
+            reply = f"ERR {e}"
+        if reply is not None:
+            println(reply)
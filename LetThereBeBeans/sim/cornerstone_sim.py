@@ -0,0 +1,86 @@
+# sim/cornerstone_sim.py
+"""
+Python stand-in for cornerstone_helper.exe (same line protocol).
+
+    python sim/cornerstone_sim.py [--slew_nm_s 200 --settle_ms 40 ...]
+
+Supports open, goto, position, sweep, open_shutter, close_shutter and
+exit. `goto` is answered at once; the grating then slews at `slew_nm_s`
+and rings down for `settle_ms`, which `position` readbacks show, so
+closed-loop settling behaves as on the instrument. `sweep` moves at the
+requested rate until it reaches the end (`stop` halts it where it is).
+Latency and faults: see sim/common.py.
+"""
+import threading
+import time
+
+from common import Motion, ok, options, serve
+
+DEFAULTS = {"slew_nm_s": 200.0, "settle_ms": 40.0, "min_nm": 180.0, "max_nm": 2500.0}
+
+
+class CornerstoneSim:
+    def __init__(self, slew_nm_s=200.0, settle_ms=40.0, min_nm=180.0, max_nm=2500.0, nm=500.0):
+        self.slew, self.settle_s = slew_nm_s, settle_ms / 1000.0
+        self.min_nm, self.max_nm = min_nm, max_nm
+        self.motion = Motion(nm)
+        self.sweep_from = None          # (start_nm, end_nm, nm_per_s, t0) while sweeping
+        self.opened = False
+        self.shutter = False
+        self._lock = threading.Lock()
+
+    def _check(self, nm):
+        if not self.opened:
+            raise RuntimeError("not_open")
+        if not self.min_nm <= nm <= self.max_nm:
+            raise RuntimeError("out_of_range")
+
+    def goto(self, nm):
+        self._check(nm)
+        with self._lock:
+            now = time.monotonic()
+            if self.sweep_from is not None:
+                self.motion, self.sweep_from = Motion(self._position(now)), None
+            start = self.motion.position(now)
+            self.motion.move(nm, abs(nm - start) / self.slew + self.settle_s, now)
+
+    def sweep(self, start_nm, end_nm, nm_per_s):
+        self._check(start_nm); self._check(end_nm)
+        with self._lock:
+            self.sweep_from = (start_nm, end_nm, abs(nm_per_s), time.monotonic())
+
+    def stop(self):
+        with self._lock:
+            if self.sweep_from is not None:
+                nm = self._position(time.monotonic())
+                self.sweep_from = None
+                self.motion = Motion(nm)
+
+    def _position(self, now):
+        if self.sweep_from is not None:
+            a, b, rate, t0 = self.sweep_from
+            d = min(abs(b - a), rate * (now - t0))
+            return a + d if b >= a else a - d
+        return self.motion.position(now)
+
+    def position(self):
+        with self._lock:
+            return self._position(time.monotonic())
+
+
+def main():
+    opts = options(DEFAULTS)
+    sim = CornerstoneSim(opts["slew_nm_s"], opts["settle_ms"], opts["min_nm"], opts["max_nm"])
+    commands = {
+        "open":          ok(lambda *_: setattr(sim, "opened", True)),
+        "goto":          ok(lambda nm: sim.goto(float(nm))),
+        "position":      lambda: f"OK POS={sim.position():.3f}",
+        "sweep":         ok(lambda a, b, rate: sim.sweep(float(a), float(b), float(rate))),
+        "open_shutter":  ok(lambda: setattr(sim, "shutter", True)),
+        "close_shutter": ok(lambda: setattr(sim, "shutter", False)),
+    }
+    serve(commands, opts, on_stop=sim.stop)
+
+
+if __name__ == "__main__":
+    main()
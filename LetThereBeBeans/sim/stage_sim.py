@@ -0,0 +1,121 @@
+# sim/stage_sim.py
+"""
+Python stand-in for stage_helper.exe (same line protocol).
+
+    python sim/stage_sim.py [--settle_ms 2 --settle_ms_per_kcode 1 ...]
+
+Supports open, move_ix, stage_reset, setdac, status, disable, the waveform
+commands wave_clear/wave_add/wave_run, scan programs
+(prog_clear/prog_add/prog_run, streaming EV lines; `stop` ends one early)
+and exit. Positions are DAC codes (0..32767 over the fixed Vmax). A move
+is answered at once; each axis then settles in `settle_ms` plus
+`settle_ms_per_kcode` per 1000 codes travelled, and `status` reports 0
+for an axis until it is on target. Latency and faults: see sim/common.py.
+"""
+import base64
+import threading
+import time
+
+import numpy as np
+
+from common import Motion, ok, options, println, serve
+
+DAC_MAX = 32767
+STEP_DTYPE = np.dtype([("ix", "<i4"), ("iy", "<i4"), ("wl", "<f8")])
+
+DEFAULTS = {"settle_ms": 2.0, "settle_ms_per_kcode": 1.0}
+
+
+class StageSim:
+    def __init__(self, settle_ms=0.0, settle_ms_per_kcode=0.0):
+        self.settle_ms, self.settle_ms_per_kcode = settle_ms, settle_ms_per_kcode
+        self.ax, self.ay = Motion(), Motion()
+        self.enabled = False
+        self.wave = []
+        self.program = []
+        self.prog_thread = None
+        self.stop = threading.Event()
+
+    @property
+    def x(self):
+        return int(round(self.ax.target))
+
+    @property
+    def y(self):
+        return int(round(self.ay.target))
+
+    def setdac(self, x, y):
+        now = time.monotonic()
+        for axis, code in ((self.ax, x), (self.ay, y)):
+            d = abs(code - axis.target)
+            axis.move(code, 0.0 if d == 0 else (self.settle_ms + self.settle_ms_per_kcode * d / 1000.0) / 1000.0, now)
+
+    def enable(self, on):
+        self.enabled = on
+
+    def on_target(self, axis) -> int:
+        return int(self.enabled and axis.on_target())
+
+    def move_ix(self, ix, iy, width, height):
+        self.setdac(round((ix + 0.5) * DAC_MAX / max(1, width)), round((iy + 0.5) * DAC_MAX / max(1, height)))
+
+    def wave_add(self, b64):
+        self.wave.append(np.frombuffer(base64.b64decode(b64), dtype="<i2").reshape(-1, 3))
+
+    def prog_add(self, b64):
+        self.program.append(np.frombuffer(base64.b64decode(b64), dtype=STEP_DTYPE))
+
+    def wave_run(self, rate_hz):
+        """Play the waveform in real time (marker bits would go to the trigger output)."""
+        if not self.wave:
+            raise RuntimeError("no_waveform")
+        w = np.concatenate(self.wave)
+        time.sleep(len(w) / rate_hz)
+        self.ax, self.ay = Motion(int(w[-1, 0])), Motion(int(w[-1, 1]))
+        return len(w)
+
+    def prog_run(self, width, height, dwell_ms, settle_ms):
+        if self.prog_thread is not None and self.prog_thread.is_alive():
+            raise RuntimeError("program_running")
+        steps = np.concatenate(self.program) if self.program else np.zeros(0, STEP_DTYPE)
+        self.stop.clear()
+        self.prog_thread = threading.Thread(target=self._run_program,
+                                            args=(steps, width, height, dwell_ms, settle_ms), daemon=True)
+        self.prog_thread.start()
+        return steps.size
+
+    def _run_program(self, steps, width, height, dwell_ms, settle_ms):
+        done = 0
+        for i, (ix, iy, _wl) in enumerate(steps.tolist()):
+            if self.stop.is_set():
+                break
+            self.move_ix(ix, iy, width, height)
+            time.sleep(settle_ms / 1000.0)
+            println(f"EV STEP {i}")         # trigger output pulse
+            self.stop.wait(dwell_ms / 1000.0)
+            done += 1
+        println(f"EV DONE N={done}")
+
+
+def main():
+    opts = options(DEFAULTS)
+    sim = StageSim(opts["settle_ms"], opts["settle_ms_per_kcode"])
+    commands = {
+        "open":        ok(lambda *_serials: sim.enable(True)),
+        "move_ix":     ok(lambda ix, iy, w, h, *_: sim.move_ix(int(ix), int(iy), int(w), int(h))),
+        "stage_reset": ok(lambda ix, w, *_: sim.move_ix(int(ix), 0, int(w), 1)),
+        "setdac":      ok(lambda x, y, *_: sim.setdac(int(x), int(y))),
+        "status":      lambda *_: f"OK X={sim.on_target(sim.ax)} Y={sim.on_target(sim.ay)}",
+        "wave_clear":  ok(lambda: sim.wave.clear()),
+        "wave_add":    ok(sim.wave_add),
+        "wave_run":    lambda rate: f"OK N={sim.wave_run(float(rate))}",
+        "prog_clear":  ok(lambda: sim.program.clear()),
+        "prog_add":    ok(sim.prog_add),
+        "prog_run":    lambda w, h, dwell, settle: f"OK N={sim.prog_run(int(w), int(h), float(dwell), float(settle))}",
+        "disable":     ok(lambda: sim.enable(False)),
+    }
+    serve(commands, opts, on_stop=sim.stop.set)
+
+
+if __name__ == "__main__":
+    main()
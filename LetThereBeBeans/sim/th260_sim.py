@@ -0,0 +1,259 @@
+# sim/th260_sim.py
+"""
+Python stand-in for th260_helper.exe (same line protocol).
+
+    python sim/th260_sim.py [--rate_cps 2000 --readout_ms 0.5 ...]
+
+Histograms are synthetic mono-exponential decays with Poisson noise;
+`rate_cps` scales the count rate and `readout_ms` is the transfer time
+after each exposure. Latency and faults: see sim/common.py.
+Supports init, measure (text file per call), info, shm_open/measure_shm
+(histogram written into the client's shared-memory ring),
+measure_part/measure_shm_part (PART progress lines, ended early by a
+`stop` line; every measurement reports `PART ... END=1` when its exposure
+is over), time-tagged mode (tt_start/mark/tt_stop: T3 records with
+line/pixel markers synthesized from the raster geometry hint, or taken
+from `mark` commands) and exit.
+"""
+import base64
+import os
+import threading
+import time
+
+import numpy as np
+from multiprocessing import shared_memory
+
+from common import ok, options, println, serve
+
+RES_PS = 25.0
+CHANNELS = 1
+BINS = 1024
+SYNC_NS = 50.0
+
+TAG_DTYPE = np.dtype([("nsync", "<u8"), ("dtime", "<u2"), ("channel", "u1"), ("special", "u1")])
+STEP_DTYPE = np.dtype([("ix", "<i4"), ("iy", "<i4"), ("wl", "<f8")])
+LINE_MARK, PIXEL_MARK = 1, 2
+
+DEFAULTS = {"rate_cps": 2000.0, "readout_ms": 0.5}
+
+
+def attach_shm(name):
+    """Attach to the client's segment without letting this process unlink it on exit."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class TH260Sim:
+    def __init__(self, seed=None, rate_cps=2000.0, readout_ms=0.0):
+        self.rng = np.random.default_rng(seed)
+        self.rate_cps, self.readout_s = rate_cps, readout_ms / 1000.0
+        self.t = np.arange(BINS) * RES_PS / 1000.0   # ns
+        self.shm = None
+        self.ring = None
+        self.stop = threading.Event()
+        self.tt = None
+        self.program = []
+        self.prog_thread = None
+
+    def decay(self, ix, iy, wl, tacq_ms, channels=CHANNELS):
+        """Expected counts: IRF-broadened exponential, lifetime/brightness vary over the field."""
+        tau = 1.5 + 1.0 * np.sin(ix / 7.0) ** 2 + 0.002 * (wl - 600.0)        # ns
+        rate = self.rate_cps * (1.0 + 0.5 * np.cos(iy / 5.0))                   # counts/s
+        t0 = 2.0
+        shape = np.exp(-np.clip(self.t - t0, 0, None) / max(tau, 0.1)) * (self.t >= t0)
+        shape += 0.002                                                           # background
+        shape /= shape.sum()
+        lam = rate * tacq_ms / 1000.0 * shape
+        return self.rng.poisson(lam, size=(channels, BINS)).astype(np.uint32)
+
+    def expose(self, tacq_ms):
+        """Exposure, its END=1 report (the light path is free), then the readout."""
+        time.sleep(tacq_ms / 1000.0)
+        println(f"PART T={tacq_ms} END=1")
+        time.sleep(self.readout_s)
+
+    def measure(self, out_dir, ix, iy, wl, tacq_ms, hist=None):
+        if hist is None:
+            self.expose(tacq_ms)
+            hist = self.decay(ix, iy, wl, tacq_ms)
+        h = hist[0] if hist.ndim > 1 else hist
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"hist_x{ix}_y{iy}_{wl:.3f}nm.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# th260 sim  res={RES_PS}ps\n")
+            f.write("\n".join(map(str, h.tolist())))
+            f.write("\n")
+
+    def shm_open(self, name, slots, channels, bins):
+        if self.shm is not None:
+            self.shm.close()
+        self.shm = attach_shm(name)
+        self.ring = np.ndarray((slots, channels, bins), dtype=np.uint32, buffer=self.shm.buf)
+
+    def measure_shm(self, slot, ix, iy, wl, tacq_ms):
+        self.expose(tacq_ms)
+        h = self.decay(ix, iy, wl, tacq_ms, self.ring.shape[1])
+        self.ring[slot, :, :] = h[:, :self.ring.shape[2]]
+
+    # --- Time-tagged mode
+    def tt_start(self, path, geometry):
+        self.tt = {"path": path, "t0": time.monotonic(), "marks": [], "geometry": geometry}
+
+    def mark(self, bits):
+        if self.tt is not None:
+            self.tt["marks"].append((time.monotonic() - self.tt["t0"], bits))
+
+    def tt_stop(self):
+        """Write the recording: markers plus photons of every pixel the raster visited."""
+        tt, self.tt = self.tt, None
+        if tt is None:
+            raise RuntimeError("not_recording")
+        elapsed = time.monotonic() - tt["t0"]
+        sync_per_s = 1e9 / SYNC_NS
+        if tt["geometry"]:
+            W, H, pixel_ms, serp, turn_ms = tt["geometry"]
+            W, H, serp = int(W), int(H), bool(serp)
+        else:
+            W = H = 1; pixel_ms, serp, turn_ms = elapsed * 1000.0, False, 0.0
+        if tt["marks"]:
+            t = np.array([m[0] for m in tt["marks"]])
+            bits = np.array([m[1] for m in tt["marks"]], dtype=np.uint8)
+        else:
+            # Stage trigger output as the waveform would produce it
+            line_s = (turn_ms + W * pixel_ms) / 1000.0
+            iy, c = np.divmod(np.arange(W * H), W)
+            t = iy * line_s + turn_ms / 1000.0 + c * pixel_ms / 1000.0
+            bits = np.where(c == 0, LINE_MARK | PIXEL_MARK, PIXEL_MARK).astype(np.uint8)
+            keep = t < elapsed
+            t, bits = t[keep], bits[keep]
+        # Pixel of every pixel marker, as the raster visits them
+        line = np.cumsum((bits & LINE_MARK) != 0) - 1
+        col = np.arange(t.size) - np.flatnonzero((bits & LINE_MARK) != 0)[np.maximum(line, 0)]
+        ix = np.where(serp & (line % 2 == 1), W - 1 - col, col)
+        photons = []
+        for k in range(t.size):
+            h = self.decay(int(ix[k]), int(line[k]), 600.0, pixel_ms)[0]
+            n = int(h.sum())
+            if n == 0:
+                continue
+            rec = np.zeros(n, dtype=TAG_DTYPE)
+            rec["dtime"] = np.repeat(np.arange(BINS), h)
+            rec["nsync"] = ((t[k] + self.rng.uniform(0, pixel_ms / 1000.0, n)) * sync_per_s).astype(np.uint64)
+            photons.append(rec)
+        marks = np.zeros(t.size, dtype=TAG_DTYPE)
+        marks["nsync"] = (t * sync_per_s).astype(np.uint64)
+        marks["channel"] = bits
+        marks["special"] = 1
+        tags = np.concatenate([marks, *photons])
+        tags = tags[np.argsort(tags["nsync"], kind="stable")]
+        tags.tofile(tt["path"])
+        return tags.size
+
+    def measure_part(self, ix, iy, wl, tmax_ms, part_ms, channels=CHANNELS):
+        """Integrate in part_ms chunks, reporting running totals, until tmax or `stop`."""
+        self.stop.clear()
+        total = np.zeros((channels, BINS), dtype=np.uint32)
+        t_ms = 0
+        part_ms = max(1, part_ms)
+        while t_ms < tmax_ms and not self.stop.is_set():
+            dt = min(part_ms, tmax_ms - t_ms)
+            time.sleep(dt / 1000.0)
+            total += self.decay(ix, iy, wl, dt, channels)
+            t_ms += dt
+            println(f"PART T={t_ms} N={int(total.sum())}")
+        println(f"PART T={t_ms} N={int(total.sum())} END=1")
+        time.sleep(self.readout_s)
+        return total, t_ms
+
+
+    # --- Scan programs
+    def prog_add(self, b64):
+        self.program.append(np.frombuffer(base64.b64decode(b64), dtype=STEP_DTYPE))
+
+    def prog_run(self, out_dir, tacq_ms, target):
+        if self.prog_thread is not None and self.prog_thread.is_alive():
+            raise RuntimeError("program_running")
+        steps = np.concatenate(self.program) if self.program else np.zeros(0, STEP_DTYPE)
+        self.stop.clear()
+        self.prog_thread = threading.Thread(target=self._run_program, args=(steps, out_dir, tacq_ms, target), daemon=True)
+        self.prog_thread.start()
+        return steps.size
+
+    def _run_program(self, steps, out_dir, tacq_ms, target):
+        done = 0
+        try:
+            for i, (ix, iy, wl) in enumerate(steps.tolist()):
+                if self.stop.is_set():
+                    break
+                channels = self.ring.shape[1] if out_dir == "-" else CHANNELS
+                t_ms, total = 0, np.zeros((channels, BINS), dtype=np.uint32)
+                while t_ms < tacq_ms:
+                    dt = min(10, tacq_ms - t_ms)
+                    time.sleep(dt / 1000.0)
+                    total += self.decay(ix, iy, wl, dt, channels)
+                    t_ms += dt
+                    if target and total.sum() >= target:
+                        break
+                if out_dir == "-":
+                    slot = i % self.ring.shape[0]
+                    self.ring[slot, :, :] = total[:, :self.ring.shape[2]]
+                    println(f"EV STEP {i} T={t_ms} N={int(total.sum())} SLOT={slot}")
+                else:
+                    self.measure(out_dir, ix, iy, wl, t_ms, hist=total)
+                    println(f"EV STEP {i} T={t_ms} N={int(total.sum())}")
+                done += 1
+            println(f"EV DONE N={done}")
+        except Exception as e:
+            println(f"EV ERR {e}")
+
+
+def main():
+    opts = options(DEFAULTS)
+    sim = TH260Sim(opts["seed"], opts["rate_cps"], opts["readout_ms"])
+
+    def measure_part(out, ix, iy, wl, tmax, part):
+        h, t = sim.measure_part(int(ix), int(iy), float(wl), int(tmax), int(part))
+        sim.measure(out, int(ix), int(iy), float(wl), t, hist=h)
+        return f"OK T={t} N={int(h.sum())}"
+
+    def measure_shm_part(slot, ix, iy, wl, tmax, part):
+        slot = int(slot)
+        h, t = sim.measure_part(int(ix), int(iy), float(wl), int(tmax), int(part), sim.ring.shape[1])
+        sim.ring[slot, :, :] = h[:, :sim.ring.shape[2]]
+        return f"OK T={t} N={int(h.sum())} SLOT={slot}"
+
+    def measure_shm(slot, ix, iy, wl, tacq):
+        sim.measure_shm(int(slot), int(ix), int(iy), float(wl), int(tacq))
+        return f"OK SLOT={int(slot)}"
+
+    commands = {
+        "init":             ok(lambda out, *_: os.makedirs(out, exist_ok=True)),
+        "measure":          ok(lambda out, ix, iy, wl, tacq: sim.measure(out, int(ix), int(iy), float(wl), int(tacq))),
+        "info":             lambda *_: f"OK RES={RES_PS} CH={CHANNELS} LEN={BINS} SYNC={SYNC_NS}",
+        "shm_open":         ok(lambda name, slots, ch, bins: sim.shm_open(name, int(slots), int(ch), int(bins))),
+        "measure_shm":      measure_shm,
+        "measure_part":     measure_part,
+        "measure_shm_part": measure_shm_part,
+        "tt_start":         ok(lambda path, *geo: sim.tt_start(path, [float(a) for a in geo[:5]] if len(geo) >= 5 else None)),
+        "mark":             ok(lambda bits: sim.mark(int(bits))),
+        "tt_stop":          lambda: f"OK N={sim.tt_stop()}",
+        "prog_clear":       ok(lambda: sim.program.clear()),
+        "prog_add":         ok(sim.prog_add),
+        "prog_run":         lambda out, tacq, target, *_: f"OK N={sim.prog_run(out, int(tacq), int(target))}",
+    }
+    serve(commands, opts, on_stop=sim.stop.set)
+    if sim.shm is not None:
+        sim.ring = None
+        sim.shm.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# storage/datacube.py
+from __future__ import annotations
+
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+HEADER = "header.json"
+DATA = "hist.bin"
+FILLED = "filled.npy"
+DWELL = "dwell.npy"
+
+
+class FlimCube:
+    """
+    FLIM datacube of shape (H, W, λ, bins) backed by memory-mapped files.
+
+    Directory layout:
+        header.json   shape, dtype, tile size, wavelengths
+        hist.bin      raw counts, tile-chunked: (H/t, W/t, t, t, λ, bins)
+        filled.npy    uint8 (H, W, λ): 1 where a histogram was written
+        dwell.npy     float32 (H, W, λ): integration time (ms) per histogram
+
+    Tiles keep neighbouring pixels together on disk; any (pixel, λ)
+    histogram is a fixed-offset view (O(1)), and so is a pixel's spectrum.
+    """
+    def __init__(self, path, header, mode="r+"):
+        self.path = Path(path)
+        self.header = header
+        self.H, self.W = header["height"], header["width"]
+        self.wls = np.asarray(header["wavelengths"], dtype=float)
+        self.L, self.bins, self.tile = len(self.wls), header["bins"], header["tile"]
+        self.dtype = np.dtype(header["dtype"])
+        ty, tx = -(-self.H // self.tile), -(-self.W // self.tile)
+        self._data = np.memmap(self.path / DATA, dtype=self.dtype, mode=mode,
+                               shape=(ty, tx, self.tile, self.tile, self.L, self.bins))
+        self.filled = np.lib.format.open_memmap(self.path / FILLED, mode=mode)
+        # Cubes from before dwell recording have none: every pixel got tacq_ms
+        dwell = self.path / DWELL
+        self.dwell = np.lib.format.open_memmap(dwell, mode=mode) if dwell.exists() else None
+
+    # --- Create / open
+    @classmethod
+    def create(cls, path, height: int, width: int, wavelengths, bins: int,
+               tile=16, dtype="uint32", **meta) -> "FlimCube":
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=False)
+        header = {
+            "format": "ltb-flimcube", "version": 1,
+            "height": int(height), "width": int(width),
+            "wavelengths": [float(w) for w in wavelengths],
+            "bins": int(bins), "tile": int(tile), "dtype": np.dtype(dtype).name,
+            "layout": "tiles(ty,tx,t,t,wl,bins)",
+            **meta,
+        }
+        (path / HEADER).write_text(json.dumps(header, indent=2))
+        ty, tx = -(-height // tile), -(-width // tile)
+        nbytes = ty * tx * tile * tile * len(header["wavelengths"]) * bins * np.dtype(dtype).itemsize
+        with open(path / DATA, "wb") as f:
+            f.truncate(nbytes)   # zero-filled; pages are only touched when written
+        np.lib.format.open_memmap(path / FILLED, mode="w+", dtype=np.uint8,
+                                  shape=(height, width, len(header["wavelengths"]))).flush()
+        dwell = np.lib.format.open_memmap(path / DWELL, mode="w+", dtype=np.float32,
+                                          shape=(height, width, len(header["wavelengths"])))
+        dwell[:] = meta.get("tacq_ms", np.nan)
+        dwell.flush()
+        return cls(path, header)
+
+    @classmethod
+    def open(cls, path, mode="r+") -> "FlimCube":
+        header = json.loads((Path(path) / HEADER).read_text())
+        return cls(path, header, mode)
+
+    # --- Indexing
+    def wl_index(self, nm: float) -> int:
+        return int(np.abs(self.wls - nm).argmin())
+
+    def _loc(self, iy, ix):
+        t = self.tile
+        return iy // t, ix // t, iy % t, ix % t
+
+    def write(self, iy: int, ix: int, k: int, hist, dwell_ms: float | None = None):
+        h = np.asarray(hist)
+        n = min(h.size, self.bins)
+        dst = self._data[self._loc(iy, ix)][k]
+        dst[:n] = h[:n]
+        dst[n:] = 0
+        self.filled[iy, ix, k] = 1
+        if dwell_ms is not None and self.dwell is not None:
+            self.dwell[iy, ix, k] = dwell_ms
+
+    def write_plane(self, k: int, hists, dwell_ms: float | None = None):
+        """Store a whole (H, W, bins) wavelength plane at once (e.g. a fly raster)."""
+        h = np.asarray(hists)
+        n = min(h.shape[-1], self.bins)
+        ty, tx, t = self._data.shape[0], self._data.shape[1], self.tile
+        full = np.zeros((ty * t, tx * t, self.bins), dtype=self.dtype)
+        full[:self.H, :self.W, :n] = h[:self.H, :self.W, :n]
+        self._data[:, :, :, :, k, :] = full.reshape(ty, t, tx, t, self.bins).transpose(0, 2, 1, 3, 4)
+        self.filled[:, :, k] = 1
+        if dwell_ms is not None and self.dwell is not None:
+            self.dwell[:, :, k] = dwell_ms
+
+    def histogram(self, iy: int, ix: int, k: int) -> np.ndarray:
+        return self._data[self._loc(iy, ix)][k]
+
+    def pixel(self, iy: int, ix: int) -> np.ndarray:
+        """(λ, bins) view of one pixel."""
+        return self._data[self._loc(iy, ix)]
+
+    def plane(self, k: int) -> np.ndarray:
+        """(H, W, bins) copy of one wavelength."""
+        ty, tx, t = self._data.shape[0], self._data.shape[1], self.tile
+        p = self._data[:, :, :, :, k, :].transpose(0, 2, 1, 3, 4).reshape(ty * t, tx * t, self.bins)
+        return np.ascontiguousarray(p[:self.H, :self.W])
+
+    def intensity(self, k: int | None = None) -> np.ndarray:
+        """Photon counts per pixel: (H, W) for one wavelength, else (H, W, λ)."""
+        ty, tx, t = self._data.shape[0], self._data.shape[1], self.tile
+        s = self._data.sum(axis=-1, dtype=np.uint64)           # (ty, tx, t, t, L)
+        s = s.transpose(0, 2, 1, 3, 4).reshape(ty * t, tx * t, self.L)[:self.H, :self.W]
+        return s if k is None else s[:, :, k]
+
+    def rate(self, k: int | None = None) -> np.ndarray:
+        """Counts per second, normalized by each histogram's dwell time."""
+        if self.dwell is None:
+            dwell = np.float32(self.header.get("tacq_ms", np.nan))
+        else:
+            dwell = self.dwell if k is None else self.dwell[:, :, k]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.intensity(k) * 1000.0 / dwell
+
+    # --- Persistence
+    def flush(self):
+        self._data.flush()
+        self.filled.flush()
+        if self.dwell is not None:
+            self.dwell.flush()
+
+    def close(self):
+        self.flush()
+        del self._data, self.filled, self.dwell
+
+
+# -----------------------------------------------------------------------------
+# Helper output ingestion
+# -----------------------------------------------------------------------------
+_SPLIT = re.compile(r"[,\s;]+")
+
+# e.g. "..._x12_y7_610.0nm.txt" / "hist_12_7_610.0.dat"; override for other helpers
+DEFAULT_NAME_PATTERN = r"(?P<ix>\d+)\D+(?P<iy>\d+)\D+(?P<wl>\d+(?:\.\d+)?)"
+
+
+def read_helper_histogram(path) -> np.ndarray:
+    """
+    Parse one histogram text file written by th260_helper: lines that are
+    fully numeric are data, anything else (headers, comments) is skipped.
+    With several columns (bin/time + counts) the last column is the counts.
+    """
+    rows = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            toks = [t for t in _SPLIT.split(line.strip()) if t]
+            if toks and all(_is_number(t) for t in toks):
+                rows.append(float(toks[-1]))
+    return np.asarray(rows, dtype=np.float64)
+
+
+def _is_number(s) -> bool:
+    try:
+        float(s)
+        return True
+    except ValueError:
+        return False
+
+
+def ingest_files(cube: FlimCube, paths, iy: int, ix: int, k: int, dwell_ms=None) -> np.ndarray:
+    """Store the histogram(s) from `paths` (summed, e.g. one file per channel)."""
+    total = None
+    for p in paths:
+        h = read_helper_histogram(p)
+        if total is None:
+            total = h
+        else:
+            n = min(total.size, h.size)
+            total = total[:n] + h[:n]
+    if total is not None:
+        cube.write(iy, ix, k, total, dwell_ms)
+    return total
+
+
+def ingest_dir(cube: FlimCube, folder, pattern=DEFAULT_NAME_PATTERN) -> int:
+    """
+    Import a folder of per-pixel helper files into `cube`; the filename
+    regex must provide named groups ix, iy and wl. Returns files ingested.
+    """
+    rx = re.compile(pattern)
+    n = 0
+    for name in sorted(os.listdir(folder)):
+        m = rx.search(name)
+        if not m:
+            continue
+        ix, iy, wl = int(m["ix"]), int(m["iy"]), float(m["wl"])
+        if 0 <= ix < cube.W and 0 <= iy < cube.H:
+            ingest_files(cube, [os.path.join(folder, name)], iy, ix, cube.wl_index(wl))
+            n += 1
+    cube.flush()
+    return n
+
+
+class ScratchIngestor:
+    """
+    Post-acquisition hook for the FLIM engine. A histogram handed over
+    directly (shared-memory ring, channels summed) is written as is;
+    otherwise the helper wrote the measurement into `scratch` and the
+    file(s) are parsed into the cube and removed, so no per-pixel files
+    accumulate. The cube is created on the first measurement, once the
+    histogram length is known. `dwell_ms` (count-targeted acquisitions)
+    goes into the cube's dwell map. An existing cube at `cube_path` (a
+    resumed scan) is reopened and filled further.
+    """
+    def __init__(self, cube_path, height, width, wavelengths, scratch, **meta):
+        self.cube_path = Path(cube_path)
+        self.height, self.width = height, width
+        self.wavelengths = list(wavelengths)
+        self.scratch = Path(scratch)
+        self.meta = meta
+        self.cube: FlimCube | None = None
+        if (self.cube_path / HEADER).exists():
+            self.cube = FlimCube.open(self.cube_path)
+        self.scratch.mkdir(parents=True, exist_ok=True)
+
+    def _ensure_cube(self, bins):
+        if self.cube is None:
+            self.cube = FlimCube.create(self.cube_path, self.height, self.width,
+                                        self.wavelengths, bins, **self.meta)
+        return self.cube
+
+    def __call__(self, step, hist=None, dwell_ms=None):
+        if hist is not None:
+            h = np.asarray(hist)
+            h = h.sum(axis=0) if h.ndim > 1 else h
+            cube = self._ensure_cube(h.size)
+            cube.write(step.iy, step.ix, cube.wl_index(step.wl), h, dwell_ms)
+            return h
+        paths = sorted(p for p in self.scratch.iterdir() if p.is_file())
+        if not paths:
+            return None
+        cube = self._ensure_cube(read_helper_histogram(paths[0]).size)
+        hist = ingest_files(cube, paths, step.iy, step.ix, cube.wl_index(step.wl), dwell_ms)
+        for p in paths:
+            p.unlink()
+        return hist
+
+    def close(self):
+        if self.cube is not None:
+            self.cube.flush()
@@ -0,0 +1,319 @@
+# storage/sparse_hist.py
+from __future__ import annotations
+
+import json
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from .datacube import FlimCube
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+try:
+    import lz4.frame as lz4frame
+except ImportError:
+    lz4frame = None
+
+SUFFIX = ".ltbh"
+MAGIC = b"LTBSPH\x00\x01"
+_FOOTER = struct.Struct("<QQQ8s")            # index offset, maps offset, maps size, magic
+INDEX_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u4"), ("nnz", "<u4")])
+
+
+# -----------------------------------------------------------------------------
+# Vectorized LEB128 varints
+# -----------------------------------------------------------------------------
+def varint_encode(values) -> bytes:
+    """Unsigned LEB128 of every value in `values`, concatenated."""
+    v = np.asarray(values, dtype=np.uint64).ravel()
+    if v.size == 0:
+        return b""
+    nbytes = np.ones(v.size, dtype=np.int64)
+    x = v >> np.uint64(7)
+    while x.any():
+        nbytes += x > 0
+        x >>= np.uint64(7)
+    j = np.arange(int(nbytes.max()))
+    groups = ((v[:, None] >> (j * 7).astype(np.uint64)) & np.uint64(0x7F)).astype(np.uint8)
+    groups[j[None, :] < nbytes[:, None] - 1] |= 0x80
+    return groups[j[None, :] < nbytes[:, None]].tobytes()
+
+
+def varint_decode(buf) -> np.ndarray:
+    """Inverse of varint_encode: uint64 array."""
+    b = np.frombuffer(buf, dtype=np.uint8)
+    if b.size == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(b < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    j = np.arange(b.size) - np.repeat(starts, ends - starts + 1)
+    part = (b & 0x7F).astype(np.uint64) << (j * 7).astype(np.uint64)
+    return np.add.reduceat(part, starts)
+
+
+# -----------------------------------------------------------------------------
+# Codecs
+# -----------------------------------------------------------------------------
+def available_codecs() -> list[str]:
+    out = ["none", "zlib"]
+    if zstandard is not None: out.append("zstd")
+    if lz4frame is not None: out.append("lz4")
+    return out
+
+
+def _pick_codec(codec: str) -> str:
+    if codec == "auto":
+        return "zstd" if zstandard is not None else "lz4" if lz4frame is not None else "zlib"
+    if codec not in available_codecs():
+        raise ValueError(f"codec {codec!r} not available (have {', '.join(available_codecs())})")
+    return codec
+
+
+def _compressor(codec: str, level: int | None):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=3 if level is None else level).compress
+    if codec == "lz4":
+        return lambda b: lz4frame.compress(b, compression_level=0 if level is None else level)
+    if codec == "zlib":
+        return lambda b: zlib.compress(b, 1 if level is None else level)
+    return bytes
+
+
+def _decompressor(codec: str):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("archive is zstd-compressed: install `zstandard` to read it")
+        return zstandard.ZstdDecompressor().decompress
+    if codec == "lz4":
+        if lz4frame is None:
+            raise RuntimeError("archive is lz4-compressed: install `lz4` to read it")
+        return lz4frame.decompress
+    if codec == "zlib":
+        return zlib.decompress
+    return bytes
+
+
+# -----------------------------------------------------------------------------
+# Chunks: the nonzero bins of one tile at one wavelength
+# -----------------------------------------------------------------------------
+def encode_chunk(block) -> tuple[bytes, int]:
+    """
+    (payload, nnz) for a (t, t, bins) block: positions of the nonzero bins
+    in the flattened block, delta-encoded (they only increase), followed by
+    their counts, both as varints. A u32 prefix gives the position bytes.
+    """
+    flat = np.ascontiguousarray(block).ravel()
+    pos = np.flatnonzero(flat)
+    deltas = varint_encode(np.diff(pos, prepend=0))
+    return struct.pack("<I", len(deltas)) + deltas + varint_encode(flat[pos]), int(pos.size)
+
+
+def decode_chunk(payload, shape, dtype) -> np.ndarray:
+    """Inverse of encode_chunk: a dense array of `shape`."""
+    out = np.zeros(int(np.prod(shape)), dtype=dtype)
+    if payload:
+        nd = struct.unpack_from("<I", payload)[0]
+        pos = np.cumsum(varint_decode(payload[4:4 + nd]))
+        out[pos.astype(np.intp)] = varint_decode(payload[4 + nd:])
+    return out.reshape(shape)
+
+
+# -----------------------------------------------------------------------------
+# Writing
+# -----------------------------------------------------------------------------
+def write_archive(cube: FlimCube, path, codec="auto", level: int | None = None) -> dict:
+    """
+    Compress a FlimCube into one archive file; returns size statistics.
+
+    File layout:
+        magic, u64 header length, header JSON (cube header + codec)
+        chunks        one per (tile row, tile column, λ), compressed
+        maps          zlib: filled (H, W, λ) uint8 and dwell (H, W, λ) float32
+        index         (ty, tx, λ) records of offset, size, nnz
+        footer        index offset, maps offset, maps size, magic
+
+    Chunks are written straight from the cube's tile layout, so memory use
+    is one tile at a time.
+    """
+    codec = _pick_codec(codec)
+    compress = _compressor(codec, level)
+    data = cube._data
+    ty, tx = data.shape[:2]
+    header = {**cube.header, "format": "ltb-sparsehist", "version": 1,
+              "codec": codec, "encoding": "delta-varint", "chunk": "tile,wl"}
+    hbytes = json.dumps(header).encode("utf-8")
+    index = np.zeros((ty, tx, cube.L), dtype=INDEX_DTYPE)
+    path = Path(path)
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(hbytes)) + hbytes)
+        for y in range(ty):
+            for x in range(tx):
+                tile = np.asarray(data[y, x])               # (t, t, λ, bins)
+                for k in range(cube.L):
+                    payload, nnz = encode_chunk(tile[:, :, k, :])
+                    blob = compress(payload) if nnz else b""
+                    index[y, x, k] = (f.tell(), len(blob), nnz)
+                    f.write(blob)
+        maps_off = f.tell()
+        dwell = cube.dwell if cube.dwell is not None else np.full(cube.filled.shape, np.nan, np.float32)
+        maps = zlib.compress(np.asarray(cube.filled, np.uint8).tobytes() + np.asarray(dwell, np.float32).tobytes())
+        f.write(maps)
+        index_off = f.tell()
+        f.write(index.tobytes())
+        f.write(_FOOTER.pack(index_off, maps_off, len(maps), MAGIC))
+        size = f.tell()
+    raw = data.nbytes + cube.filled.nbytes + (cube.dwell.nbytes if cube.dwell is not None else 0)
+    return {"path": str(path), "codec": codec, "bytes": size, "raw_bytes": raw,
+            "ratio": raw / max(size, 1), "nnz": int(index["nnz"].sum())}
+
+
+# -----------------------------------------------------------------------------
+# Reading
+# -----------------------------------------------------------------------------
+class SparseHistArchive:
+    """
+    Read-only FLIM datacube from `write_archive`, with FlimCube's read API.
+
+    Only the index, filled and dwell maps are loaded on open. A histogram
+    or pixel spectrum decodes the chunks of its one tile; a wavelength
+    plane decodes one chunk per tile. Recently decoded chunks are kept
+    (`cache_chunks`), so walking neighbouring pixels stays cheap.
+    """
+    def __init__(self, path, cache_chunks=256):
+        self.path = Path(path)
+        self._f = open(self.path, "rb")
+        self._lock = threading.Lock()
+        if self._f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not a sparse histogram archive")
+        n = struct.unpack("<Q", self._f.read(8))[0]
+        self.header = json.loads(self._f.read(n))
+        self.H, self.W = self.header["height"], self.header["width"]
+        self.wls = np.asarray(self.header["wavelengths"], dtype=float)
+        self.L, self.bins, self.tile = len(self.wls), self.header["bins"], self.header["tile"]
+        self.dtype = np.dtype(self.header["dtype"])
+        self.codec = self.header["codec"]
+        self._decompress = _decompressor(self.codec)
+
+        self._f.seek(-_FOOTER.size, 2)
+        index_off, maps_off, maps_size, magic = _FOOTER.unpack(self._f.read(_FOOTER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path}: truncated archive (no footer)")
+        self._ty, self._tx = -(-self.H // self.tile), -(-self.W // self.tile)
+        self._f.seek(index_off)
+        self.index = np.frombuffer(self._f.read(self._ty * self._tx * self.L * INDEX_DTYPE.itemsize),
+                                   dtype=INDEX_DTYPE).reshape(self._ty, self._tx, self.L)
+        self._f.seek(maps_off)
+        maps = zlib.decompress(self._f.read(maps_size))
+        n = self.H * self.W * self.L
+        self.filled = np.frombuffer(maps[:n], dtype=np.uint8).reshape(self.H, self.W, self.L)
+        self.dwell = np.frombuffer(maps[n:], dtype=np.float32).reshape(self.H, self.W, self.L)
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_n = cache_chunks
+
+    @classmethod
+    def open(cls, path, **kw) -> "SparseHistArchive":
+        return cls(path, **kw)
+
+    # --- Chunks
+    def _read(self, rec) -> bytes:
+        with self._lock:
+            self._f.seek(int(rec["offset"]))
+            return self._f.read(int(rec["size"]))
+
+    def chunk(self, y: int, x: int, k: int) -> np.ndarray:
+        """(t, t, bins) counts of tile (y, x) at wavelength index k."""
+        key = (y, x, k)
+        hit = self._cache.get(key)
+        if hit is not None:
+            self._cache.move_to_end(key)
+            return hit
+        t = self.tile
+        rec = self.index[y, x, k]
+        payload = self._decompress(self._read(rec)) if rec["nnz"] else b""
+        block = decode_chunk(payload, (t, t, self.bins), self.dtype)
+        block.flags.writeable = False
+        self._cache[key] = block
+        if len(self._cache) > self._cache_n:
+            self._cache.popitem(last=False)
+        return block
+
+    # --- FlimCube read API
+    def wl_index(self, nm: float) -> int:
+        return int(np.abs(self.wls - nm).argmin())
+
+    def histogram(self, iy: int, ix: int, k: int) -> np.ndarray:
+        t = self.tile
+        return self.chunk(iy // t, ix // t, k)[iy % t, ix % t]
+
+    def pixel(self, iy: int, ix: int) -> np.ndarray:
+        """(λ, bins) spectrum of one pixel."""
+        return np.stack([self.histogram(iy, ix, k) for k in range(self.L)])
+
+    def plane(self, k: int) -> np.ndarray:
+        """(H, W, bins) of one wavelength."""
+        t = self.tile
+        out = np.zeros((self._ty * t, self._tx * t, self.bins), dtype=self.dtype)
+        for y in range(self._ty):
+            for x in range(self._tx):
+                if self.index[y, x, k]["nnz"]:
+                    out[y * t:(y + 1) * t, x * t:(x + 1) * t] = self.chunk(y, x, k)
+        return out[:self.H, :self.W]
+
+    def intensity(self, k: int | None = None) -> np.ndarray:
+        """Photon counts per pixel: (H, W) for one wavelength, else (H, W, λ)."""
+        ks = range(self.L) if k is None else [k]
+        s = np.stack([self.plane(kk).sum(axis=-1, dtype=np.uint64) for kk in ks], axis=-1)
+        return s if k is None else s[:, :, 0]
+
+    def rate(self, k: int | None = None) -> np.ndarray:
+        dwell = self.dwell if k is None else self.dwell[:, :, k]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.intensity(k) * 1000.0 / dwell
+
+    # --- Conversion
+    def to_cube(self, path) -> FlimCube:
+        """Expand back into a writable FlimCube directory at `path`."""
+        meta = {k: v for k, v in self.header.items() if k not in _CUBE_KEYS}
+        cube = FlimCube.create(path, self.H, self.W, self.wls, self.bins,
+                               tile=self.tile, dtype=self.dtype.name, **meta)
+        for y in range(self._ty):
+            for x in range(self._tx):
+                for k in range(self.L):
+                    if self.index[y, x, k]["nnz"]:
+                        cube._data[y, x, :, :, k, :] = self.chunk(y, x, k)
+        cube.filled[:] = self.filled
+        cube.dwell[:] = self.dwell
+        cube.flush()
+        return cube
+
+    def close(self):
+        self._cache.clear()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Header keys set by FlimCube.create / write_archive themselves
+_CUBE_KEYS = {"format", "version", "height", "width", "wavelengths", "bins", "tile", "dtype",
+              "layout", "codec", "encoding", "chunk"}
+
+
+def compress_cube(cube_path, out=None, **kw) -> dict:
+    """Archive the cube directory `cube_path` next to it (`<cube>.ltbh`)."""
+    cube_path = Path(cube_path)
+    cube = FlimCube.open(cube_path, mode="r")
+    try:
+        return write_archive(cube, out or cube_path.with_name(cube_path.name + SUFFIX), **kw)
+    finally:
+        cube.close()
@@ -0,0 +1,284 @@
+# telemetry.py
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+# Latency histogram buckets: powers of two from 1 µs (bucket 0: < 1 µs)
+N_BUCKETS = 32
+
+
+class Span(NamedTuple):
+    """One timed interval: `cat` is the kind (cmd, move, settle, ...), `name` what ran."""
+    cat: str
+    name: str
+    t0: float           # time.perf_counter() seconds
+    dt: float
+    thread: str
+    ok: bool
+
+
+class _Stats:
+    __slots__ = ("n", "total", "max", "errors", "buckets")
+
+    def __init__(self):
+        self.n, self.total, self.max, self.errors = 0, 0.0, 0.0, 0
+        self.buckets = [0] * N_BUCKETS
+
+    def add(self, dt, ok):
+        self.n += 1
+        self.total += dt
+        if dt > self.max: self.max = dt
+        if not ok: self.errors += 1
+        us = dt * 1e6
+        self.buckets[0 if us < 1 else min(N_BUCKETS - 1, int(math.log2(us)) + 1)] += 1
+
+
+class _SpanContext:
+    __slots__ = ("tracer", "cat", "name", "t0")
+
+    def __init__(self, tracer, cat, name):
+        self.tracer, self.cat, self.name = tracer, cat, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.record(self.cat, self.name, self.t0, ok=exc_type is None)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """
+    Low-overhead timing of helper commands and scan phases.
+
+    Every span goes into a ring buffer (the last `capacity`, for trace
+    export and exact percentiles) and into running per-(cat, name) stats
+    with a log2 latency histogram that cover the whole session. Recording
+    is one perf_counter() call, a deque append and a few additions under a
+    lock. `mark()` returns a position to take `summary()`/`export()` from,
+    e.g. the start of a scan.
+
+    Categories used by the app:
+        cmd       helper command round trip, name "<helper>:<verb>"
+        move      stage move command          settle  closed-loop settle wait
+        goto      grating move command        acquire TH260 acquisition
+        measure   digitizer fetch / cube write  plot  live view update
+
+    `notice(source, text)` is for messages the user should see (a helper
+    fallback, a reconnect): they go to the `on_notice` listeners (the app's
+    notice bar), or are printed when nobody listens.
+    """
+    def __init__(self, capacity=200_000, enabled=True, echo=False):
+        self.enabled = enabled
+        self.echo = echo            # also print helper traffic (the old console output)
+        self._ring: deque = deque(maxlen=capacity)
+        self._stats: dict[tuple[str, str], _Stats] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.notices: deque = deque(maxlen=200)     # (time.time(), source, text)
+        self._notice_listeners = []
+
+    def configure(self, capacity=None, enabled=None, echo=None, **_unused):
+        with self._lock:
+            if capacity is not None and capacity != self._ring.maxlen:
+                self._ring = deque(self._ring, maxlen=int(capacity))
+            if enabled is not None: self.enabled = bool(enabled)
+            if echo is not None: self.echo = bool(echo)
+
+    # --- Recording
+    def record(self, cat: str, name: str, t0: float, t1: float | None = None, ok=True):
+        if not self.enabled:
+            return
+        dt = (time.perf_counter() if t1 is None else t1) - t0
+        span = Span(cat, name, t0, dt, threading.current_thread().name, ok)
+        key = (cat, name)
+        with self._lock:
+            self._ring.append(span)
+            self._seq += 1
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _Stats()
+            stats.add(dt, ok)
+
+    def span(self, cat: str, name: str):
+        """Context manager timing its body (ok=False if it raises); works around awaits too."""
+        return _SpanContext(self, cat, name) if self.enabled else _NO_SPAN
+
+    # --- Notices
+    def notice(self, source: str, text: str):
+        """Tell the user about `source` (e.g. a helper fallback); listeners run on the calling thread."""
+        with self._lock:
+            self.notices.append((time.time(), source, text))
+            listeners = list(self._notice_listeners)
+        if not listeners:
+            print(f"{source}: {text}")
+        for callback in listeners:
+            try:
+                callback(source, text)
+            except Exception:
+                pass
+
+    def on_notice(self, callback):
+        """Call `callback(source, text)` for every notice from now on."""
+        with self._lock:
+            self._notice_listeners.append(callback)
+
+    def off_notice(self, callback):
+        with self._lock:
+            self._notice_listeners = [c for c in self._notice_listeners if c != callback]
+
+    # --- Reading
+    def mark(self) -> int:
+        return self._seq
+
+    def spans(self, since: int | None = None) -> list[Span]:
+        """Spans still in the ring, all or those recorded after `mark()` returned `since`."""
+        with self._lock:
+            ring, seq = list(self._ring), self._seq
+        if since is None:
+            return ring
+        n = seq - since
+        return ring[-n:] if 0 < n < len(ring) else (ring if n > 0 else [])
+
+    def histogram(self, cat: str, name: str) -> tuple[np.ndarray, np.ndarray]:
+        """(bucket upper edges in seconds, counts) over the whole session."""
+        edges = 2.0 ** np.arange(N_BUCKETS) * 1e-6
+        with self._lock:
+            stats = self._stats.get((cat, name))
+            counts = np.array(stats.buckets if stats else [0] * N_BUCKETS)
+        return edges, counts
+
+    def summary(self, since: int | None = None) -> list[dict]:
+        """
+        Per-(cat, name) rows sorted by total time: n, total_s, mean_ms,
+        p50_ms, p95_ms, max_ms, errors. With `since`, exact over the spans
+        after that mark; otherwise from the session stats (percentiles are
+        histogram bucket bounds then, capped at the max).
+        """
+        rows = []
+        if since is not None:
+            groups: dict[tuple[str, str], list[Span]] = {}
+            for s in self.spans(since):
+                groups.setdefault((s.cat, s.name), []).append(s)
+            for (cat, name), spans in groups.items():
+                dt = np.fromiter((s.dt for s in spans), float, len(spans))
+                rows.append({"cat": cat, "name": name, "n": dt.size, "total_s": float(dt.sum()),
+                             "mean_ms": float(dt.mean() * 1e3),
+                             "p50_ms": float(np.percentile(dt, 50) * 1e3),
+                             "p95_ms": float(np.percentile(dt, 95) * 1e3),
+                             "max_ms": float(dt.max() * 1e3),
+                             "errors": sum(not s.ok for s in spans)})
+        else:
+            edges = 2.0 ** np.arange(N_BUCKETS) * 1e-3          # ms
+            with self._lock:
+                items = [(k, s.n, s.total, s.max, s.errors, list(s.buckets)) for k, s in self._stats.items()]
+            for (cat, name), n, total, mx, errors, buckets in items:
+                cum = np.cumsum(buckets)
+                rows.append({"cat": cat, "name": name, "n": n, "total_s": total,
+                             "mean_ms": total / n * 1e3,
+                             "p50_ms": min(float(edges[np.searchsorted(cum, 0.5 * n)]), mx * 1e3),
+                             "p95_ms": min(float(edges[np.searchsorted(cum, 0.95 * n)]), mx * 1e3),
+                             "max_ms": mx * 1e3, "errors": errors})
+        rows.sort(key=lambda r: r["total_s"], reverse=True)
+        return rows
+
+    def reset(self):
+        with self._lock:
+            self._ring.clear()
+            self._stats.clear()
+
+    # --- Output
+    def export(self, path, since: int | None = None) -> Path:
+        """
+        Write the spans as a Chrome trace (JSON "traceEvents"), viewable in
+        chrome://tracing or Perfetto: one row per thread.
+        """
+        spans = self.spans(since)
+        t_base = min((s.t0 for s in spans), default=0.0)
+        tids: dict[str, int] = {}
+        events = []
+        for s in spans:
+            tid = tids.setdefault(s.thread, len(tids) + 1)
+            ev = {"name": s.name, "cat": s.cat, "ph": "X", "pid": 1, "tid": tid,
+                  "ts": round((s.t0 - t_base) * 1e6, 1), "dur": round(s.dt * 1e6, 1)}
+            if not s.ok:
+                ev["args"] = {"ok": False}
+            events.append(ev)
+        events += [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                   for name, tid in tids.items()]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+        return path
+
+
+def format_summary(rows: list[dict], wall_s: float | None = None, limit=30) -> str:
+    """Fixed-width table of `Tracer.summary()` rows (share of `wall_s` if given)."""
+    head = f"{'category':<9} {'name':<34} {'n':>7} {'total s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+    if wall_s:
+        head += f" {'% wall':>7}"
+    lines = [head, "-" * len(head)]
+    for r in rows[:limit]:
+        line = (f"{r['cat']:<9} {r['name'][:34]:<34} {r['n']:>7} {r['total_s']:>9.2f} {r['mean_ms']:>9.2f} "
+                f"{r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['max_ms']:>9.2f}")
+        if wall_s:
+            line += f" {100.0 * r['total_s'] / wall_s:>6.1f}%"
+        if r["errors"]:
+            line += f"  ({r['errors']} failed)"
+        lines.append(line)
+    if len(rows) > limit:
+        lines.append(f"... {len(rows) - limit} more")
+    return "\n".join(lines)
+
+
+# One tracer for the whole app
+TRACER = Tracer()
+
+
+def span(cat: str, name: str):
+    return TRACER.span(cat, name)
+
+
+def notice(source: str, text: str):
+    TRACER.notice(source, text)
+
+
+def scan_report(since: int, t_start: float, out_dir=None, label="scan") -> str:
+    """
+    End-of-scan summary: prints the table of spans since `since` and, with
+    `out_dir`, writes `trace_<label>_<time>.json` there. Returns the table.
+    Spans overlap (moves run during readout), so shares can add up past 100%.
+    """
+    if not TRACER.enabled:
+        return ""
+    wall = time.perf_counter() - t_start
+    text = format_summary(TRACER.summary(since), wall)
+    print(f"--- {label}: {wall:.1f} s wall\n{text}")
+    if out_dir:
+        try:
+            path = TRACER.export(Path(out_dir) / time.strftime(f"trace_{label}_%Y%m%d_%H%M%S.json"), since)
+            print(f"Trace: {path}")
+        except OSError as e:
+            print("Trace export failed:", e)
+    return text
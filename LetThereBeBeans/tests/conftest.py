@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# The app runs from LetThereBeBeans/ and imports its modules from there
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
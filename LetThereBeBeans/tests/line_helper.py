@@ -0,0 +1,75 @@
+# tests/line_helper.py
+"""
+Scripted stand-in helper for tests/test_proc.py (line protocol as in
+clients/proc.py). Tagged replies when LINE_HELPER_TAGS=1. Commands:
+
+    echo <text>     -> OK <text>
+    fail            -> ERR nope
+    slow <ms>       -> OK slow, after <ms> (other commands go on meanwhile)
+    silent          -> no reply
+    junk            -> a reply that is neither OK nor ERR
+    part            -> PART N=1, PART N=2 END=1, OK N=2
+    event           -> OK, then EV STEP 1
+    die             -> exit without a reply
+    exit            -> OK, exit
+"""
+import os
+import sys
+import threading
+import time
+
+TAGS = os.environ.get("LINE_HELPER_TAGS") == "1"
+_out = threading.Lock()
+
+
+def println(s):
+    with _out:
+        sys.stdout.write(s + "\n")
+        sys.stdout.flush()
+
+
+def main():
+    println("log: starting")
+    println("OK line_helper" + (" TAGS=1" if TAGS else ""))
+    for raw in sys.stdin:
+        line = raw.strip()
+        tag = ""
+        if TAGS and line.startswith("@"):
+            t, _, line = line.partition(" ")
+            tag = t + " "
+        verb, _, arg = line.partition(" ")
+
+        def reply(s, tag=tag):
+            println(tag + s)
+
+        if verb == "echo":
+            reply(f"OK {arg}")
+        elif verb == "fail":
+            reply("ERR nope")
+        elif verb == "slow":
+            def later(reply=reply, s=float(arg) / 1000.0):
+                time.sleep(s)
+                reply("OK slow")
+            threading.Thread(target=later, daemon=True).start()
+        elif verb == "silent":
+            pass
+        elif verb == "junk":
+            reply("something else")
+        elif verb == "part":
+            reply("PART N=1")
+            reply("PART N=2 END=1")
+            reply("OK N=2")
+        elif verb == "event":
+            reply("OK")
+            println("EV STEP 1")
+        elif verb == "die":
+            return
+        elif verb == "exit":
+            reply("OK")
+            return
+        else:
+            reply(f"ERR unknown {verb}")
+
+
+if __name__ == "__main__":
+    main()
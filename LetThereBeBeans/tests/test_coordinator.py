@@ -0,0 +1,66 @@
+# tests/test_coordinator.py
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from bench.cases import SIM_ENV
+from clients.aio import AsyncCornerstoneClient, AsyncStageClient, AsyncTH260Client
+from scan.coordinator import AsyncScanCoordinator
+from scan.engine import ScanStep
+
+SIM = Path(__file__).resolve().parent.parent / "sim"
+W, H, TACQ_MS = 3, 2, 20
+
+
+@pytest.fixture(autouse=True)
+def sims(monkeypatch):
+    for k, v in SIM_ENV.items():
+        monkeypatch.setenv(k, v)
+
+
+async def scan(tmp_path, steps, **kw):
+    stage = await AsyncStageClient.start(str(SIM / "stage_sim.py"))
+    mono = await AsyncCornerstoneClient.start(str(SIM / "cornerstone_sim.py"))
+    th260 = await AsyncTH260Client.start(str(SIM / "th260_sim.py"))
+    try:
+        await stage.open()
+        await mono.open()
+        await th260.connect(str(tmp_path))
+        await th260.open_ring()
+        results = []
+
+        def post_acquire(step, hist, dwell_ms=None):
+            results.append((step, hist.sum(), dwell_ms))
+
+        coordinator = AsyncScanCoordinator(stage, mono, th260, stage_settle_s=0.0, mono_settle_s=0.0, **kw)
+        done = await coordinator.run(steps, W, H, TACQ_MS, str(tmp_path), post_acquire=post_acquire)
+        return done, results
+    finally:
+        for client in (stage, mono, th260):
+            await client.close()
+
+
+def raster(wls=(500.0, 510.0)):
+    return [ScanStep(ix, iy, wl) for wl in wls for iy in range(1, H + 1) for ix in range(1, W + 1)]
+
+
+@pytest.mark.parametrize("overlap", [False, True])
+def test_runs_every_step(tmp_path, overlap):
+    steps = raster()
+    done, results = asyncio.run(scan(tmp_path, steps, overlap_readout=overlap))
+    assert done == len(steps)
+    assert [r[0] for r in results] == steps
+    assert all(counts > 0 and dwell is None for _step, counts, dwell in results)
+
+
+def test_count_targets(tmp_path):
+    steps = raster(wls=(500.0,))
+    done, results = asyncio.run(scan(tmp_path, steps, target_counts=100))
+    assert done == len(steps)
+    assert all(0 < dwell <= TACQ_MS for _step, _counts, dwell in results)
+
+
+def test_async_clients_have_no_scan_programs():
+    assert not hasattr(AsyncStageClient, "run_program")
+    assert not hasattr(AsyncTH260Client, "run_program")
@@ -0,0 +1,107 @@
+# tests/test_datacube.py
+from types import SimpleNamespace
+
+import numpy as np
+
+from storage.datacube import DWELL, FlimCube, ScratchIngestor, ingest_dir, read_helper_histogram
+
+WLS = (500.0, 510.0)
+
+
+def random_planes(H, W, bins, seed=0):
+    return np.random.default_rng(seed).integers(0, 1000, (len(WLS), H, W, bins), dtype=np.uint32)
+
+
+def test_tile_writes_and_reads(tmp_path):
+    """Pixel writes across tile boundaries (and the partial edge tiles) read back in place."""
+    H, W, bins = 7, 10, 16
+    planes = random_planes(H, W, bins)
+    cube = FlimCube.create(tmp_path / "cube", H, W, WLS, bins, tile=4, tacq_ms=20.0)
+    for k in range(len(WLS)):
+        for iy in range(H):
+            for ix in range(W):
+                cube.write(iy, ix, k, planes[k, iy, ix], dwell_ms=iy + ix)
+    for k in range(len(WLS)):
+        assert np.array_equal(cube.plane(k), planes[k])
+    assert np.array_equal(cube.histogram(6, 9, 1), planes[1, 6, 9])
+    assert np.array_equal(cube.pixel(3, 4), planes[:, 3, 4])
+    assert np.array_equal(cube.intensity(), planes.sum(-1, dtype=np.uint64).transpose(1, 2, 0))
+    assert cube.filled.all()
+    assert cube.dwell[6, 9, 0] == 15
+    cube.close()
+
+    cube = FlimCube.open(tmp_path / "cube", mode="r")
+    assert cube.header["tacq_ms"] == 20.0
+    assert np.array_equal(cube.plane(0), planes[0])
+    cube.close()
+
+
+def test_write_pads_and_truncates(tmp_path):
+    cube = FlimCube.create(tmp_path / "cube", 2, 2, WLS, 8, tile=2)
+    cube.write(1, 1, 0, np.arange(1, 9))
+    cube.write(1, 1, 0, [5, 6, 7])                  # shorter: the rest is cleared
+    assert list(cube.histogram(1, 1, 0)) == [5, 6, 7, 0, 0, 0, 0, 0]
+    cube.write(0, 1, 1, np.arange(20))              # longer: cut to the cube's bins
+    assert list(cube.histogram(0, 1, 1)) == list(range(8))
+    assert cube.filled.sum() == 2 and not cube.histogram(0, 0, 0).any()
+    cube.close()
+
+
+def test_write_plane_matches_pixel_writes(tmp_path):
+    H, W, bins = 5, 9, 12
+    planes = random_planes(H, W, bins, seed=1)
+    a = FlimCube.create(tmp_path / "a", H, W, WLS, bins, tile=4)
+    b = FlimCube.create(tmp_path / "b", H, W, WLS, bins, tile=4)
+    a.write_plane(1, planes[1], dwell_ms=3.0)
+    for iy in range(H):
+        for ix in range(W):
+            b.write(iy, ix, 1, planes[1, iy, ix], dwell_ms=3.0)
+    assert np.array_equal(a._data, b._data)
+    assert np.array_equal(a.filled, b.filled) and np.array_equal(a.dwell, b.dwell, equal_nan=True)
+    assert np.allclose(a.rate(1), planes[1].sum(-1) * 1000.0 / 3.0)
+    a.close()
+    b.close()
+
+
+def test_cube_without_dwell_map(tmp_path):
+    """Cubes from before dwell recording fall back to the header's tacq_ms."""
+    cube = FlimCube.create(tmp_path / "cube", 2, 2, WLS, 4, tile=2, tacq_ms=500.0)
+    cube.write(0, 0, 0, [1, 1, 0, 0])
+    cube.close()
+    (tmp_path / "cube" / DWELL).unlink()
+    cube = FlimCube.open(tmp_path / "cube")
+    assert cube.dwell is None
+    cube.write(0, 1, 0, [3, 0, 0, 0], dwell_ms=100.0)      # ignored, nowhere to keep it
+    assert cube.rate(0)[0, 0] == 4.0 and cube.rate(0)[0, 1] == 6.0
+    cube.close()
+
+
+def test_ingest_dir(tmp_path):
+    folder = tmp_path / "files"
+    folder.mkdir()
+    (folder / "hist_1_0_510.0.dat").write_text("# header\nbin counts\n0 4\n1 5\n2 6\n")
+    (folder / "hist_9_9_500.0.dat").write_text("1\n2\n")      # outside the cube
+    (folder / "notes.txt").write_text("no match")
+    assert list(read_helper_histogram(folder / "hist_1_0_510.0.dat")) == [4, 5, 6]
+    cube = FlimCube.create(tmp_path / "cube", 2, 2, WLS, 4, tile=2)
+    assert ingest_dir(cube, folder) == 1
+    assert list(cube.histogram(0, 1, 1)) == [4, 5, 6, 0]
+    cube.close()
+
+
+def test_scratch_ingestor_resumes_existing_cube(tmp_path):
+    step = lambda iy, ix, wl: SimpleNamespace(iy=iy, ix=ix, wl=wl)
+    ing = ScratchIngestor(tmp_path / "cube", 3, 3, WLS, tmp_path / "scratch", tile=2)
+    ing(step(0, 0, 500.0), hist=np.ones((2, 6)), dwell_ms=7.0)     # channels summed
+    ing.close()
+    assert ing.cube.bins == 6 and list(ing.cube.histogram(0, 0, 0)) == [2] * 6
+
+    ing = ScratchIngestor(tmp_path / "cube", 3, 3, WLS, tmp_path / "scratch", tile=2)
+    assert ing.cube is not None and ing.cube.filled[0, 0, 0]
+    (tmp_path / "scratch" / "ch0.dat").write_text("1\n2\n3\n")
+    (tmp_path / "scratch" / "ch1.dat").write_text("1\n1\n1\n")
+    assert list(ing(step(2, 1, 510.0), dwell_ms=9.0)) == [2, 3, 4]
+    assert not any((tmp_path / "scratch").iterdir())
+    assert list(ing.cube.histogram(2, 1, 1)[:3]) == [2, 3, 4] and ing.cube.dwell[2, 1, 1] == 9.0
+    assert ing(step(1, 1, 500.0)) is None                        # nothing written
+    ing.close()
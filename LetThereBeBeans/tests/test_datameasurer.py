@@ -0,0 +1,78 @@
+# tests/test_datameasurer.py
+import numpy as np
+import pytest
+
+import DataMeasurer as dm
+
+
+def measurer(num_pts=10_000, **kw):
+    return dm.Measurer(dm.FakeScope(num_pts=num_pts, seed=1, **kw)).open()
+
+
+def test_reductions_of_a_constant_record():
+    x = np.full(1000, 2.0)
+    x[:500] = 0.0
+    assert dm.mean(x) == pytest.approx(1.0)
+    assert dm.rms(x) == pytest.approx(np.sqrt(2.0))
+    assert dm.boxcar(0.5, 1.0)(x) == pytest.approx(2.0)
+    assert dm.boxcar(0.0, 0.5)(x) == pytest.approx(0.0)
+
+
+def test_reductions_per_record():
+    x = np.arange(12, dtype=float).reshape(3, 4)
+    np.testing.assert_allclose(dm.mean(x), [1.5, 5.5, 9.5])
+    np.testing.assert_allclose(dm.rms(x), np.sqrt((x ** 2).mean(axis=1)))
+    np.testing.assert_allclose(dm.boxcar(0.5, 1.0)(x), [2.5, 6.5, 10.5])
+
+
+def test_record_mean_and_rms():
+    m = measurer(level=1.0, noise=0.01)
+    assert m.record() == pytest.approx(1.0, abs=1e-3)
+    m.reduce = "rms"
+    assert m.record() == pytest.approx(np.sqrt(1.0 + 0.01 ** 2), abs=1e-3)
+    m.reduce = dm.boxcar(0.25, 0.75)
+    assert m.record() == pytest.approx(1.0, abs=1e-3)
+    m.close()
+
+
+def test_record_reuses_the_buffer():
+    m = measurer()
+    m.record()
+    buf = m._buf
+    for _ in range(3):
+        m.record()
+    assert m._buf is buf
+    assert m.backend.fetches == 4
+    m.close()
+
+
+def test_configure_reallocates_only_on_change():
+    m = measurer(num_pts=1000)
+    buf = m._buf
+    m.configure(1, 1000)
+    assert m._buf is buf
+    m.configure(4, 1000)
+    assert m._buf.size == 4000
+    m.close()
+
+
+def test_record_multi():
+    m = measurer(num_pts=1000, noise=0.0, level=0.5)
+    values, t_mid = m.record_multi(5)
+    assert values.shape == (5,) and t_mid.shape == (5,)
+    np.testing.assert_allclose(values, 0.5)
+    np.testing.assert_allclose(np.diff(t_mid), 1000 / m.backend.sample_rate)
+    # Back to single records: buffer sized for one record again
+    m.record()
+    assert m._buf.size == 1000
+    m.close()
+
+
+def test_fake_scope_follows_wavelength():
+    nm = [532.0]
+    m = measurer(noise=0.0, spectrum=dm.sim_spectrum, wavelength=lambda: nm[0])
+    peak = m.record()
+    nm[0] = 450.0
+    assert m.record() < peak
+    assert peak == pytest.approx(dm.sim_spectrum(532.0))
+    m.close()
@@ -0,0 +1,50 @@
+# tests/test_engine.py
+import time
+from pathlib import Path
+
+import pytest
+
+from bench.cases import SIM_ENV
+from clients.cornerstone_client import CornerstoneClient
+from clients.stage_client import StageClient
+from clients.th260_client import TH260Client
+from scan.engine import ScanEngine, ScanStep
+from scan.settle import Settler
+
+SIM = Path(__file__).resolve().parent.parent / "sim"
+W, TACQ_MS, SETTLE_S = 5, 20, 0.15
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    for k, v in SIM_ENV.items():
+        monkeypatch.setenv(k, v)
+    monkeypatch.setenv("SIM_READOUT_MS", "200")
+    stage = StageClient(str(SIM / "stage_sim.py"))
+    mono = CornerstoneClient(str(SIM / "cornerstone_sim.py"))
+    th260 = TH260Client(str(SIM / "th260_sim.py"))
+    stage.open(); mono.open(); th260.connect()
+    yield stage, mono, th260
+    for c in (stage, mono, th260):
+        c.close()
+
+
+def scan(clients, tmp_path, **kw):
+    stage, mono, th260 = clients
+    # Fixed settle after every stage move (no readback), so overlap is measurable
+    settler = Settler("test-stage", stage.status, SETTLE_S)
+    settler.polling = False
+    steps = [ScanStep(ix, 1, 500.0) for ix in range(1, W + 1)]
+    t0 = time.monotonic()
+    with ScanEngine(stage, mono, th260, stage_settler=settler, mono_settle_s=0.0, **kw) as engine:
+        done = engine.run(steps, W, 1, TACQ_MS, str(tmp_path))
+    return done, time.monotonic() - t0
+
+
+def test_moves_overlap_the_readout_by_default(clients, tmp_path):
+    done, serial_s = scan(clients, tmp_path, overlap_readout=False)
+    assert done == W
+    done, overlap_s = scan(clients, tmp_path)
+    assert done == W
+    # Each step saves the settle time hidden behind the 200 ms readout
+    assert overlap_s < serial_s - 0.5 * (W - 1) * SETTLE_S
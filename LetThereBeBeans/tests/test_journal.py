@@ -0,0 +1,75 @@
+# tests/test_journal.py
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from scan.journal import SUFFIX, ScanJournal, find_unfinished, read_journal
+
+APP = str(Path(__file__).resolve().parent.parent)
+
+
+def crash_mid_scan(path, n_steps):
+    """Run a scan in another process that dies (no close) while writing a record."""
+    code = textwrap.dedent(f"""
+        import os, sys
+        sys.path.insert(0, {APP!r})
+        from scan.journal import ScanJournal
+        j = ScanJournal.create({str(path)!r}, "flim", {{"W": 4, "H": 2}}, sync_every=1000, sync_s=1000)
+        for i in range({n_steps}):
+            j.record(i % 4, i // 4, 500.1 + 0.2 * (i % 2), value=i)
+        j._f.write('{{"type": "step", "ix": 9')     # torn record
+        j._f.flush()
+        os._exit(1)
+    """)
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 1
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / ("a" + SUFFIX)
+    synced = []
+    j = ScanJournal.create(path, "hyperspectral", {"start": 500.0}, sync_every=2, on_sync=lambda: synced.append(1))
+    j.record(None, None, 500.0, value=1.5)
+    j.record(None, None, 501.0, value=2.5)
+    assert synced                   # sync_every reached
+    j.finish()
+    header, steps, finished = read_journal(path)
+    assert header["mode"] == "hyperspectral" and header["params"] == {"start": 500.0}
+    assert [(s["wl"], s["value"]) for s in steps] == [(500.0, 1.5), (501.0, 2.5)]
+    assert finished
+    assert find_unfinished(tmp_path, "hyperspectral") is None
+    with pytest.raises(ValueError, match="finished"):
+        ScanJournal.resume(path)
+
+
+def test_resume_after_crash(tmp_path):
+    path = tmp_path / ("scan" + SUFFIX)
+    crash_mid_scan(path, 5)
+    assert find_unfinished(tmp_path, "flim") == path
+    assert find_unfinished(tmp_path, "hyperspectral") is None
+
+    j = ScanJournal.resume(path)
+    assert j.params == {"W": 4, "H": 2}
+    assert len(j.steps) == 5                        # the torn record is dropped
+    assert j.is_done(0, 0, 500.1) and j.is_done(1, 0, 500.3)
+    assert j.is_done(1, 0, 500.1 + 0.2)             # float noise in the wavelength
+    assert not j.is_done(1, 1, 500.1)
+    j.record(1, 1, 500.1, value=5)
+    j.finish()
+
+    header, steps, finished = read_journal(path)
+    assert finished and len(steps) == 6 and steps[-1]["value"] == 5
+    # Every line parses: the appended records did not land on the torn one
+    assert all(line.startswith("{") and line.endswith("}") for line in path.read_text().splitlines())
+
+
+def test_resume_twice(tmp_path):
+    path = tmp_path / ("scan" + SUFFIX)
+    crash_mid_scan(path, 3)
+    ScanJournal.resume(path).close()                # stopped again without finishing
+    j = ScanJournal.resume(path)
+    assert len(j.steps) == 3
+    j.close()
+    assert find_unfinished(tmp_path, "flim") == path
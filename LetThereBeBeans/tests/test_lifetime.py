@@ -0,0 +1,49 @@
+# tests/test_lifetime.py
+import numpy as np
+import pytest
+
+from analysis.lifetime import tail_fit
+
+RES_NS, BINS = 0.025, 1024
+
+
+def decays(photons, tau_ns, pixels=100, bg=0.0, seed=1):
+    """(pixels, BINS) histograms: exponential decays from 5 ns with a 50 ps IRF, Poisson counts."""
+    rng = np.random.default_rng(seed)
+    hists = rng.poisson(bg, (pixels, BINS)).astype(float)
+    for h in hists:
+        n = rng.poisson(photons)
+        t = 5.0 + rng.exponential(tau_ns, n) + rng.normal(0.0, 0.05, n)
+        b = (t / RES_NS).astype(int)
+        np.add.at(h, b[(b >= 0) & (b < BINS)], 1)
+    return hists
+
+
+def test_too_few_photons_is_nan():
+    assert np.isnan(tail_fit(decays(30, 2.0), RES_NS)).all()
+    assert np.isnan(tail_fit(np.zeros(BINS), RES_NS))
+
+
+def test_sparse_histograms():
+    tau = tail_fit(decays(200, 2.0), RES_NS)
+    assert np.isfinite(tau).all()
+    assert np.median(tau) == pytest.approx(2.0, rel=0.05)
+    assert ((tau > 1.4) & (tau < 2.8)).all()
+
+
+@pytest.mark.parametrize("bg", [0.0, 0.05])
+def test_medium_counts(bg):
+    tau = tail_fit(decays(1000, 2.0, bg=bg), RES_NS)
+    assert np.median(tau) == pytest.approx(2.0, rel=0.03)
+    assert ((tau > 1.4) & (tau < 2.6)).all()
+
+
+@pytest.mark.parametrize("tau_ns", [0.5, 2.0, 4.0])
+def test_high_counts(tau_ns):
+    tau = tail_fit(decays(100_000, tau_ns, pixels=5, bg=1.0), RES_NS)
+    np.testing.assert_allclose(tau, tau_ns, rtol=0.04)
+
+
+def test_keeps_leading_shape():
+    h = decays(100_000, 2.0, pixels=6).reshape(2, 3, BINS)
+    assert tail_fit(h, RES_NS).shape == (2, 3)
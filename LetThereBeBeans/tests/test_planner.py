@@ -0,0 +1,27 @@
+# tests/test_planner.py
+import pytest
+
+from scan.planner import MotionCostModel, plan_all
+from scan.settle import SettleModel
+
+WLS = [500.0, 505.0, 510.0]
+
+
+def test_fixed_settle_times_favour_few_grating_moves():
+    assert plan_all(8, 8, WLS)[0].order.startswith("wavelength")
+
+
+def test_learned_settle_times_pick_the_order():
+    stage, mono = SettleModel(), SettleModel()
+    for d in (1, 2, 4, 8, 16):
+        stage.observe(d, 0.5)       # slow stage
+        mono.observe(d, 0.01)       # fast grating
+    model = MotionCostModel(stage_model=stage, mono_model=mono)
+    assert model.stage_time(1, 0) == pytest.approx(0.5 + model.stage_s_per_px)
+    assert plan_all(8, 8, WLS, model)[0].order.startswith("pixel")
+
+
+def test_unlearned_distances_use_the_fixed_times():
+    model = MotionCostModel(stage_model=SettleModel(), mono_model=SettleModel())
+    assert model.mono_time(5.0) == pytest.approx(model.mono_settle_s + 5.0 * model.mono_s_per_nm)
+    assert model.stage_time(0, 0) == 0.0
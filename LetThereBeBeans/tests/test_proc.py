@@ -0,0 +1,97 @@
+# tests/test_proc.py
+import threading
+from pathlib import Path
+
+import pytest
+
+from clients.proc import _LineProcess
+
+HELPER = str(Path(__file__).resolve().parent / "line_helper.py")
+
+
+@pytest.fixture(params=[False, True], ids=["fifo", "tagged"])
+def proc(request, monkeypatch):
+    monkeypatch.setenv("LINE_HELPER_TAGS", "1" if request.param else "0")
+    p = _LineProcess(HELPER)
+    yield p
+    p.close()
+
+
+def test_greeting_and_replies(proc):
+    assert proc.greeting.startswith("OK line_helper")
+    assert proc.tagged == ("TAGS=1" in proc.greeting)
+    assert "log: starting" in proc.unsolicited
+    assert proc.send("echo hi") == "OK hi"
+    assert proc.send_many([f"echo {i}" for i in range(20)]) == [f"OK {i}" for i in range(20)]
+    with pytest.raises(RuntimeError, match="ERR nope"):
+        proc.send("fail")
+    assert proc.send("echo after") == "OK after"
+
+
+def test_progress_lines_go_to_the_command(proc):
+    parts = []
+    assert proc.submit("part", on_progress=parts.append).result(5.0) == "OK N=2"
+    assert parts == ["PART N=1", "PART N=2 END=1"]
+
+
+def test_events_go_to_listeners(proc):
+    got = threading.Event()
+    events = []
+    proc.listen("EV", lambda line: (events.append(line), got.set()))
+    proc.send("event")
+    assert got.wait(5.0)
+    assert events == ["EV STEP 1"]
+
+
+def test_replies_without_ok_or_err(proc):
+    if proc.tagged:
+        # Tagged, the line is the command's reply and fails it
+        with pytest.raises(RuntimeError, match="something else"):
+            proc.send("junk")
+        assert proc.send("echo hi") == "OK hi"
+    else:
+        # Untagged, it is kept as log output: the command gets no reply
+        with pytest.raises(TimeoutError):
+            proc.send("junk", timeout=0.3)
+        assert "something else" in proc.unsolicited
+
+
+def test_exit_fails_pending_commands(proc):
+    pending = proc.submit("silent")
+    with pytest.raises(RuntimeError, match="exited"):
+        proc.send("die")
+    with pytest.raises(RuntimeError, match="exited"):
+        pending.result(5.0)
+    with pytest.raises(RuntimeError):
+        proc.submit("echo hi")
+
+
+def test_timeout_untagged_desyncs(monkeypatch):
+    monkeypatch.setenv("LINE_HELPER_TAGS", "0")
+    proc = _LineProcess(HELPER)
+    try:
+        with pytest.raises(TimeoutError):
+            proc.send("silent", timeout=0.2)
+        # A late reply would be matched to the next command: the helper is given up
+        assert proc.desynced == "desynced (no reply to 'silent')"
+        with pytest.raises(RuntimeError, match="desynced"):
+            proc.submit("echo hi")
+    finally:
+        proc.close()
+
+
+def test_tagged_replies_out_of_order(monkeypatch):
+    monkeypatch.setenv("LINE_HELPER_TAGS", "1")
+    proc = _LineProcess(HELPER)
+    try:
+        slow = proc.submit("slow 300")
+        assert proc.send("echo fast", timeout=0.2) == "OK fast"
+        assert not slow.done()
+        assert slow.result(5.0) == "OK slow"
+        # A tagged timeout only drops that command; the late reply is unsolicited
+        with pytest.raises(TimeoutError):
+            proc.send("slow 300", timeout=0.05)
+        assert proc.send("echo still") == "OK still"
+        assert proc.desynced is None
+    finally:
+        proc.close()
@@ -0,0 +1,55 @@
+# tests/test_registry.py
+import threading
+
+import pytest
+
+from clients.registry import DeviceRegistry
+from telemetry import TRACER
+
+
+class Fake:
+    def __init__(self, exe):
+        self.exe = exe
+
+    def close(self):
+        pass
+
+
+def registry(gate, fail=False):
+    def open_slow(exe):
+        gate.wait(5.0)
+        if fail:
+            raise RuntimeError("no hardware")
+        return Fake(exe)
+    devices = {"fast": (Fake, lambda c: None), "slow": (open_slow, lambda c: None)}
+    return DeviceRegistry({"helpers": {"fast": "fast.exe", "slow": "slow.exe"}}, devices=devices, health_s=60.0)
+
+
+def test_acquire_later_does_not_block():
+    gate = threading.Event()
+    reg = registry(gate)
+    try:
+        future = reg.acquire_later(["fast", "slow"])
+        assert not future.done()
+        gate.set()
+        handles = future.result(5.0)
+        assert handles["slow"].exe == "slow.exe"
+        assert reg.refs("fast") == reg.refs("slow") == 1
+        for h in handles.values(): h.release()
+        assert reg.refs("fast") == reg.refs("slow") == 0
+    finally:
+        reg.close()
+
+
+def test_acquire_later_releases_on_failure():
+    # The failure is also reported as a telemetry notice (the app's notice bar)
+    gate = threading.Event(); gate.set()
+    reg = registry(gate, fail=True)
+    try:
+        with pytest.raises(RuntimeError, match="no hardware"):
+            reg.acquire_later(["fast", "slow"]).result(5.0)
+        assert reg.refs("fast") == reg.refs("slow") == 0
+        assert TRACER.notices[-1][1:] == ("slow", "open failed: no hardware")
+        assert TRACER.notices[-1][1:] == ("slow", "open failed: no hardware")
+    finally:
+        reg.close()
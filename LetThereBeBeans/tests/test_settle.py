@@ -0,0 +1,57 @@
+# tests/test_settle.py
+import asyncio
+import time
+
+import pytest
+
+from scan.settle import SettleModel, Settler
+from telemetry import TRACER
+
+
+class Readback:
+    """Position that reaches the target `after_s` after the move."""
+    def __init__(self, after_s=0.05, fail=False):
+        self.t_move, self.after_s, self.fail = time.monotonic(), after_s, fail
+
+    def __call__(self):
+        if self.fail:
+            raise RuntimeError("ERR unknown command")
+        return 1.0 if time.monotonic() - self.t_move >= self.after_s else 0.0
+
+    async def read_async(self):
+        return self()
+
+
+def settler(read, **kw):
+    return Settler("test", read, fallback_s=0.5, on_target=lambda r, t: r == t, poll_s=0.005,
+                   model=SettleModel(), **kw)
+
+
+def test_waits_until_on_target_and_learns():
+    s = settler(Readback(0.05))
+    waited = s.wait(1.0)
+    assert 0.05 <= waited < 0.3
+    assert s.model.predict(1.0) == pytest.approx(0.8 * 0.05, abs=0.03)
+    assert s.wait(1.0, distance=0) == 0.0
+
+
+def test_async_wait_matches():
+    read = Readback(0.05)
+    s = settler(read.read_async)
+    waited = asyncio.run(s.wait_async(1.0))
+    assert 0.05 <= waited < 0.3
+    assert s.model.summary()
+
+
+def test_failed_readback_falls_back_to_fixed_waits():
+    notices = []
+    listener = lambda source, text: notices.append((source, text))
+    TRACER.on_notice(listener)
+    try:
+        s = settler(Readback(fail=True))
+        assert s.wait(1.0, timeout=0.05) >= 0.05
+        assert not s.polling
+        assert notices and notices[0][0] == "test" and "readback disabled" in notices[0][1]
+        assert s.wait(1.0, timeout=0.05) >= 0.05     # fixed sleep, no more reads
+    finally:
+        TRACER.off_notice(listener)
@@ -0,0 +1,87 @@
+# tests/test_sparse_hist.py
+import numpy as np
+import pytest
+
+from storage.datacube import FlimCube
+from storage.sparse_hist import (SUFFIX, SparseHistArchive, available_codecs, compress_cube,
+                                 decode_chunk, encode_chunk, varint_decode, varint_encode,
+                                 write_archive)
+
+
+def sparse_cube(path, H=5, W=7, wls=(500.0, 510.0, 520.0), bins=64, tile=4):
+    """A cube with Poisson-sparse histograms, one unwritten wavelength plane and odd edges."""
+    rng = np.random.default_rng(3)
+    cube = FlimCube.create(path, H, W, wls, bins, tile=tile, tacq_ms=100.0, sample="beads")
+    for iy in range(H):
+        for ix in range(W):
+            for k in (0, 2):
+                cube.write(iy, ix, k, rng.poisson(0.3, bins) * (1 + (ix == 3) * 70000),
+                           dwell_ms=50.0 + ix)
+    cube.flush()
+    return cube
+
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 255, 16383, 16384, 2**32 - 1, 2**32, 2**63 - 1, 2**64 - 1],
+                      dtype=np.uint64)
+    buf = varint_encode(values)
+    assert len(varint_encode([127])) == 1 and len(varint_encode([128])) == 2
+    assert np.array_equal(varint_decode(buf), values)
+    assert varint_encode([]) == b"" and varint_decode(b"").size == 0
+
+
+def test_chunk_round_trip():
+    block = np.zeros((4, 4, 32), dtype=np.uint32)
+    block[0, 0, 0] = 1
+    block[3, 3, 31] = 2**32 - 1
+    block[1, 2, 5:9] = [3, 0, 700, 1]
+    payload, nnz = encode_chunk(block)
+    assert nnz == 5
+    assert np.array_equal(decode_chunk(payload, block.shape, block.dtype), block)
+    assert not decode_chunk(b"", block.shape, block.dtype).any()
+
+
+@pytest.mark.parametrize("codec", available_codecs())
+def test_archive_round_trip(tmp_path, codec):
+    cube = sparse_cube(tmp_path / "cube")
+    stats = write_archive(cube, tmp_path / ("cube" + SUFFIX), codec=codec)
+    assert stats["codec"] == codec
+    assert stats["nnz"] == int(np.count_nonzero(cube._data))
+    with SparseHistArchive.open(stats["path"], cache_chunks=2) as a:
+        assert (a.H, a.W, a.L, a.bins, a.tile) == (cube.H, cube.W, cube.L, cube.bins, cube.tile)
+        assert a.header["sample"] == "beads"
+        for k in range(cube.L):
+            assert np.array_equal(a.plane(k), cube.plane(k))
+        assert np.array_equal(a.pixel(4, 6), cube.pixel(4, 6))
+        assert np.array_equal(a.histogram(2, 3, 2), cube.histogram(2, 3, 2))
+        assert np.array_equal(a.intensity(), cube.intensity())
+        assert np.array_equal(a.filled, cube.filled)
+        assert np.array_equal(a.dwell, cube.dwell)
+        back = a.to_cube(tmp_path / "back")
+    assert back.header["sample"] == "beads" and back.header["tacq_ms"] == 100.0
+    assert np.array_equal(back._data, cube._data)
+    assert np.array_equal(back.dwell, cube.dwell)
+    back.close()
+    cube.close()
+
+
+def test_compress_cube_next_to_it(tmp_path):
+    sparse_cube(tmp_path / "cube").close()
+    stats = compress_cube(tmp_path / "cube", codec="zlib")
+    assert stats["path"] == str(tmp_path / ("cube" + SUFFIX))
+    assert stats["bytes"] < stats["raw_bytes"]
+
+
+def test_truncated_archive_is_refused(tmp_path):
+    """A write interrupted before the footer (crash, full disk) must not read as an empty cube."""
+    cube = sparse_cube(tmp_path / "cube")
+    path = tmp_path / ("cube" + SUFFIX)
+    write_archive(cube, path, codec="zlib")
+    cube.close()
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+    with pytest.raises(ValueError, match="truncated"):
+        SparseHistArchive(path)
+    path.write_bytes(b"not an archive")
+    with pytest.raises(ValueError, match="not a sparse"):
+        SparseHistArchive(path)
@@ -0,0 +1,100 @@
+# tests/test_th260.py
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from bench.cases import SIM_ENV
+from clients.th260_client import TH260Client
+from scan.engine import ScanStep
+
+SIM = str(Path(__file__).resolve().parent.parent / "sim" / "th260_sim.py")
+
+
+@pytest.fixture
+def sim_env(monkeypatch):
+    for k, v in SIM_ENV.items():
+        monkeypatch.setenv(k, v)
+    monkeypatch.setenv("SIM_RATE_CPS", "20000")
+    return monkeypatch
+
+
+@pytest.fixture
+def th260(sim_env, tmp_path):
+    th = TH260Client(SIM)
+    th.connect(str(tmp_path))
+    yield th
+    th.close()
+
+
+def test_ring_matches_info(th260):
+    inf = th260.info()
+    ring = th260.open_ring(slots=4)
+    assert (ring.slots, ring.channels, ring.bins) == (4, max(1, inf["channels"]), inf["bins"])
+
+
+def test_acquire_shm_cycles_the_slots(th260, tmp_path):
+    ring = th260.open_ring(slots=3)
+    hists = [th260.acquire(20, str(tmp_path), 500.0, ix, 1) for ix in range(1, 5)]
+    assert all(h.shape == (ring.channels, ring.bins) and h.sum() > 0 for h in hists)
+    # Views into the ring: the fourth measurement reused the first slot
+    assert np.shares_memory(hists[0], hists[3])
+    assert not np.shares_memory(hists[0], hists[1])
+    assert not list(tmp_path.iterdir())     # nothing went to disk
+
+
+def test_acquire_without_ring_writes_files(th260, tmp_path):
+    assert th260.acquire(20, str(tmp_path), 500.0, 2, 3) is None
+    assert (tmp_path / "hist_x2_y3_500.000nm.txt").exists()
+
+
+@pytest.mark.parametrize("ring", [False, True])
+def test_acquire_until_stops_at_the_target(th260, tmp_path, ring):
+    if ring:
+        th260.open_ring()
+    exposed = []
+    res = th260.acquire_until(5000, str(tmp_path), 500.0, 1, 1, target_counts=500, on_exposed=lambda: exposed.append(1))
+    assert res.counts >= 500
+    assert res.dwell_ms < 5000
+    assert exposed == [1]
+    assert th260.partial is True
+    if ring:
+        assert res.hist.sum() == res.counts
+    else:
+        assert res.hist is None
+
+
+def test_acquire_until_snr_target(th260, tmp_path):
+    res = th260.acquire_until(5000, str(tmp_path), 500.0, 1, 1, target_snr=20.0)
+    assert res.counts >= 400 and res.dwell_ms < 5000
+
+
+def test_acquire_until_without_measure_part(sim_env, tmp_path):
+    sim_env.setenv("SIM_ERR_RATE", "1")
+    sim_env.setenv("SIM_FAULT_CMDS", "measure_part,measure_shm_part")
+    th = TH260Client(SIM)
+    try:
+        th.connect(str(tmp_path))
+        th.open_ring()
+        res = th.acquire_until(30, str(tmp_path), 500.0, 1, 1, target_counts=10)
+        assert th.partial is False
+        assert res.dwell_ms == 30.0 and res.counts == res.hist.sum() > 0
+        # From now on straight to fixed-time measurements
+        assert th.acquire_until(30, str(tmp_path), 500.0, 2, 1, target_counts=10).dwell_ms == 30.0
+    finally:
+        th.close()
+
+
+def test_run_program_start_failure(sim_env, tmp_path):
+    """A refused `prog_run` raises and leaves no program listening for events."""
+    sim_env.setenv("SIM_ERR_RATE", "1")
+    sim_env.setenv("SIM_FAULT_CMDS", "prog_run")
+    th = TH260Client(SIM)
+    try:
+        th.connect(str(tmp_path))
+        with pytest.raises(RuntimeError, match="injected"):
+            th.run_program([ScanStep(0, 0, 500.0)], 10, str(tmp_path))
+        assert not th.proc._listeners
+        assert th.info()                # the helper still answers
+    finally:
+        th.close()
@@ -0,0 +1,85 @@
+# widgets/aio_bridge.py
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class AsyncBridge:
+    """
+    One asyncio event loop on a background thread, driven from Tk.
+
+    `run(coro, on_done, on_error)` schedules a coroutine on the loop and
+    returns its concurrent Future; the callbacks are called on the Tk
+    thread (results are handed over through a queue polled with `after`).
+    `cancel(future)` cancels the coroutine's task, which interrupts whatever
+    it is awaiting. All device clients created inside the loop share this
+    one thread, however many instruments and commands are in flight.
+    """
+    def __init__(self, widget, poll_ms=50):
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.loop = asyncio.new_event_loop()
+        self._done: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run_loop, name="aio-bridge", daemon=True)
+        self._thread.start()
+        self._job = widget.after(poll_ms, self._poll)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    # --- Tk side
+    def run(self, coro, on_done=None, on_error=None) -> Future:
+        fut = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        fut.add_done_callback(lambda f: self._done.put((f, on_done, on_error)))
+        return fut
+
+    def call(self, coro, timeout=None):
+        """Run `coro` and block for its result (for short setup/teardown commands)."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def cancel(self, fut: Future):
+        # Cancels the task on the loop thread
+        self.loop.call_soon_threadsafe(fut.cancel)
+
+    def _poll(self):
+        while True:
+            try:
+                fut, on_done, on_error = self._done.get_nowait()
+            except queue.Empty:
+                break
+            if fut.cancelled():
+                continue
+            err = fut.exception()
+            try:
+                if err is not None:
+                    if on_error: on_error(err)
+                elif on_done:
+                    on_done(fut.result())
+            except Exception as e:
+                print("AsyncBridge callback failed:", e)
+        self._job = self.widget.after(self.poll_ms, self._poll)
+
+    def close(self, timeout=5.0):
+        try:
+            self.widget.after_cancel(self._job)
+        except Exception:
+            pass
+
+        async def _shutdown():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if self.loop.is_running():
+            try:
+                asyncio.run_coroutine_threadsafe(_shutdown(), self.loop).result(timeout)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+        self.loop.close()
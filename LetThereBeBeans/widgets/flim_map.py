@@ -0,0 +1,200 @@
+# widgets/flim_map.py
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+import tkinter as tk
+from tkinter import ttk
+
+NAN_RGB = (48, 48, 48)
+MASK_RGB = np.array([0, 255, 255], dtype=np.float32)
+
+
+def colormap_lut(name="viridis", n=256) -> np.ndarray:
+    """(n, 3) uint8 RGB lookup table sampled from a matplotlib colormap."""
+    from matplotlib import colormaps
+    return (colormaps[name](np.linspace(0.0, 1.0, n))[:, :3] * 255).round().astype(np.uint8)
+
+
+def ppm_bytes(rgb: np.ndarray) -> bytes:
+    """Binary PPM (P6) for an (h, w, 3) uint8 array, readable by Tk's photo images."""
+    h, w = rgb.shape[:2]
+    return b"P6 %d %d 255\n" % (w, h) + np.ascontiguousarray(rgb, dtype=np.uint8).tobytes()
+
+
+def colorize(values: np.ndarray, lo: float, hi: float, lut: np.ndarray) -> np.ndarray:
+    """Map values onto `lut` between lo and hi; NaN (not measured yet) is dark grey."""
+    span = (hi - lo) or 1.0
+    with np.errstate(invalid="ignore"):
+        idx = np.clip((values - lo) * ((lut.shape[0] - 1) / span), 0, lut.shape[0] - 1)
+    nan = np.isnan(idx)
+    rgb = lut[np.where(nan, 0, idx).astype(np.intp)]
+    rgb[nan] = NAN_RGB
+    return rgb
+
+
+class FlimMap(ttk.Frame):
+    """
+    Live image of per-pixel FLIM quantities (e.g. intensity, lifetime).
+
+    Each layer is an (H, W, λ) float array. `set_values()` may be called from
+    any thread at any rate: it only writes into the array and marks rows
+    dirty under a lock. The Tk side polls at `fps`, colorizes just the
+    dirty row band through a LUT and pastes it into the PhotoImage as PPM
+    bytes. Color limits are either fixed per layer or grow with the data;
+    a growth triggers one full redraw.
+
+    An optional (H, W) ROI mask is shown tinted on top; with "Draw mask"
+    checked, left-drag paints it and right-drag erases.
+    """
+    def __init__(self, master, height, width, wavelengths=(0.0,), layers=None,
+                 limits=None, max_size=480, fps=10, **kw):
+        super().__init__(master, **kw)
+        self.layers = dict(layers or {"intensity": "magma", "lifetime": "viridis"})
+        self.fixed = dict(limits or {})            # layer -> (lo, hi)
+        self.max_size = max_size
+        self.interval_ms = max(1, int(1000 / fps))
+        self._lock = threading.Lock()
+        self._luts = {name: colormap_lut(cmap) for name, cmap in self.layers.items()}
+
+        bar = ttk.Frame(self); bar.pack(fill="x")
+        self.layer_cb = ttk.Combobox(bar, values=list(self.layers), state="readonly", width=12)
+        self.layer_cb.pack(side="left")
+        self.layer_cb.set(next(iter(self.layers)))
+        self.wl_cb = ttk.Combobox(bar, state="readonly", width=10)
+        self.wl_cb.pack(side="left", padx=6)
+        self.range_lbl = ttk.Label(bar, text="")
+        self.range_lbl.pack(side="left", padx=6)
+        self.paint_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(bar, text="Draw mask", variable=self.paint_var).pack(side="left", padx=6)
+        ttk.Button(bar, text="Clear mask", command=lambda: self.set_mask(None)).pack(side="left")
+        self.brush_px = 1
+        self.layer_cb.bind("<<ComboboxSelected>>", lambda _e: self.redraw())
+        self.wl_cb.bind("<<ComboboxSelected>>", lambda _e: self.redraw())
+
+        self.image_lbl = ttk.Label(self)
+        self.image_lbl.pack(anchor="nw", pady=(6, 0))
+        for seq, value in (("<Button-1>", True), ("<B1-Motion>", True),
+                           ("<Button-3>", False), ("<B3-Motion>", False)):
+            self.image_lbl.bind(seq, lambda e, v=value: self._paint(e, v))
+        self.photo = None
+        self.reset(height, width, wavelengths)
+        self._job = self.after(self.interval_ms, self._poll)
+
+    # --- Data (any thread)
+    def reset(self, height, width, wavelengths=(0.0,)):
+        """New map geometry; call from the Tk thread before a scan starts."""
+        with self._lock:
+            self.H, self.W = int(height), int(width)
+            self.wls = [float(w) for w in wavelengths]
+            shape = (self.H, self.W, len(self.wls))
+            self._data = {name: np.full(shape, np.nan, dtype=np.float32) for name in self.layers}
+            self._dirty = {name: np.zeros(self.H, dtype=bool) for name in self.layers}
+            self._limits = {name: self.fixed.get(name) for name in self.layers}
+            self.mask = None
+        self.zoom = max(1, self.max_size // max(self.H, self.W))
+        self.photo = tk.PhotoImage(width=self.W * self.zoom, height=self.H * self.zoom)
+        self.image_lbl.configure(image=self.photo)
+        self.wl_cb.configure(values=[f"{w:.2f} nm" for w in self.wls])
+        self.wl_cb.current(0)
+        self.redraw()
+
+    def wl_index(self, nm: float) -> int:
+        return int(np.abs(np.asarray(self.wls) - nm).argmin())
+
+    def set_values(self, layer, iy, ix, k, values):
+        """Set `values` at (iy, ix, k); scalars or equal-length arrays."""
+        with self._lock:
+            self._data[layer][iy, ix, k] = values
+            self._dirty[layer][iy] = True
+
+    def set_mask(self, mask):
+        """Show `mask` ((H, W) bool) as the ROI overlay; None removes it."""
+        with self._lock:
+            self.mask = None if mask is None else np.array(mask, dtype=bool)
+        self.redraw()
+
+    def get_mask(self):
+        """Copy of the current ROI mask, or None if nothing is marked."""
+        with self._lock:
+            if self.mask is None or not self.mask.any():
+                return None
+            return self.mask.copy()
+
+    def _paint(self, event, value):
+        if not self.paint_var.get():
+            return
+        x, y = event.x // self.zoom, event.y // self.zoom
+        if not (0 <= x < self.W and 0 <= y < self.H):
+            return
+        r = self.brush_px - 1
+        with self._lock:
+            if self.mask is None:
+                self.mask = np.zeros((self.H, self.W), dtype=bool)
+            self.mask[max(0, y - r):y + r + 1, max(0, x - r):x + r + 1] = value
+            for d in self._dirty.values():
+                d[max(0, y - r):y + r + 1] = True
+
+    # --- Rendering (Tk thread)
+    def redraw(self):
+        with self._lock:
+            for d in self._dirty.values():
+                d[:] = True
+
+    def _poll(self):
+        try:
+            self._render()
+        finally:
+            self._job = self.after(self.interval_ms, self._poll)
+
+    def _render(self):
+        layer = self.layer_cb.get()
+        k = max(0, self.wl_cb.current())
+        with self._lock:
+            dirty = self._dirty[layer]
+            rows = np.flatnonzero(dirty)
+            if rows.size == 0:
+                return
+            dirty[:] = False
+            plane = self._data[layer][:, :, k]
+            r0, r1 = int(rows[0]), int(rows[-1]) + 1
+            band = plane[r0:r1].copy()
+            mask = self.mask
+            lim = self._limits[layer]
+            if layer not in self.fixed:
+                grown = self._grow(lim, band)
+                if grown != lim:
+                    self._limits[layer] = lim = grown
+                    r0, r1 = 0, self.H                  # new scale: repaint everything
+                    band = plane.copy()
+            if mask is not None:
+                mask = mask[r0:r1].copy()
+        lo, hi = lim or (0.0, 1.0)                      # nothing measured yet: mask only
+        rgb = colorize(band, lo, hi, self._luts[layer])
+        if mask is not None and mask.any():
+            rgb[mask] = (0.55 * rgb[mask] + 0.45 * MASK_RGB).astype(np.uint8)
+        if self.zoom > 1:
+            rgb = rgb.repeat(self.zoom, axis=0).repeat(self.zoom, axis=1)
+        self.tk.call(self.photo, "put", ppm_bytes(rgb), "-format", "ppm", "-to", 0, r0 * self.zoom)
+        self.range_lbl.configure(text=f"{lo:.3g} – {hi:.3g}" if lim else "")
+
+    @staticmethod
+    def _grow(lim, band):
+        """Current limits, widened (with a 10% margin) if `band` falls outside."""
+        finite = band[np.isfinite(band)]
+        if finite.size == 0:
+            return lim
+        lo, hi = float(finite.min()), float(finite.max())
+        if lim is not None and lo >= lim[0] and hi <= lim[1]:
+            return lim
+        if lim is not None:
+            lo, hi = min(lo, lim[0]), max(hi, lim[1])
+        pad = 0.1 * (hi - lo) or max(abs(hi) * 0.1, 1e-9)
+        return (lo - pad if lo < 0 else max(0.0, lo - pad), hi + pad)
+
+    def destroy(self):
+        if self._job is not None:
+            self.after_cancel(self._job)
+            self._job = None
+        super().destroy()
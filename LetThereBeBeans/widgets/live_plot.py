@@ -0,0 +1,222 @@
+# widgets/live_plot.py
+from __future__ import annotations
+
+import time
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+
+class TraceBuffer:
+    """Growable (x, y) float64 storage; appends are amortized O(1), no list rebuilds."""
+    def __init__(self, capacity=1024):
+        self._x = np.empty(capacity)
+        self._y = np.empty(capacity)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    def _reserve(self, n):
+        if n > self._x.size:
+            cap = max(n, 2 * self._x.size)
+            self._x = np.resize(self._x, cap)
+            self._y = np.resize(self._y, cap)
+
+    def append(self, x, y):
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        k = x.size
+        self._reserve(self.n + k)
+        self._x[self.n:self.n + k] = x
+        self._y[self.n:self.n + k] = y
+        self.n += k
+
+    def insert(self, x, y):
+        """Insert keeping x ascending (for out-of-order samples, e.g. adaptive scans)."""
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        self._reserve(self.n + x.size)
+        for xi, yi in zip(x, y):
+            i = int(np.searchsorted(self._x[:self.n], xi, side="right"))
+            self._x[i + 1:self.n + 1] = self._x[i:self.n]
+            self._y[i + 1:self.n + 1] = self._y[i:self.n]
+            self._x[i], self._y[i] = xi, yi
+            self.n += 1
+
+    def set(self, x, y):
+        self.n = 0
+        self.append(x, y)
+
+    def clear(self):
+        self.n = 0
+
+    @property
+    def x(self) -> np.ndarray:
+        return self._x[:self.n]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self._y[:self.n]
+
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, max_points: int):
+    """
+    Reduce a trace to about `max_points` points, keeping the min and max of
+    every bucket so peaks and dips survive. x must be ordered.
+    """
+    n = x.size
+    if n <= max_points or max_points < 4:
+        return x, y
+    buckets = max_points // 2
+    size = n // buckets
+    m = buckets * size
+    yb = y[:m].reshape(buckets, size)
+    xb = x[:m].reshape(buckets, size)
+    i_min = yb.argmin(axis=1)
+    i_max = yb.argmax(axis=1)
+    rows = np.arange(buckets)
+    # Keep each bucket's min/max in x order
+    first = np.minimum(i_min, i_max)
+    second = np.maximum(i_min, i_max)
+    xs = np.column_stack([xb[rows, first], xb[rows, second]]).ravel()
+    ys = np.column_stack([yb[rows, first], yb[rows, second]]).ravel()
+    if m < n:
+        xs = np.concatenate([xs, x[m:]])
+        ys = np.concatenate([ys, y[m:]])
+    return xs, ys
+
+
+class LivePlot:
+    """
+    Matplotlib plot for high-rate live data.
+
+    Traces are TraceBuffers; `request_draw()` is cheap and can be called per
+    point. Rendering is throttled to `fps` and uses blitting: only the trace
+    artists are redrawn onto a cached background. A full redraw happens only
+    when data leaves the current axis limits (limits grow with a margin) or
+    the canvas is resized. Long traces are min/max decimated to `max_points`.
+    """
+    def __init__(self, master, xlabel="", ylabel="", title="", fps=20, max_points=4000):
+        self.fig = Figure()
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        self.ax.set_title(title)
+        self.ax.grid(True)
+        self.fig.tight_layout()
+
+        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        self.widget = self.canvas.get_tk_widget()
+        self.min_interval = 1.0 / fps
+        self.max_points = max_points
+
+        self.traces: dict[str, TraceBuffer] = {}
+        self.lines = {}
+        self._dirty = set()
+        self._limits = None          # (x0, x1, y0, y1) currently shown
+        self._bg = None
+        self._scheduled = False
+        self._last_draw = 0.0
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    # --- Traces
+    def add_trace(self, name, style="b-", **line_kw) -> TraceBuffer:
+        if name not in self.traces:
+            self.traces[name] = TraceBuffer()
+            self.lines[name], = self.ax.plot([], [], style, animated=True, **line_kw)
+        return self.traces[name]
+
+    def append(self, name, x, y):
+        self.traces[name].append(x, y)
+        self._dirty.add(name)
+        self.request_draw()
+
+    def insert(self, name, x, y):
+        self.traces[name].insert(x, y)
+        self._dirty.add(name)
+        self.request_draw()
+
+    def set_trace(self, name, x, y):
+        self.traces[name].set(x, y)
+        self._dirty.add(name)
+        self.request_draw()
+
+    def clear(self, name=None):
+        for n in ([name] if name else list(self.traces)):
+            self.traces[n].clear()
+            self._dirty.add(n)
+        self._limits = None
+        self.request_draw()
+
+    def remove_trace(self, name):
+        if name in self.traces:
+            self.lines.pop(name).remove()
+            del self.traces[name]
+            self._limits = None
+            self.request_draw()
+
+    # --- Rendering
+    def request_draw(self):
+        """Schedule a render no sooner than 1/fps after the previous one."""
+        if self._scheduled:
+            return
+        self._scheduled = True
+        wait = self.min_interval - (time.monotonic() - self._last_draw)
+        self.widget.after(max(0, int(wait * 1000)), self._render)
+
+    def _data_limits(self):
+        lo_x = lo_y = np.inf
+        hi_x = hi_y = -np.inf
+        for tr in self.traces.values():
+            if tr.n == 0: continue
+            lo_x = min(lo_x, np.nanmin(tr.x)); hi_x = max(hi_x, np.nanmax(tr.x))
+            lo_y = min(lo_y, np.nanmin(tr.y)); hi_y = max(hi_y, np.nanmax(tr.y))
+        if not np.isfinite([lo_x, hi_x, lo_y, hi_y]).all():
+            return None
+        return lo_x, hi_x, lo_y, hi_y
+
+    def _rescale_needed(self, data) -> bool:
+        if data is None:
+            return False
+        if self._limits is None:
+            return True
+        x0, x1, y0, y1 = self._limits
+        return data[0] < x0 or data[1] > x1 or data[2] < y0 or data[3] > y1
+
+    def _set_limits(self, data):
+        lo_x, hi_x, lo_y, hi_y = data
+        dx = (hi_x - lo_x) * 0.05 or 1.0
+        dy = (hi_y - lo_y) * 0.15 or max(abs(hi_y) * 0.1, 1e-12)
+        self._limits = (lo_x - dx, hi_x + dx, lo_y - dy, hi_y + dy)
+        self.ax.set_xlim(self._limits[0], self._limits[1])
+        self.ax.set_ylim(self._limits[2], self._limits[3])
+
+    def _render(self):
+        self._scheduled = False
+        self._last_draw = time.monotonic()
+        for name in self._dirty:
+            if name in self.traces:
+                tr = self.traces[name]
+                self.lines[name].set_data(*minmax_decimate(tr.x, tr.y, self.max_points))
+        self._dirty.clear()
+
+        data = self._data_limits()
+        if self._bg is None or self._rescale_needed(data):
+            if data is not None:
+                self._set_limits(data)
+            self.canvas.draw()          # full redraw; _on_draw recaptures the background
+        else:
+            self._blit()
+
+    def _on_draw(self, _event):
+        self._bg = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def _blit(self):
+        self.canvas.restore_region(self._bg)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
@@ -0,0 +1,44 @@
+# widgets/notice_bar.py
+from __future__ import annotations
+
+import queue
+import time
+from tkinter import ttk
+
+from telemetry import TRACER
+
+
+class NoticeBar(ttk.Label):
+    """
+    One-line label showing the newest telemetry notice (helper fallbacks,
+    reconnects). Notices arrive on any thread; they are handed over through
+    a queue polled with `after`.
+    """
+    def __init__(self, parent, poll_ms=200, **kw):
+        super().__init__(parent, text="", anchor="w", **kw)
+        self.poll_ms = poll_ms
+        self._q: queue.Queue = queue.Queue()
+        TRACER.on_notice(self._on_notice)
+        if TRACER.notices:
+            t, source, text = TRACER.notices[-1]
+            self._q.put((time.strftime("%H:%M:%S", time.localtime(t)), source, text))
+        self._job = self.after(poll_ms, self._poll)
+
+    def _on_notice(self, source, text):
+        self._q.put((time.strftime("%H:%M:%S"), source, text))
+
+    def _poll(self):
+        latest = None
+        while True:
+            try:
+                latest = self._q.get_nowait()
+            except queue.Empty:
+                break
+        if latest is not None:
+            self.config(text="{}  {}: {}".format(*latest))
+        self._job = self.after(self.poll_ms, self._poll)
+
+    def destroy(self):
+        TRACER.off_notice(self._on_notice)
+        self.after_cancel(self._job)
+        super().destroy()